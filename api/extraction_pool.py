@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Extraction Pool - 網頁內容提取進程池
+大頁面的解碼和提取在獨立進程中進行，不阻塞服務 API 的事件循環；
+小頁面的提取耗時低於進程間通信開銷，仍在事件循環中增量提取
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, Tuple
+
+from html_extractor import ExtractedHTML, HTMLContentExtractor, extract_bytes, resume_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionTimeout(Exception):
+    """提取超過單個任務的時限"""
+
+
+class ExtractionPool:
+    """
+    提取進程池
+    - should_offload(): 正文大小超過 inline_threshold 時交給進程池（workers 為 0 時總是在事件循環中提取）
+    - extract(): 在進程池中解碼並提取原始正文，超過 timeout 秒拋出 ExtractionTimeout
+    - resume(): 在進程池中繼續事件循環裡提取到一半的提取器，只需要傳入剩餘的原始正文
+    進程在第一次使用時啟動；使用 spawn 啟動，避免 fork 帶上事件循環和連接池的狀態。
+    正在運行的任務無法取消，超時後終止整個進程池並在下次使用時重建，卡住的頁面不會一直佔用工作進程；
+    同一進程池中其他未完成的任務轉到新進程池重新提取
+    """
+
+    def __init__(self, workers: int, timeout: float = 20.0, inline_threshold: int = 128 * 1024):
+        self.workers = workers
+        self.timeout = timeout
+        self.inline_threshold = inline_threshold
+        self.recycled = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def should_offload(self, size: int) -> bool:
+        return self.workers > 0 and size > self.inline_threshold
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def extract(self, data: bytes, charset: Optional[str] = None,
+                      max_text_chars: int = 0) -> ExtractedHTML:
+        return await self._run(extract_bytes, (data, charset, max_text_chars), len(data))
+
+    async def resume(self, extractor: HTMLContentExtractor, charset: str,
+                     decoder_state: Tuple[bytes, int], data: bytes) -> ExtractedHTML:
+        """在進程池中繼續事件循環裡已經提取了一部分的提取器，data 是剩餘的原始正文"""
+        return await self._run(resume_bytes, (extractor, charset, decoder_state, data), len(data))
+
+    async def _run(self, func: Callable[..., ExtractedHTML], args: tuple, size: int) -> ExtractedHTML:
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        future = loop.run_in_executor(executor, func, *args)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._recycle(executor)
+            raise ExtractionTimeout(f"提取超時（{self.timeout} 秒，{size} 字節）")
+        except BrokenProcessPool:
+            if executor is not self._executor:
+                # 進程池因其他任務超時被回收：在新進程池中重新提取
+                return await self._run(func, args, size)
+            # 工作進程異常退出：丟棄進程池（下次使用時重建），本次在事件循環中提取
+            logger.warning("提取進程池不可用，改為在事件循環中提取")
+            self._executor = None
+            return func(*args)
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """終止超時任務所在的進程池（無法單獨找出運行該任務的進程），下次使用時重建"""
+        if self._executor is executor:
+            self._executor = None
+        self.recycled += 1
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        # 不取消排隊的任務：進程終止後它們以 BrokenProcessPool 結束，由 extract() 轉到新進程池
+        executor.shutdown(wait=False)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        logger.warning(f"提取任務超時，已終止 {len(processes)} 個工作進程並重建進程池")
+
+    def warm_up(self):
+        """預先啟動所有工作進程，避免第一個大頁面承擔進程啟動開銷"""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for future in [executor.submit(extract_bytes, b"") for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def create_extraction_pool() -> ExtractionPool:
+    """
+    根據環境變量創建提取進程池：
+    URL_EXTRACT_WORKERS（默認 min(4, CPU 數)，0 表示不使用進程池）/ URL_EXTRACT_TIMEOUT（秒）/
+    URL_EXTRACT_INLINE_KB（不超過這個大小的頁面在事件循環中提取；默認值來自 benchmarks/bench_extraction_pool.py 的交叉點）
+    """
+    return ExtractionPool(
+        workers=int(os.environ.get("URL_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+        timeout=float(os.environ.get("URL_EXTRACT_TIMEOUT", "20")),
+        inline_threshold=int(float(os.environ.get("URL_EXTRACT_INLINE_KB", "128")) * 1024),
+    )
+
+
+_extraction_pool: Optional[ExtractionPool] = None
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """應用級共享提取進程池"""
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = create_extraction_pool()
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown()
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+HTML Extractor - 單次掃描的網頁內容提取器
+一個增量分詞器掃描一遍文檔，同時收集標題、meta 標籤、time 標籤、鏈接和正文候選區域
+（article / main / div.content / div.post / div#content / body），取代對整個文檔的多次正則掃描。
+分詞只用一個預編譯的標籤正則逐個匹配，屬性只在需要的標籤上解析；
+支持分塊 feed()，可以邊下載邊提取
+"""
+
+import re
+import html
+import codecs
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+# 內容不參與提取的元素
+SKIP_TAGS = frozenset({"script", "style", "noscript", "template", "svg"})
+
+# 內容為原始文本的元素（內部的 < 不是標籤），直接查找結束標籤
+RAW_TEXT_TAGS = frozenset({"script", "style"})
+
+# 會產生換行的塊級元素
+BLOCK_TAGS = frozenset({
+    "div", "section", "article", "main", "header", "footer", "aside", "nav",
+    "ul", "ol", "li", "dl", "dt", "dd", "table", "tr", "blockquote", "pre",
+    "h1", "h2", "h3", "h4", "h5", "h6", "form", "figure", "figcaption", "hr",
+})
+
+# 需要解析屬性的元素
+ATTRIBUTE_TAGS = frozenset({"meta", "a", "div", "time", "span"})
+
+# 正文候選區域，按優先級排列（與原正則提取的順序一致）
+CANDIDATES = ("article", "main", "div.content", "div.post", "div#content", "body")
+
+# 單個標籤（含引號中的屬性值）最長的字符數：在此範圍內沒有 > 的 < 按文本處理，
+# 每個 < 的匹配代價和跨塊保留的尾部都不超過這個長度
+MAX_TAG_LENGTH = 32 * 1024
+# 匹配失敗（引號不配對）的重試掃描量超過緩衝區長度的這個倍數後，窗口縮小到 FALLBACK_TAG_LENGTH，
+# 精心構造的引號也只能讓掃描變慢常數倍
+FAILED_MATCH_BUDGET = 8
+FALLBACK_TAG_LENGTH = 256
+
+# 開始 / 結束標籤；只在 MAX_TAG_LENGTH 的窗口內匹配
+_TAG = re.compile(r"<(/?)([a-zA-Z][^\s/>]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>")
+_TAG_START = re.compile(r"</?[a-zA-Z]")
+_ATTRIBUTE = re.compile(r"""([^\s=/>"']+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+_RAW_TEXT_END = {tag: re.compile(r"</%s\s*>" % tag, re.IGNORECASE) for tag in RAW_TEXT_TAGS}
+# 只替換連續空白和非空格空白，單個空格保持原樣
+# 響應頭沒有聲明字符集時，在正文開頭查找 <meta charset> 或 http-equiv 聲明
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([a-zA-Z0-9_.:-]+)""", re.IGNORECASE)
+_SPACES = re.compile(r"[ \t\r\f\v\xa0]{2,}|[\t\r\f\v\xa0]")
+# 標題在正文中以 Markdown 標記輸出（"## 標題"），供分塊器按章節切分
+HEADING_LEVELS = {f"h{level}": "\n\n" + "#" * level + " " for level in range(1, 7)}
+_HEADING_LINE = re.compile(r"#{1,6} \S")
+
+
+def sniff_charset(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    match = _META_CHARSET.search(head[:4096])
+    if match:
+        return match.group(1).decode("ascii")
+    return "utf-8"
+
+
+def resolve_charset(charset: Optional[str], head: bytes) -> str:
+    """響應頭或正文開頭聲明的字符集，未知字符集回退到 UTF-8"""
+    charset = charset or sniff_charset(head)
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        return "utf-8"
+    return charset
+
+
+def incremental_decoder(charset: Optional[str], head: bytes):
+    """按響應頭或正文開頭聲明的字符集創建增量解碼器，未知字符集回退到 UTF-8"""
+    return codecs.getincrementaldecoder(resolve_charset(charset, head))(errors="replace")
+
+
+def _parse_attributes(source: str) -> Dict[str, str]:
+    attributes = {}
+    for match in _ATTRIBUTE.finditer(source):
+        name = match.group(1).lower()
+        if name not in attributes:
+            value = match.group(2)
+            if value is None:
+                value = match.group(3) if match.group(3) is not None else match.group(4) or ""
+            attributes[name] = html.unescape(value) if "&" in value else value
+    return attributes
+
+
+def _candidate_kinds(tag: str, attrs: Dict[str, str]) -> List[str]:
+    if tag in ("article", "main", "body"):
+        return [tag]
+    if tag != "div":
+        return []
+    kinds = []
+    classes = attrs.get("class") or ""
+    if "content" in classes:
+        kinds.append("div.content")
+    if "post" in classes:
+        kinds.append("div.post")
+    if attrs.get("id") == "content":
+        kinds.append("div#content")
+    return kinds
+
+
+def _inline_text(chunks: List[str]) -> str:
+    return " ".join(html.unescape("".join(chunks)).split())
+
+
+def format_text(chunks: List[str]) -> str:
+    """合併文本片段：解碼實體、壓縮行內空白、保留段落分隔和標題、移除過短的行（可能是導航或廣告）"""
+    lines = []
+    blank = True
+    for line in _SPACES.sub(" ", html.unescape("".join(chunks))).split("\n"):
+        line = line.strip()
+        if not line:
+            if not blank:
+                lines.append("")
+                blank = True
+        elif len(line) > 10 or _HEADING_LINE.match(line):
+            lines.append(line)
+            blank = False
+    return "\n".join(lines).strip()
+
+
+@dataclass
+class ExtractedHTML:
+    """提取結果"""
+    title: str
+    text: str
+    description: str = ""
+    author: str = ""
+    publish_date: str = ""
+    links: List[str] = field(default_factory=list)
+    main_candidate: str = ""
+    html_length: int = 0
+    # 正文達到 max_text_chars 後停止收集，text 不完整
+    text_limited: bool = False
+
+
+class _Capture:
+    """一個候選區域：文本片段在 _chunks 中的範圍 [start, end)"""
+    __slots__ = ("kind", "tag", "depth", "start", "end")
+
+    def __init__(self, kind: str, tag: str, start: int):
+        self.kind = kind
+        self.tag = tag
+        self.depth = 1
+        self.start = start
+        self.end: Optional[int] = None
+
+
+class HTMLContentExtractor:
+    """
+    單次掃描提取器
+    - feed(): 可多次調用，逐塊輸入解碼後的 HTML；跨塊的標籤保留到下一塊再解析
+    - done: 最高優先級的候選區域（article）已經結束，或正文達到 max_text_chars，後續輸入不會改變結果
+    - result(): 結束輸入並返回 ExtractedHTML
+    """
+
+    def __init__(self, max_text_chars: int = 0, max_links: int = 1000, max_tag_length: int = MAX_TAG_LENGTH):
+        self.max_text_chars = max_text_chars
+        self.max_links = max_links
+        self.max_tag_length = max_tag_length
+        self.done = False
+        self._pending = ""
+        self._raw_tag: Optional[str] = None
+        self._html_length = 0
+        self._skip_depth = 0
+        self._title_chunks: Optional[List[str]] = None
+        self._title = ""
+        self._h1_chunks: Optional[List[str]] = None
+        self._h1 = ""
+        self._author_chunks: Optional[List[str]] = None
+        self._author_span = ""
+        self._time = ""
+        self._meta: Dict[str, str] = {}
+        self._links: List[str] = []
+        self._captures: Dict[str, _Capture] = {}
+        self._open = 0
+        self._chunks: List[str] = []
+        self._text_chars = 0
+
+    # ---- 分詞 ----
+
+    def feed(self, data: str):
+        self._html_length += len(data)
+        self._scan(self._pending + data, final=False)
+
+    def close(self):
+        pending, self._pending = self._pending, ""
+        if pending:
+            self._scan(pending, final=True)
+
+    def _scan(self, buffer: str, final: bool):
+        """
+        逐個處理 <：下一個 > 和 --> 的位置各只向前查找一次並緩存，
+        標籤正則只在 max_tag_length 的窗口內匹配，掃描保持線性；跨塊保留的尾部也不超過這個長度
+        """
+        position = 0
+        length = len(buffer)
+        limit = self.max_tag_length
+        budget = FAILED_MATCH_BUDGET * length + limit
+        next_gt = next_comment_end = -1
+        while position < length:
+            if self._raw_tag is not None:
+                end = _RAW_TEXT_END[self._raw_tag].search(buffer, position)
+                if end is None:
+                    # 原始文本未結束：丟棄已掃描部分，只保留可能是結束標籤開頭的尾部
+                    self._pending = "" if final else buffer[max(position, length - 16):]
+                    return
+                self._raw_tag = None
+                self._skip_depth -= 1
+                position = end.end()
+                continue
+
+            start = buffer.find("<", position)
+            if start < 0:
+                self._text(buffer[position:])
+                break
+            if start > position:
+                self._text(buffer[position:start])
+            position = start + 1
+            if next_gt < start:
+                next_gt = buffer.find(">", start)
+                if next_gt < 0:
+                    next_gt = length
+
+            # 常見情況：到第一個 > 為止就是一個完整的標籤
+            if next_gt - start < limit and next_gt < length:
+                match = _TAG.match(buffer, start, next_gt + 1)
+                if match is not None:
+                    position = match.end()
+                    self._tag(match)
+                    continue
+
+            # 窗口還沒有收完：標籤可能在下一塊才結束
+            incomplete = not final and length - start < limit
+
+            if buffer.startswith("<!--", start):
+                if next_comment_end < start:
+                    next_comment_end = buffer.find("-->", start + 4)
+                    if next_comment_end < 0:
+                        next_comment_end = length
+                if next_comment_end < length:
+                    position = next_comment_end + 3
+                    continue
+                if incomplete:
+                    self._pending = buffer[start:]
+                    return
+                # 未閉合的註釋退化為到下一個 > 為止的聲明
+
+            if _TAG_START.match(buffer, start):
+                if next_gt < length and next_gt - start < limit:
+                    # > 在引號中或引號不配對：在整個窗口中重試
+                    end = min(length, start + limit)
+                    match = _TAG.match(buffer, start, end)
+                    if match is not None:
+                        position = match.end()
+                        self._tag(match)
+                        continue
+                    budget -= end - start
+                    if budget < 0:
+                        limit = min(limit, FALLBACK_TAG_LENGTH)
+            elif buffer.startswith(("<!", "<?"), start):
+                # 註釋、DOCTYPE、處理指令
+                if next_gt < length:
+                    position = next_gt + 1
+                    continue
+            elif length - start > 2 or final:
+                # 後面不是標籤名的 <（例如 "a < b"）
+                self._text("<")
+                continue
+
+            if incomplete:
+                self._pending = buffer[start:]
+                return
+            self._text("<")
+        self._pending = ""
+
+    def _tag(self, match):
+        closing, tag, source = match.groups()
+        tag = tag.lower()
+        if closing:
+            self._end_tag(tag)
+            return
+        self._start_tag(tag, source)
+        if tag in RAW_TEXT_TAGS and not source.endswith("/"):
+            self._raw_tag = tag
+        elif source.endswith("/") and tag not in ("br", "hr", "meta"):
+            self._end_tag(tag)
+
+    # ---- 標籤處理 ----
+
+    def _start_tag(self, tag: str, source: str):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if self._title_chunks is not None and (tag == "body" or tag in BLOCK_TAGS):
+            # 未閉合的 <title>：遇到正文結構時結束標題
+            self._close_title()
+
+        attributes = _parse_attributes(source) if tag in ATTRIBUTE_TAGS and source else {}
+        if tag == "meta":
+            key = (attributes.get("name") or attributes.get("property") or "").lower()
+            if key and key not in self._meta and attributes.get("content"):
+                self._meta[key] = attributes["content"].strip()
+            return
+        if tag == "a":
+            href = attributes.get("href")
+            if href and len(self._links) < self.max_links:
+                self._links.append(href)
+        elif tag == "title" and not self._title:
+            self._title_chunks = []
+        elif tag == "h1" and not self._h1:
+            self._h1_chunks = []
+        elif tag == "time" and not self._time and attributes.get("datetime"):
+            self._time = attributes["datetime"].strip()
+        elif tag == "span" and not self._author_span and "author" in (attributes.get("class") or ""):
+            self._author_chunks = []
+
+        if tag in ("article", "main", "body", "div"):
+            if self._open:
+                for capture in self._captures.values():
+                    if capture.end is None and capture.tag == tag:
+                        capture.depth += 1
+            for kind in _candidate_kinds(tag, attributes):
+                if kind not in self._captures:
+                    self._captures[kind] = _Capture(kind, tag, len(self._chunks))
+                    self._open += 1
+
+        if tag == "p":
+            self._chunks.append("\n\n")
+        elif tag in HEADING_LEVELS:
+            self._chunks.append(HEADING_LEVELS[tag])
+        elif tag == "br" or tag in BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def _end_tag(self, tag: str):
+        if tag in SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if self._skip_depth:
+            return
+
+        if tag == "title" and self._title_chunks is not None:
+            self._close_title()
+        elif tag == "h1" and self._h1_chunks is not None:
+            self._h1 = _inline_text(self._h1_chunks)
+            self._h1_chunks = None
+        elif tag == "span" and self._author_chunks is not None:
+            self._author_span = _inline_text(self._author_chunks)
+            self._author_chunks = None
+
+        if tag in BLOCK_TAGS:
+            self._chunks.append("\n")
+
+        if self._open and tag in ("article", "main", "body", "div"):
+            for capture in self._captures.values():
+                if capture.end is not None or capture.tag != tag:
+                    continue
+                capture.depth -= 1
+                if capture.depth == 0:
+                    capture.end = len(self._chunks)
+                    self._open -= 1
+                    if capture.kind == CANDIDATES[0]:
+                        self.done = True
+
+    def _close_title(self):
+        self._title = _inline_text(self._title_chunks)
+        self._title_chunks = None
+
+    def _text(self, data: str):
+        if self._skip_depth:
+            return
+        if self._title_chunks is not None:
+            self._title_chunks.append(data)
+            return
+        if self._h1_chunks is not None:
+            self._h1_chunks.append(data)
+        if self._author_chunks is not None:
+            self._author_chunks.append(data)
+        self._chunks.append(data)
+        if self.max_text_chars:
+            self._text_chars += len(data)
+            if self._text_chars >= self.max_text_chars:
+                self.done = True
+
+    # ---- 結果 ----
+
+    def _main_chunks(self) -> Tuple[str, List[str]]:
+        for kind in CANDIDATES:
+            capture = self._captures.get(kind)
+            if capture is None:
+                continue
+            # 文檔被截斷或標籤未閉合時區域延伸到文檔末尾
+            chunks = self._chunks[capture.start:capture.end]
+            if any(not chunk.isspace() for chunk in chunks):
+                return kind, chunks
+        return "document", self._chunks
+
+    def result(self) -> ExtractedHTML:
+        self.close()
+        meta = self._meta
+        title = (
+            self._title or self._h1 or meta.get("og:title") or meta.get("title") or "無標題"
+        )
+        kind, chunks = self._main_chunks()
+        return ExtractedHTML(
+            title=title,
+            text=format_text(chunks),
+            description=meta.get("description") or meta.get("og:description") or "",
+            author=meta.get("author") or meta.get("article:author") or self._author_span,
+            publish_date=meta.get("article:published_time") or self._time or meta.get("date") or "",
+            links=self._links,
+            main_candidate=kind,
+            html_length=self._html_length,
+            text_limited=bool(self.max_text_chars) and self._text_chars >= self.max_text_chars,
+        )
+
+
+def extract_html(html_content: str, max_text_chars: int = 0) -> ExtractedHTML:
+    """一次性提取整個文檔"""
+    extractor = HTMLContentExtractor(max_text_chars=max_text_chars)
+    extractor.feed(html_content)
+    return extractor.result()
+
+
+def extract_bytes(data: bytes, charset: Optional[str] = None, max_text_chars: int = 0) -> ExtractedHTML:
+    """解碼並提取原始正文（進程池的任務函數，參數和結果都可以序列化）"""
+    text = incremental_decoder(charset, data).decode(data, final=True)
+    return _finish(HTMLContentExtractor(max_text_chars=max_text_chars), text)
+
+
+def resume_bytes(extractor: HTMLContentExtractor, charset: str, decoder_state: Tuple[bytes, int],
+                 data: bytes) -> ExtractedHTML:
+    """
+    繼續一個已經增量提取了正文前半部分的提取器（進程池的任務函數）：
+    extractor 和解碼器狀態（getstate() 的結果，含未解碼完的字節）隨任務序列化，data 是剩餘的原始正文
+    """
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    decoder.setstate(decoder_state)
+    return _finish(extractor, decoder.decode(data, final=True))
+
+
+def _finish(extractor: HTMLContentExtractor, text: str) -> ExtractedHTML:
+    for start in range(0, len(text), 65536):
+        extractor.feed(text[start:start + 65536])
+        if extractor.done:
+            break
+    return extractor.result()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+HTTP Pool - 應用級共享 HTTP 客戶端
+所有網頁獲取共用一個 aiohttp.ClientSession：連接池按主機限制並發、DNS 結果緩存、
+空閒連接保持 keep-alive 供後續請求復用，避免每次獲取都重新進行 DNS、TCP 和 TLS 握手
+"""
+
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (ClaudeEditor/1.0) ClaudeCode Content Processor',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+
+@dataclass
+class HTTPPoolConfig:
+    """連接池和分階段超時配置（秒）"""
+    limit: int = 100
+    limit_per_host: int = 8
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30.0
+    total_timeout: float = 30.0
+    connect_timeout: float = 10.0
+    sock_connect_timeout: float = 5.0
+    sock_read_timeout: float = 20.0
+
+    def timeout(self) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout,
+            connect=self.connect_timeout,
+            sock_connect=self.sock_connect_timeout,
+            sock_read=self.sock_read_timeout,
+        )
+
+
+def create_http_pool_config() -> HTTPPoolConfig:
+    """
+    根據環境變量創建連接池配置：
+    URL_FETCH_POOL_LIMIT / URL_FETCH_POOL_PER_HOST / URL_FETCH_DNS_TTL / URL_FETCH_KEEPALIVE /
+    URL_FETCH_TOTAL_TIMEOUT / URL_FETCH_CONNECT_TIMEOUT / URL_FETCH_SOCK_CONNECT_TIMEOUT / URL_FETCH_READ_TIMEOUT
+    """
+    return HTTPPoolConfig(
+        limit=int(os.environ.get("URL_FETCH_POOL_LIMIT", "100")),
+        limit_per_host=int(os.environ.get("URL_FETCH_POOL_PER_HOST", "8")),
+        dns_cache_ttl=int(os.environ.get("URL_FETCH_DNS_TTL", "300")),
+        keepalive_timeout=float(os.environ.get("URL_FETCH_KEEPALIVE", "30")),
+        total_timeout=float(os.environ.get("URL_FETCH_TOTAL_TIMEOUT", "30")),
+        connect_timeout=float(os.environ.get("URL_FETCH_CONNECT_TIMEOUT", "10")),
+        sock_connect_timeout=float(os.environ.get("URL_FETCH_SOCK_CONNECT_TIMEOUT", "5")),
+        sock_read_timeout=float(os.environ.get("URL_FETCH_READ_TIMEOUT", "20")),
+    )
+
+
+class SharedHTTPClient:
+    """
+    應用級 HTTP 客戶端
+    - session(): 返回共享的 ClientSession，首次調用時創建
+    - close(): 顯式關閉連接池
+    ClientSession 綁定創建它的事件循環；在另一個事件循環中調用時會為該循環重新創建。
+    創建時同時在該循環上掛一個守護任務，循環關閉前取消剩餘任務時（asyncio.run、Flask 的後台事件循環、
+    uvicorn 退出）由它關閉連接池，應用無需另外登記關閉鉤子
+    """
+
+    def __init__(self, config: Optional[HTTPPoolConfig] = None):
+        self.config = config or create_http_pool_config()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is loop:
+            return self._session
+
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            if self._session is not None and not self._session.closed and self._loop is loop:
+                return self._session
+            if self._session is not None and self._loop is not loop:
+                # 舊循環上的連接無法在當前循環中復用或關閉，直接丟棄
+                logger.debug("事件循環已變化，重新創建 HTTP 連接池")
+                self._session.detach()
+            connector = aiohttp.TCPConnector(
+                limit=self.config.limit,
+                limit_per_host=self.config.limit_per_host,
+                ttl_dns_cache=self.config.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.config.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=self.config.timeout(),
+                # 共享會話為所有用戶獲取公開網頁，不保存任何站點的 Cookie
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+            self._loop = loop
+            self._closer = loop.create_task(self._close_on_shutdown(self._session))
+            return self._session
+
+    @staticmethod
+    async def _close_on_shutdown(session: aiohttp.ClientSession):
+        """一直等待到事件循環關閉時被取消，然後關閉連接池"""
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            if not session.closed:
+                await session.close()
+
+    async def close(self):
+        if self._closer is not None and self._loop is asyncio.get_running_loop():
+            self._closer.cancel()
+        self._closer = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+
+_shared_client: Optional[SharedHTTPClient] = None
+
+
+def get_shared_client() -> SharedHTTPClient:
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = SharedHTTPClient()
+    return _shared_client
+
+
+async def close_shared_client():
+    """立即關閉應用級連接池（事件循環關閉時也會自動關閉）"""
+    if _shared_client is not None:
+        await _shared_client.close()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Near Duplicate - 網頁正文近似重複檢測
+對提取後的正文計算 64 位 SimHash（詞級 shingle，中日韓文字按字），
+用分段索引查找漢明距離不超過 max_distance 的指紋：指紋分成 max_distance + 1 段，
+距離不超過 max_distance 的兩個指紋至少有一段完全相同（抽屜原理），只需比較同段的候選
+"""
+
+import re
+import sys
+import zlib
+from array import array
+from hashlib import blake2b
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+_WORD = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af\uf900-\ufaff]|\w+")
+# 第 bit 位的轉換表：字節值該位為 1 時映射為 1，否則為 0
+_BIT_TABLES = [bytes(value >> bit & 1 for value in range(256)) for bit in range(8)]
+
+
+def simhash(text: str, shingle_size: int = 4, min_tokens: int = 0) -> Optional[int]:
+    """
+    正文的 64 位 SimHash；詞數少於 min_tokens 時返回 None（太短的文本指紋不可靠）
+    各位的計數按整個 shingle 列表批量計算，避免對每個 shingle 逐位循環
+    """
+    tokens = _WORD.findall(text.lower())
+    vocabulary = {token: zlib.crc32(token.encode("utf-8")) for token in set(tokens)}
+    hashes = array("I", map(vocabulary.__getitem__, tokens))
+    if not hashes or len(hashes) < min_tokens:
+        return None
+
+    # shingle 哈希：相鄰 size 個詞哈希（小端 4 字節）拼接後的 8 字節 blake2b 摘要，
+    # 與進程和 PYTHONHASHSEED 無關，持久化的指紋在重啟後仍可比較
+    if sys.byteorder == "big":
+        hashes.byteswap()
+    words = hashes.tobytes()
+    size = min(shingle_size, len(hashes)) * 4
+    # 逐個追加到 bytearray，不為每個摘要保留單獨的 bytes 對象
+    packed = bytearray()
+    for start in range(0, len(words) - size + 1, 4):
+        packed += blake2b(words[start:start + size], digest_size=8).digest()
+
+    # 摘要按小端解釋，第 position 個字節位於 [position::8]；
+    # 各位為 1 的次數用 translate + count 在 C 層統計，重複的 shingle 自然按出現次數加權
+    half = len(packed) / 16
+    fingerprint = 0
+    for bit, table in enumerate(_BIT_TABLES):
+        bits = packed.translate(table)
+        for position in range(8):
+            if bits[position::8].count(1) > half:
+                fingerprint |= 1 << (position * 8 + bit)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """
+    指紋分段索引
+    - add() / remove(): 按鍵增刪指紋
+    - find(): 返回距離最近且不超過 max_distance 的 (鍵, 距離)
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width = 64 // bands
+        # 最後一段包含除不盡的剩餘位
+        self._bands: List[Tuple[int, int]] = [
+            (band * width, (width if band < bands - 1 else 64 - band * width)) for band in range(bands)
+        ]
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in self._bands]
+        self.fingerprints: Dict[str, int] = {}
+
+    def _band_values(self, fingerprint: int):
+        for shift, width in self._bands:
+            yield fingerprint >> shift & ((1 << width) - 1)
+
+    def add(self, key: str, fingerprint: int):
+        self.remove(key)
+        self.fingerprints[key] = fingerprint
+        for table, value in zip(self._tables, self._band_values(fingerprint)):
+            table.setdefault(value, set()).add(key)
+
+    def remove(self, key: str):
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for table, value in zip(self._tables, self._band_values(fingerprint)):
+            keys = table.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del table[value]
+
+    def find(self, fingerprint: int, exclude: Optional[str] = None,
+             accept: Optional[Callable[[str], bool]] = None) -> Optional[Tuple[str, int]]:
+        """accept 不為空時只考慮 accept(鍵, 距離) 為真的候選"""
+        best: Optional[Tuple[str, int]] = None
+        checked: Set[str] = set()
+        for table, value in zip(self._tables, self._band_values(fingerprint)):
+            for key in table.get(value, ()):
+                if key == exclude or key in checked:
+                    continue
+                checked.add(key)
+                distance = hamming_distance(fingerprint, self.fingerprints[key])
+                if distance > self.max_distance or (best is not None and distance >= best[1]):
+                    continue
+                if accept is None or accept(key, distance):
+                    best = (key, distance)
+        return best
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
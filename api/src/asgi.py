@@ -0,0 +1,91 @@
+"""
+ASGI 入口
+
+Flask 开发服务器和同步 worker 中，每个等待模型响应的请求都占用一个线程。
+ASGI 模式下调用模型的路由（AI助手 /process 和 SmartUI 的设备配置类路由）由 FastAPI 原生处理，
+直接 await 蓝图共用的协程，成百上千个进行中的模型调用共享同一个事件循环；
+其余路由（统计、健康检查、用户、静态文件）通过 WSGI 适配器转发给原 Flask 应用，路径和响应格式不变。
+
+用法（在 api/src 目录下）: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import os
+import json
+from typing import Any, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+# starlette 自带的 WSGIMiddleware 已弃用，官方推荐 a2wsgi
+from a2wsgi import WSGIMiddleware
+
+from background_loop import DEFAULT_TIMEOUT
+from routes import ai_assistant, smartui
+
+# 转发给 Flask 应用的请求在线程池中执行，线程数即同时处理的 WSGI 请求数
+WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", "10"))
+
+
+async def _json_body(request: Request) -> Optional[Any]:
+    """与 Flask request.get_json(silent=True) 一致：正文不是合法 JSON 时返回 None"""
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        return None
+
+
+def _response(result) -> Response:
+    """共用协程返回 (响应体, 状态码[, 响应头])；响应体为 None 时（304）不带正文"""
+    body, status, *headers = result
+    headers = headers[0] if headers else None
+    if body is None:
+        return Response(status_code=status, headers=headers)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+def create_asgi_app(wsgi_app=None) -> FastAPI:
+    """创建 ASGI 应用；wsgi_app 为承接其余路由的 Flask 应用，默认使用 main.app"""
+    if wsgi_app is None:
+        from main import app as wsgi_app
+
+    app = FastAPI(title="AICore API", docs_url=None, redoc_url=None, openapi_url=None)
+
+    # 启用CORS支持（与 Flask 应用的 CORS(app, origins="*") 一致）
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.post("/api/ai-assistant/process")
+    async def process_request(request: Request):
+        """处理AI助手请求"""
+        return _response(await ai_assistant.process_ai_request(await _json_body(request), DEFAULT_TIMEOUT))
+
+    @app.post("/api/smartui/configure")
+    async def configure_smartui(request: Request):
+        """配置SmartUI响应式设计"""
+        return _response(await smartui.configure(await _json_body(request), request.headers.get("if-none-match")))
+
+    @app.post("/api/smartui/reconfigure")
+    async def reconfigure_smartui(request: Request):
+        """重新配置SmartUI（用于视口变化）"""
+        return _response(await smartui.reconfigure(await _json_body(request), request.headers.get("if-none-match")))
+
+    @app.post("/api/smartui/ag-ui-guidance")
+    async def get_ag_ui_guidance(request: Request):
+        """获取AG-UI智能指导"""
+        return _response(await smartui.ag_ui_guidance(await _json_body(request)))
+
+    @app.get("/api/smartui/test")
+    async def test_smartui():
+        """测试SmartUI系统"""
+        return _response(await smartui.run_test())
+
+    # 其余路由交给 Flask 应用（必须最后挂载，否则会覆盖上面的原生路由）
+    app.mount("/", WSGIMiddleware(wsgi_app, workers=WSGI_WORKERS))
+    return app
+
+
+app = create_asgi_app()
@@ -0,0 +1,124 @@
+"""
+后台事件循环
+
+应用持有一个长期运行的事件循环线程，Flask 蓝图通过 run_coroutine_threadsafe 把协程提交给它，
+不再为每个请求创建和关闭事件循环；协程中创建的连接、客户端和缓存都绑定在同一个循环上，可以跨请求复用。
+进程退出时（atexit）取消未完成的任务并关闭循环
+"""
+
+import os
+import atexit
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+# run_async 的默认超时（秒）：卡住的协程不会一直占用 Flask 的工作线程
+DEFAULT_TIMEOUT = float(os.environ.get("BACKGROUND_LOOP_TIMEOUT", "300"))
+
+
+class BackgroundLoop:
+    """
+    后台事件循环线程
+    - start(): 启动线程（幂等），返回事件循环
+    - run(): 在后台循环中运行协程并阻塞等待结果，超时后取消协程并抛出 TimeoutError
+    - stop(): 取消未完成的任务、关闭异步生成器并停止线程
+    fork 后的子进程（例如预加载应用的 gunicorn worker）没有父进程的线程，首次使用时重新启动
+    """
+
+    def __init__(self, name: str = "flask-asyncio"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._pid == os.getpid() and self._loop.is_running()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                thread = threading.Thread(target=self._run_forever, args=(loop, ready),
+                                          name=self.name, daemon=True)
+                thread.start()
+                ready.wait()
+                self._loop, self._thread, self._pid = loop, thread, os.getpid()
+        return self._loop
+
+    @staticmethod
+    def _run_forever(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """提交协程，立即返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"后台协程超时（{timeout} 秒）")
+
+    def stop(self, timeout: float = 5.0):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid():
+                return
+            self._loop = self._thread = self._pid = None
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"后台事件循环关闭不完整: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+    @staticmethod
+    async def _shutdown():
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.get_running_loop().shutdown_asyncgens()
+
+
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """应用级后台事件循环"""
+    return _background_loop
+
+
+def run_async(coro: Awaitable[Any], timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+    """在应用级后台事件循环中运行协程（供同步的 Flask 视图函数调用）"""
+    return _background_loop.run(coro, timeout)
+
+
+def shutdown_background_loop():
+    _background_loop.stop()
+
+
+def init_background_loop(app):
+    """把后台事件循环挂到 Flask 应用上，并立即启动（避免第一个请求承担启动开销）"""
+    app.extensions["background_loop"] = _background_loop
+    _background_loop.start()
+    return _background_loop
+
+
+atexit.register(shutdown_background_loop)
@@ -9,6 +9,7 @@ from src.models.user import db
 from src.routes.user import user_bp
 from routes.ai_assistant import ai_assistant_bp
 from routes.smartui import smartui_bp
+from background_loop import init_background_loop
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -16,6 +17,9 @@ app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 # 启用CORS支持
 CORS(app, origins="*")
 
+# 蓝图中的协程提交到应用持有的后台事件循环（进程退出时自动关闭）
+init_background_loop(app)
+
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(ai_assistant_bp)
 
@@ -27,8 +31,6 @@ with app.app_context():
     db.create_all()
 
 # Register blueprints
-app.register_blueprint(user_bp)
-app.register_blueprint(ai_assistant_bp)
 app.register_blueprint(smartui_bp)
 
 @app.route('/', defaults={'path': ''})
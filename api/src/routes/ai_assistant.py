@@ -5,16 +5,26 @@ AI助手API路由
 """
 
 from flask import Blueprint, request, jsonify
-import asyncio
 import sys
 import os
+import asyncio
+import logging
 
 # 添加项目根目录到Python路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../..'))
 
-from core.components.ai_ecosystem_integration.claudeditor.multi_model_coordinator import MultiModelCoordinator
-from core.components.ai_ecosystem_integration.claudeditor.claude_api_client import ClaudeAPIClient
-from core.components.ai_ecosystem_integration.claudeditor.gemini_api_client import GeminiAPIClient
+from background_loop import run_async
+
+# 导入多模型组件（不可用时由 init_coordinator 报错，端点返回 500）
+try:
+    from core.components.ai_ecosystem_integration.claudeditor.multi_model_coordinator import MultiModelCoordinator
+    from core.components.ai_ecosystem_integration.claudeditor.claude_api_client import ClaudeAPIClient
+    from core.components.ai_ecosystem_integration.claudeditor.gemini_api_client import GeminiAPIClient
+except ImportError as e:
+    logging.warning(f"Multi-model components not available: {e}")
+    MultiModelCoordinator = None
+    ClaudeAPIClient = None
+    GeminiAPIClient = None
 
 ai_assistant_bp = Blueprint('ai_assistant', __name__, url_prefix='/api/ai-assistant')
 
@@ -25,6 +35,9 @@ def init_coordinator():
     """初始化多模型协调器"""
     global coordinator
     if coordinator is None:
+        if MultiModelCoordinator is None:
+            raise RuntimeError('多模型协调器组件不可用')
+        
         # API密钥配置
         claude_api_key = os.environ.get("ANTHROPIC_API_KEY", "")
         gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
@@ -38,21 +51,20 @@ def init_coordinator():
     
     return coordinator
 
-@ai_assistant_bp.route('/process', methods=['POST'])
-def process_request():
-    """处理AI助手请求"""
+async def process_ai_request(data, timeout=None):
+    """
+    处理AI助手请求（Flask 蓝图和 ASGI 应用共用），返回 (响应体, 状态码)
+    timeout 限制模型调用的时间，超时按处理错误返回 500
+    """
     try:
-        # 获取请求数据
-        data = request.get_json()
-        
         if not data:
-            return jsonify({'error': '无效的请求数据'}), 400
+            return {'error': '无效的请求数据'}, 400
         
         # 验证必需字段
         required_fields = ['task_type', 'prompt']
         for field in required_fields:
             if field not in data:
-                return jsonify({'error': f'缺少必需字段: {field}'}), 400
+                return {'error': f'缺少必需字段: {field}'}, 400
         
         # 初始化协调器
         coord = init_coordinator()
@@ -66,27 +78,34 @@ def process_request():
         priority = data.get('priority', 3)
         constraints = data.get('constraints', {})
         
-        # 异步处理请求
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        result = await asyncio.wait_for(
+            coord.process_request(
+                task_type=task_type,
+                prompt=prompt,
+                language=language,
+                strategy=strategy,
+                context=context,
+                priority=priority,
+                constraints=constraints
+            ),
+            timeout
+        )
         
-        try:
-            result = loop.run_until_complete(
-                coord.process_request(
-                    task_type=task_type,
-                    prompt=prompt,
-                    language=language,
-                    strategy=strategy,
-                    context=context,
-                    priority=priority,
-                    constraints=constraints
-                )
-            )
-            
-            return jsonify(result)
+        return result, 200
             
-        finally:
-            loop.close()
+    except Exception as e:
+        return {
+            'error': f'处理请求时发生错误: {str(e)}',
+            'success': False
+        }, 500
+
+@ai_assistant_bp.route('/process', methods=['POST'])
+def process_request():
+    """处理AI助手请求"""
+    try:
+        # 在应用的后台事件循环中处理请求（协调器的客户端和连接跨请求复用）
+        body, status = run_async(process_ai_request(request.get_json(silent=True)))
+        return jsonify(body), status
             
     except Exception as e:
         return jsonify({
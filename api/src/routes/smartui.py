@@ -3,11 +3,13 @@ SmartUI API Routes - 智能响应式UI API接口
 基于AG-UI指导的后端API服务
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 import logging
-import asyncio
 from typing import Dict, Any, Optional
 
+from background_loop import run_async
+from smartui_cache import get_precomputed
+
 # 导入SmartUI组件
 try:
     import sys
@@ -35,12 +37,46 @@ def get_smartui_manager():
         smartui_manager = SmartUIManager()
     return smartui_manager
 
-@smartui_bp.route('/configure', methods=['POST'])
-def configure_smartui():
+async def _configure_with_css(manager, viewport_width, viewport_height, user_agent):
+    """检测设备并生成响应式CSS（一次提交到后台事件循环）"""
+    config = await manager.detect_device_and_configure(viewport_width, viewport_height, user_agent)
+    css = await manager.generate_responsive_css(config)
+    return config, css
+
+async def _resolve(manager, viewport_width, viewport_height, user_agent):
+    """按断点取预计算的配置和CSS，预计算未就绪或超出范围时实时计算；返回 (配置, 断点)"""
+    precomputed = get_precomputed()
+    # 首个请求在后台启动断点预计算，本次请求不等待
+    precomputed.schedule_build(manager)
+    entry = precomputed.lookup(viewport_width, viewport_height, user_agent)
+    if entry is not None:
+        config = entry.config_for(viewport_width, viewport_height)
+    else:
+        config, css = await _configure_with_css(manager, viewport_width, viewport_height, user_agent)
+        entry = precomputed.register(config, css, viewport_width, viewport_height, user_agent)
+    precomputed.last_config = config
+    return config, entry
+
+def _unchanged(entry, data, if_none_match):
+    """视口变化仍在客户端已有的断点内：If-None-Match 命中返回 304，请求体中的 css_etag 命中返回简短响应"""
+    headers = {'ETag': entry.etag}
+    if entry.matches(if_none_match):
+        return None, 304, headers
+    if entry.matches(data.get('css_etag')):
+        return {
+            'success': True,
+            'unchanged': True,
+            'device_type': entry.config.device_type.value,
+            'breakpoint': entry.config.breakpoint.value,
+            'css_etag': entry.etag
+        }, 200, headers
+    return None
+
+# 以下协程由 Flask 蓝图（经后台事件循环）和 ASGI 应用共用，返回 (响应体, 状态码[, 响应头])
+
+async def configure(data, if_none_match=None):
     """配置SmartUI响应式设计"""
     try:
-        data = request.get_json()
-        
         viewport_width = data.get('viewport_width', 1200)
         viewport_height = data.get('viewport_height', 800)
         user_agent = data.get('user_agent', '')
@@ -52,75 +88,63 @@ def configure_smartui():
         manager = get_smartui_manager()
         if not manager:
             # 降级到前端检测
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'SmartUI backend not available, using frontend detection',
                 'fallback': True
-            })
+            }, 200
         
-        # 异步检测设备并配置
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # 检测设备并生成响应式CSS（同一断点使用预计算结果）
+        config, entry = await _resolve(manager, viewport_width, viewport_height, user_agent)
+        unchanged = _unchanged(entry, data, if_none_match)
+        if unchanged:
+            return unchanged
         
-        try:
-            config = loop.run_until_complete(
-                manager.detect_device_and_configure(
-                    viewport_width, viewport_height, user_agent
-                )
-            )
-            
-            # 生成响应式CSS
-            css = loop.run_until_complete(manager.generate_responsive_css(config))
-            
-            # 生成JavaScript配置
-            js_config = {
-                'deviceType': config.device_type.value,
+        # 生成JavaScript配置
+        js_config = {
+            'deviceType': config.device_type.value,
+            'breakpoint': config.breakpoint.value,
+            'layoutColumns': config.layout_columns,
+            'touchOptimized': config.touch_optimized,
+            'sidebarWidth': config.sidebar_width,
+            'headerHeight': config.header_height,
+            'fontScale': config.font_scale,
+            'spacingScale': config.spacing_scale
+        }
+        
+        logger.info(f"SmartUI配置完成: {config.device_type.value}")
+        
+        return {
+            'success': True,
+            'config': {
+                'device_type': config.device_type.value,
                 'breakpoint': config.breakpoint.value,
-                'layoutColumns': config.layout_columns,
-                'touchOptimized': config.touch_optimized,
-                'sidebarWidth': config.sidebar_width,
-                'headerHeight': config.header_height,
-                'fontScale': config.font_scale,
-                'spacingScale': config.spacing_scale
-            }
-            
-            logger.info(f"SmartUI配置完成: {config.device_type.value}")
-            
-            return jsonify({
-                'success': True,
-                'config': {
-                    'device_type': config.device_type.value,
-                    'breakpoint': config.breakpoint.value,
-                    'viewport_width': config.viewport_width,
-                    'viewport_height': config.viewport_height,
-                    'layout_columns': config.layout_columns,
-                    'sidebar_width': config.sidebar_width,
-                    'header_height': config.header_height,
-                    'touch_optimized': config.touch_optimized,
-                    'font_scale': config.font_scale,
-                    'spacing_scale': config.spacing_scale
-                },
-                'css': css,
-                'js_config': js_config
-            })
-            
-        finally:
-            loop.close()
+                'viewport_width': config.viewport_width,
+                'viewport_height': config.viewport_height,
+                'layout_columns': config.layout_columns,
+                'sidebar_width': config.sidebar_width,
+                'header_height': config.header_height,
+                'touch_optimized': config.touch_optimized,
+                'font_scale': config.font_scale,
+                'spacing_scale': config.spacing_scale
+            },
+            'css': entry.css,
+            'css_url': entry.css_url,
+            'css_etag': entry.etag,
+            'js_config': js_config
+        }, 200, {'ETag': entry.etag}
             
     except Exception as e:
         logger.error(f"SmartUI配置失败: {e}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e),
             'message': 'SmartUI configuration failed'
-        }), 500
+        }, 500
 
-@smartui_bp.route('/reconfigure', methods=['POST'])
-def reconfigure_smartui():
+async def reconfigure(data, if_none_match=None):
     """重新配置SmartUI（用于视口变化）"""
     try:
-        data = request.get_json()
-        
         viewport_width = data.get('viewport_width', 1200)
         viewport_height = data.get('viewport_height', 800)
         user_agent = data.get('user_agent', '')
@@ -129,50 +153,39 @@ def reconfigure_smartui():
         
         manager = get_smartui_manager()
         if not manager:
-            return jsonify({
+            return {
                 'success': False,
                 'message': 'SmartUI backend not available'
-            })
+            }, 200
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        config, entry = await _resolve(manager, viewport_width, viewport_height, user_agent)
+        unchanged = _unchanged(entry, data, if_none_match)
+        if unchanged:
+            return unchanged
         
-        try:
-            config = loop.run_until_complete(
-                manager.detect_device_and_configure(
-                    viewport_width, viewport_height, user_agent
-                )
-            )
-            
-            css = loop.run_until_complete(manager.generate_responsive_css(config))
-            
-            return jsonify({
-                'success': True,
-                'device_type': config.device_type.value,
-                'css': css,
-                'config': {
-                    'layout_columns': config.layout_columns,
-                    'sidebar_width': config.sidebar_width,
-                    'touch_optimized': config.touch_optimized
-                }
-            })
-            
-        finally:
-            loop.close()
+        return {
+            'success': True,
+            'device_type': config.device_type.value,
+            'css': entry.css,
+            'css_url': entry.css_url,
+            'css_etag': entry.etag,
+            'config': {
+                'layout_columns': config.layout_columns,
+                'sidebar_width': config.sidebar_width,
+                'touch_optimized': config.touch_optimized
+            }
+        }, 200, {'ETag': entry.etag}
             
     except Exception as e:
         logger.error(f"SmartUI重新配置失败: {e}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500
 
-@smartui_bp.route('/ag-ui-guidance', methods=['POST'])
-def get_ag_ui_guidance():
+async def ag_ui_guidance(data):
     """获取AG-UI智能指导"""
     try:
-        data = request.get_json()
-        
         component_type = data.get('component_type', 'general')
         context = data.get('context', {})
         
@@ -180,37 +193,99 @@ def get_ag_ui_guidance():
         
         manager = get_smartui_manager()
         if not manager:
-            return jsonify({
+            return {
                 'success': False,
                 'guidance': 'AG-UI guidance not available',
                 'recommendations': []
-            })
+            }, 200
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        guidance = await manager.get_ag_ui_guidance(component_type, context)
         
-        try:
-            guidance = loop.run_until_complete(
-                manager.get_ag_ui_guidance(component_type, context)
-            )
-            
-            return jsonify({
-                'success': True,
-                'guidance': guidance,
-                'component_type': component_type,
-                'context': context
-            })
-            
-        finally:
-            loop.close()
+        return {
+            'success': True,
+            'guidance': guidance,
+            'component_type': component_type,
+            'context': context
+        }, 200
             
     except Exception as e:
         logger.error(f"AG-UI指导获取失败: {e}")
-        return jsonify({
+        return {
             'success': False,
             'error': str(e),
             'guidance': 'Error getting AG-UI guidance'
-        }), 500
+        }, 500
+
+async def run_test():
+    """测试SmartUI系统"""
+    try:
+        # 测试不同设备类型的配置
+        test_cases = [
+            {'width': 375, 'height': 667, 'name': 'iPhone'},
+            {'width': 768, 'height': 1024, 'name': 'iPad'},
+            {'width': 1200, 'height': 800, 'name': 'Desktop'},
+            {'width': 1920, 'height': 1080, 'name': 'Large Desktop'}
+        ]
+        
+        results = []
+        manager = get_smartui_manager()
+        
+        if not manager:
+            return {
+                'success': False,
+                'message': 'SmartUI not available for testing'
+            }, 200
+        
+        for case in test_cases:
+            config = await manager.detect_device_and_configure(case['width'], case['height'], '')
+            
+            results.append({
+                'test_case': case['name'],
+                'viewport': f"{case['width']}x{case['height']}",
+                'detected_device': config.device_type.value,
+                'breakpoint': config.breakpoint.value,
+                'layout_columns': config.layout_columns,
+                'sidebar_width': config.sidebar_width,
+                'touch_optimized': config.touch_optimized
+            })
+        
+        return {
+            'success': True,
+            'test_results': results,
+            'message': 'SmartUI test completed successfully'
+        }, 200
+            
+    except Exception as e:
+        logger.error(f"SmartUI测试失败: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }, 500
+
+def _respond(coro):
+    """在后台事件循环中运行共用协程并转换为 Flask 响应"""
+    try:
+        body, status, *headers = run_async(coro)
+    except Exception as e:
+        logger.error(f"SmartUI请求失败: {e}")
+        body, status, headers = {'success': False, 'error': str(e)}, 500, []
+    response = jsonify(body) if body is not None else Response(status=status)
+    return response, status, headers[0] if headers else {}
+
+@smartui_bp.route('/configure', methods=['POST'])
+def configure_smartui():
+    """配置SmartUI响应式设计"""
+    return _respond(configure(request.get_json(silent=True), request.headers.get('If-None-Match')))
+
+@smartui_bp.route('/reconfigure', methods=['POST'])
+def reconfigure_smartui():
+    """重新配置SmartUI（用于视口变化）"""
+    return _respond(reconfigure(request.get_json(silent=True), request.headers.get('If-None-Match')))
+
+@smartui_bp.route('/ag-ui-guidance', methods=['POST'])
+def get_ag_ui_guidance():
+    """获取AG-UI智能指导"""
+    return _respond(ag_ui_guidance(request.get_json(silent=True)))
 
 @smartui_bp.route('/status', methods=['GET'])
 def get_smartui_status():
@@ -222,11 +297,13 @@ def get_smartui_status():
             'smartui_available': manager is not None,
             'ag_ui_available': ComponentGenerator is not None,
             'current_config': None,
-            'device_configs': None
+            'device_configs': None,
+            'precompute': get_precomputed().stats()
         }
         
         if manager:
-            current_config = manager.get_current_config()
+            # 预计算命中时不会调用管理器的设备检测，以最近一次返回的配置为准
+            current_config = get_precomputed().last_config or manager.get_current_config()
             if current_config:
                 status['current_config'] = {
                     'device_type': current_config.device_type.value,
@@ -258,63 +335,27 @@ def get_smartui_status():
             'error': str(e)
         }), 500
 
+@smartui_bp.route('/css/<css_hash>.css', methods=['GET'])
+def get_smartui_css(css_hash):
+    """按内容哈希提供断点CSS（内容不变，可长期缓存）"""
+    css = get_precomputed().asset(css_hash)
+    if css is None:
+        return jsonify({
+            'success': False,
+            'error': 'SmartUI CSS not found'
+        }), 404
+    
+    response = Response(css, mimetype='text/css')
+    response.set_etag(css_hash)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
 @smartui_bp.route('/test', methods=['GET'])
 def test_smartui():
     """测试SmartUI系统"""
-    try:
-        # 测试不同设备类型的配置
-        test_cases = [
-            {'width': 375, 'height': 667, 'name': 'iPhone'},
-            {'width': 768, 'height': 1024, 'name': 'iPad'},
-            {'width': 1200, 'height': 800, 'name': 'Desktop'},
-            {'width': 1920, 'height': 1080, 'name': 'Large Desktop'}
-        ]
-        
-        results = []
-        manager = get_smartui_manager()
-        
-        if not manager:
-            return jsonify({
-                'success': False,
-                'message': 'SmartUI not available for testing'
-            })
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            for case in test_cases:
-                config = loop.run_until_complete(
-                    manager.detect_device_and_configure(
-                        case['width'], case['height'], ''
-                    )
-                )
-                
-                results.append({
-                    'test_case': case['name'],
-                    'viewport': f"{case['width']}x{case['height']}",
-                    'detected_device': config.device_type.value,
-                    'breakpoint': config.breakpoint.value,
-                    'layout_columns': config.layout_columns,
-                    'sidebar_width': config.sidebar_width,
-                    'touch_optimized': config.touch_optimized
-                })
-            
-            return jsonify({
-                'success': True,
-                'test_results': results,
-                'message': 'SmartUI test completed successfully'
-            })
-            
-        finally:
-            loop.close()
-            
-    except Exception as e:
-        logger.error(f"SmartUI测试失败: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return _respond(run_test())
 
 # 错误处理
 @smartui_bp.errorhandler(404)
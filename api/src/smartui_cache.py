@@ -0,0 +1,269 @@
+"""
+SmartUI 断点预计算
+
+浏览器每次 resize 都会请求 /api/smartui/reconfigure，原实现每次都调用 detect_device_and_configure
+和 generate_responsive_css。SmartUI 的配置只随断点和设备类型变化，因此为每个设备类型
+（以代表性 User-Agent 探测）和屏幕方向探测出各断点的宽度区间，每个断点只生成一次配置和 CSS：
+- 预计算在首个 SmartUI 请求时于后台任务中进行，不拖慢启动和 worker 创建；完成前请求按原方式实时计算
+- 请求时按 (设备类型, 方向, 宽度) 二分查找所在断点，复制预计算的配置并填入实际视口尺寸
+- User-Agent 不另做分类：某个 UA 第一次实时计算时，以管理器返回的配置与各设备类型同宽度的断点比对，
+  唯一匹配时记住该 UA 所属的设备类型（LRU），分类始终以 SmartUI 管理器为准
+- CSS 以内容哈希命名（/api/smartui/css/<哈希>.css），断点配置带强 ETag，
+  视口变化仍落在同一断点时可以返回 304 或简短的 unchanged 响应
+超出探测范围的视口、尚未归类的 User-Agent、或预计算失败时回退到实时计算
+"""
+
+import os
+import copy
+import asyncio
+import bisect
+import hashlib
+import logging
+import dataclasses
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SMARTUI_PRECOMPUTE=0 关闭预计算（每次请求实时计算）
+PRECOMPUTE_ENABLED = os.environ.get("SMARTUI_PRECOMPUTE", "1") != "0"
+# 记住所属设备类型的 User-Agent 个数（LRU）
+UA_CACHE_SIZE = int(os.environ.get("SMARTUI_UA_CACHE_SIZE", "1024"))
+# 探测的宽度范围和粗扫步长；相邻采样点落在不同断点时二分找出精确边界
+MIN_WIDTH = 240
+MAX_WIDTH = int(os.environ.get("SMARTUI_MAX_WIDTH", "3840"))
+PROBE_STEP = 16
+# 实时计算（超出探测范围）生成的 CSS 资源最多保留的个数
+MAX_LIVE_ASSETS = 256
+# 预计算每调用这么多次设备检测让出一次事件循环，不阻塞同一循环上的请求
+YIELD_EVERY = 32
+
+# 每个设备类型探测时使用的代表性 User-Agent（也是预先归类的 UA）
+REPRESENTATIVE_USER_AGENTS = {
+    "mobile": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+              "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "tablet": "Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X) AppleWebKit/605.1.15 "
+              "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "desktop": "",
+}
+ORIENTATIONS = ("portrait", "landscape")
+
+def orientation(viewport_width: int, viewport_height: int) -> str:
+    return "portrait" if viewport_height > viewport_width else "landscape"
+
+
+def _probe_height(width: int, orient: str) -> int:
+    """探测用的视口高度：保持方向不变"""
+    return round(width * 4 / 3) if orient == "portrait" else round(width * 3 / 4)
+
+
+def _signature(config) -> Tuple:
+    """配置中与视口尺寸无关的部分；相同签名视为同一断点"""
+    return (
+        config.device_type.value,
+        config.breakpoint.value,
+        config.layout_columns,
+        config.sidebar_width,
+        config.header_height,
+        config.touch_optimized,
+        config.font_scale,
+        config.spacing_scale,
+    )
+
+
+def _digest(data: str) -> str:
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@dataclasses.dataclass
+class BreakpointEntry:
+    """一个断点的预计算结果"""
+    config: Any
+    css: str
+    css_hash: str
+    etag: str
+
+    @property
+    def css_url(self) -> str:
+        return f"/api/smartui/css/{self.css_hash}.css"
+
+    def config_for(self, viewport_width: int, viewport_height: int):
+        """预计算配置的副本，填入实际视口尺寸"""
+        if dataclasses.is_dataclass(self.config):
+            return dataclasses.replace(self.config, viewport_width=viewport_width, viewport_height=viewport_height)
+        config = copy.copy(self.config)
+        config.viewport_width = viewport_width
+        config.viewport_height = viewport_height
+        return config
+
+    def matches(self, etag: Optional[str]) -> bool:
+        """If-None-Match（可带 W/ 前缀或多个值）或请求体中的 css_etag 是否指向本断点"""
+        if not etag:
+            return False
+        return any(tag.strip().removeprefix("W/") in (self.etag, self.etag.strip('"'))
+                   for tag in etag.split(","))
+
+
+def _make_entry(config, css: str) -> BreakpointEntry:
+    """CSS 资源按 CSS 内容哈希命名；ETag 同时覆盖断点配置签名和 CSS"""
+    css_hash = _digest(css)
+    return BreakpointEntry(config, css, css_hash, f'"{_digest(repr(_signature(config)) + css_hash)}"')
+
+
+class SmartUIPrecomputed:
+    """
+    断点表
+    - schedule_build(): 首次请求时在当前事件循环中启动后台预计算（幂等）
+    - build(): 探测各设备类型 / 方向的断点边界并生成 CSS
+    - lookup(): 按视口和 User-Agent 找到断点，未就绪、UA 未归类或超出范围时返回 None
+    - register(): 登记实时计算的结果（同样获得 CSS 资源地址和 ETag），并据此归类 User-Agent
+    - asset(): 按内容哈希取 CSS
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.last_config = None
+        # (设备类型, 方向) -> (区间起始宽度列表, 对应的断点)
+        self._tables: Dict[Tuple[str, str], Tuple[List[int], List[BreakpointEntry]]] = {}
+        self._entries: Dict[Tuple, BreakpointEntry] = {}
+        self._assets: Dict[str, str] = {}
+        self._live_assets: "OrderedDict[str, str]" = OrderedDict()
+        # User-Agent -> 设备类型（由管理器的实时结果确定）
+        self._ua_devices: "OrderedDict[str, str]" = OrderedDict()
+        self._ua_hits = 0
+        self._ua_misses = 0
+        self._building: Optional[asyncio.Future] = None
+
+    def schedule_build(self, manager):
+        """在当前事件循环中后台预计算；已就绪、进行中、已失败或已关闭预计算时不做任何事"""
+        if PRECOMPUTE_ENABLED and self._building is None:
+            self._building = asyncio.ensure_future(self._build_in_background(manager))
+
+    async def _build_in_background(self, manager):
+        try:
+            await self.build(manager)
+        except Exception as e:
+            logger.warning(f"SmartUI预计算失败，回退到实时计算: {e}")
+
+    async def build(self, manager):
+        """探测断点并预生成 CSS；失败时保持未就绪，请求回退到实时计算"""
+        tables = {}
+        entries: Dict[Tuple, BreakpointEntry] = {}
+        configs: Dict[Tuple, Any] = {}
+        calls = 0
+
+        async def detect(width, orient, user_agent):
+            nonlocal calls
+            calls += 1
+            if calls % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+            config = await manager.detect_device_and_configure(width, _probe_height(width, orient), user_agent)
+            signature = _signature(config)
+            configs.setdefault(signature, config)
+            return signature
+
+        for device, user_agent in REPRESENTATIVE_USER_AGENTS.items():
+            for orient in ORIENTATIONS:
+                widths = list(range(MIN_WIDTH, MAX_WIDTH, PROBE_STEP)) + [MAX_WIDTH]
+                samples = [await detect(width, orient, user_agent) for width in widths]
+                starts, signatures = [MIN_WIDTH], [samples[0]]
+                for (low, low_sig), (high, high_sig) in zip(zip(widths, samples), zip(widths[1:], samples[1:])):
+                    if low_sig == high_sig:
+                        continue
+                    # 边界在 (low, high] 之间：二分找出新断点的第一个宽度
+                    while high - low > 1:
+                        middle = (low + high) // 2
+                        if await detect(middle, orient, user_agent) == low_sig:
+                            low = middle
+                        else:
+                            high = middle
+                    starts.append(high)
+                    signatures.append(high_sig)
+                tables[(device, orient)] = (starts, signatures)
+
+        for signature, config in configs.items():
+            entries[signature] = _make_entry(config, await manager.generate_responsive_css(config))
+
+        self._tables = {
+            key: (starts, [entries[signature] for signature in signatures])
+            for key, (starts, signatures) in tables.items()
+        }
+        self._entries = entries
+        self._assets = {entry.css_hash: entry.css for entry in entries.values()}
+        for device, user_agent in REPRESENTATIVE_USER_AGENTS.items():
+            self._remember(user_agent, device)
+        self.ready = True
+        logger.info(f"SmartUI预计算完成: {len(entries)} 个断点配置")
+
+    def _entry_at(self, device: str, viewport_width: int, viewport_height: int) -> Optional[BreakpointEntry]:
+        table = self._tables.get((device, orientation(viewport_width, viewport_height)))
+        if table is None:
+            return None
+        starts, entries = table
+        return entries[bisect.bisect_right(starts, viewport_width) - 1]
+
+    def lookup(self, viewport_width: int, viewport_height: int, user_agent: str) -> Optional[BreakpointEntry]:
+        if not self.ready or not MIN_WIDTH <= viewport_width <= MAX_WIDTH:
+            return None
+        device = self._ua_devices.get(user_agent or "")
+        if device is None:
+            self._ua_misses += 1
+            return None
+        self._ua_hits += 1
+        self._ua_devices.move_to_end(user_agent or "")
+        return self._entry_at(device, viewport_width, viewport_height)
+
+    def _remember(self, user_agent: str, device: str):
+        self._ua_devices[user_agent] = device
+        self._ua_devices.move_to_end(user_agent)
+        while len(self._ua_devices) > UA_CACHE_SIZE:
+            self._ua_devices.popitem(last=False)
+
+    def _classify(self, config, viewport_width: int, viewport_height: int, user_agent: str):
+        """
+        管理器为该 User-Agent 实时返回的配置与某个设备类型同宽度的断点相同、且只与它相同时，
+        记住该 UA 属于这个设备类型；多个设备类型在此宽度下相同则暂不归类，留待其他宽度的请求
+        """
+        if not self.ready or not MIN_WIDTH <= viewport_width <= MAX_WIDTH or user_agent in self._ua_devices:
+            return
+        signature = _signature(config)
+        matches = [
+            device for device in REPRESENTATIVE_USER_AGENTS
+            if (entry := self._entry_at(device, viewport_width, viewport_height)) is not None
+            and _signature(entry.config) == signature
+        ]
+        if len(matches) == 1:
+            self._remember(user_agent, matches[0])
+
+    def register(self, config, css: str, viewport_width: Optional[int] = None,
+                 viewport_height: Optional[int] = None, user_agent: Optional[str] = None) -> BreakpointEntry:
+        if viewport_width is not None and viewport_height is not None:
+            self._classify(config, viewport_width, viewport_height, user_agent or "")
+        entry = self._entries.get(_signature(config))
+        if entry is None or entry.css != css:
+            entry = _make_entry(config, css)
+        if entry.css_hash not in self._assets:
+            self._live_assets[entry.css_hash] = css
+            self._live_assets.move_to_end(entry.css_hash)
+            while len(self._live_assets) > MAX_LIVE_ASSETS:
+                self._live_assets.popitem(last=False)
+        return entry
+
+    def asset(self, css_hash: str) -> Optional[str]:
+        css = self._assets.get(css_hash)
+        return css if css is not None else self._live_assets.get(css_hash)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "building": self._building is not None and not self._building.done(),
+            "breakpoints": len(self._entries),
+            "ua_cache": {"hits": self._ua_hits, "misses": self._ua_misses, "size": len(self._ua_devices)},
+        }
+
+
+_precomputed = SmartUIPrecomputed()
+
+
+def get_precomputed() -> SmartUIPrecomputed:
+    return _precomputed
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Text Chunker - 按 token 預算切分提取後的正文
+在標題和段落邊界上切分，過長的段落再按句子、最後按單詞切分；
+相鄰分塊可以重疊，每個分塊記錄來源 URL、標題路徑和在原文中的字符偏移。
+以生成器逐個產出分塊，下游索引不必等整篇文檔切分完成
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+_CJK = r"\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af\uf900-\ufaff"
+# 中日韓文字每字一個 token，其他不含空白的片段（單詞連同相鄰標點）約每 4 個字符一個 token
+_TOKEN_PIECE = re.compile(rf"[{_CJK}]|[^\s{_CJK}]+")
+_LINE = re.compile(r"[^\n]+")
+_HEADING = re.compile(r"(#{1,6}) (.+)")
+_SENTENCE_END = re.compile(r"[.!?]+\s+|[。！？]+\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 數（不依賴分詞器；偏保守，中文按字、英文按約 4 字符計）"""
+    tokens = 0
+    for piece in _TOKEN_PIECE.findall(text):
+        tokens += 1 if len(piece) <= 4 else (len(piece) + 3) // 4
+    return tokens
+
+
+@dataclass
+class ChunkConfig:
+    """分塊參數：每塊最多 max_tokens 個 token，相鄰分塊最多重疊 overlap_tokens 個 token"""
+    max_tokens: int = 512
+    overlap_tokens: int = 64
+
+
+def create_chunk_config() -> ChunkConfig:
+    """根據環境變量創建分塊參數：URL_CHUNK_MAX_TOKENS / URL_CHUNK_OVERLAP_TOKENS"""
+    return ChunkConfig(
+        max_tokens=int(os.environ.get("URL_CHUNK_MAX_TOKENS", "512")),
+        overlap_tokens=int(os.environ.get("URL_CHUNK_OVERLAP_TOKENS", "64")),
+    )
+
+
+@dataclass
+class TextChunk:
+    """一個分塊：text 即原文 [start, end) 的切片"""
+    url: str
+    index: int
+    text: str
+    start: int
+    end: int
+    tokens: int
+    heading_path: List[str] = field(default_factory=list)
+
+
+class _Unit:
+    """切分的最小單位：一行（段落、列表項、標題），或過長段落中的一句 / 一段單詞"""
+    __slots__ = ("start", "end", "tokens", "heading")
+
+    def __init__(self, start: int, end: int, tokens: int, heading: Optional[Tuple[int, str]] = None):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.heading = heading
+
+
+def _split_words(text: str, start: int, end: int, max_tokens: int,
+                 count_tokens: Callable[[str], int]) -> Iterator[_Unit]:
+    piece_start = piece_end = start
+    tokens = 0
+    for match in _TOKEN_PIECE.finditer(text, start, end):
+        piece_tokens = count_tokens(match.group())
+        if tokens and tokens + piece_tokens > max_tokens:
+            yield _Unit(piece_start, piece_end, tokens)
+            piece_start, tokens = match.start(), 0
+        piece_end = match.end()
+        tokens += piece_tokens
+    if tokens:
+        yield _Unit(piece_start, piece_end, tokens)
+
+
+def _units(text: str, start: int, end: int, max_tokens: int, piece_tokens: int,
+           count_tokens: Callable[[str], int]) -> Iterator[_Unit]:
+    for line in _LINE.finditer(text, start, end):
+        line_text = line.group()
+        if not line_text.strip():
+            continue
+        heading = _HEADING.fullmatch(line_text)
+        tokens = count_tokens(line_text)
+        if heading or tokens <= max_tokens:
+            yield _Unit(line.start(), line.end(), tokens,
+                        (len(heading.group(1)), heading.group(2).strip()) if heading else None)
+            continue
+        # 段落超出預算：按句子切分，單句仍超出時按單詞切分為不超過重疊預算的小段，使重疊仍然生效
+        boundaries = [match.end() for match in _SENTENCE_END.finditer(text, line.start(), line.end())]
+        sentence_start = line.start()
+        for boundary in boundaries + [line.end()]:
+            sentence_end = sentence_start + len(text[sentence_start:boundary].rstrip())
+            if sentence_end > sentence_start:
+                tokens = count_tokens(text[sentence_start:sentence_end])
+                if tokens <= max_tokens:
+                    yield _Unit(sentence_start, sentence_end, tokens)
+                else:
+                    yield from _split_words(text, sentence_start, sentence_end, piece_tokens, count_tokens)
+            sentence_start = boundary
+
+
+def iter_chunks(text: str, url: str = "", config: Optional[ChunkConfig] = None,
+                start: int = 0, end: Optional[int] = None, heading_path: Sequence[str] = (),
+                count_tokens: Callable[[str], int] = estimate_tokens) -> Iterator[TextChunk]:
+    """
+    切分 text[start:end]，偏移相對於整個 text
+    - 遇到標題時結束當前分塊，標題作為下一個分塊的開頭；連續的標題合併到同一個分塊
+    - 分塊因預算結束時，下一個分塊以上一塊末尾不超過 overlap_tokens 的單位開頭（不跨越標題）
+    - heading_path: 標題路徑的前綴（例如頁面標題）
+    - count_tokens: 替換 token 估算（例如接入模型的分詞器）
+    """
+    config = config or create_chunk_config()
+    end = len(text) if end is None else end
+    max_tokens = max(1, config.max_tokens)
+    overlap_tokens = min(config.overlap_tokens, max_tokens // 2)
+
+    headings: List[Tuple[int, str]] = []
+    current: List[_Unit] = []
+    tokens = 0
+    fresh = False  # 當前分塊是否有重疊部分以外的正文
+    index = 0
+
+    def make_chunk() -> TextChunk:
+        chunk_start, chunk_end = current[0].start, current[-1].end
+        path = list(heading_path)
+        for _, title in headings:
+            # 正文的一級標題通常與頁面標題相同
+            if not path or path[-1] != title:
+                path.append(title)
+        return TextChunk(
+            url=url,
+            index=index,
+            text=text[chunk_start:chunk_end],
+            start=chunk_start,
+            end=chunk_end,
+            tokens=tokens,
+            heading_path=path,
+        )
+
+    for unit in _units(text, start, end, max_tokens, overlap_tokens or max_tokens, count_tokens):
+        if unit.heading is not None:
+            if fresh:
+                yield make_chunk()
+                index += 1
+                current, tokens, fresh = [], 0, False
+            elif current and current[-1].heading is None:
+                # 只有重疊部分：丟棄，不跨越標題重疊
+                current, tokens = [], 0
+            level = unit.heading[0]
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append(unit.heading)
+            current.append(unit)
+            tokens += unit.tokens
+            continue
+
+        if fresh and tokens + unit.tokens > max_tokens:
+            yield make_chunk()
+            index += 1
+            overlap: List[_Unit] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                if overlap_size + previous.tokens > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += previous.tokens
+            current, tokens, fresh = overlap, overlap_size, False
+        if tokens + unit.tokens > max_tokens:
+            # 重疊部分或標題放不下新單位
+            while current and tokens + unit.tokens > max_tokens:
+                tokens -= current.pop(0).tokens
+        current.append(unit)
+        tokens += unit.tokens
+        fresh = True
+
+    if current and (fresh or current[-1].heading is not None):
+        yield make_chunk()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+URL Cache - 網頁內容磁盤緩存
+按標準化 URL 緩存提取後的 WebContent 及其 ETag / Last-Modified：
+- 新鮮的條目直接返回，跳過下載和提取
+- 過期的條目發送條件請求，服務器返回 304 時刷新有效期並返回緩存內容
+- 遵守 Cache-Control（no-store 不緩存，no-cache 每次重新驗證，max-age / s-maxage / Expires 決定有效期）
+- 總大小超過磁盤預算時按最近最少使用淘汰
+- 正文與已緩存頁面近似重複（SimHash）的 URL 只記錄一條指向原內容文件的條目，不再保存副本
+"""
+
+import os
+import json
+import zlib
+import time
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Mapping
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from near_duplicate import SimHashIndex
+
+logger = logging.getLogger(__name__)
+
+# 只有 Last-Modified 時的啟發式有效期：距上次修改時間的 10%，最長一天（RFC 9111 4.2.2）
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX_SECONDS = 86400
+
+
+def normalize_cache_key(url: str) -> str:
+    """緩存鍵：小寫協議和主機、去掉默認端口和片段、查詢參數排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    directives = {}
+    for item in (value or "").split(","):
+        name, _, argument = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: Mapping[str, str], now: float) -> Optional[float]:
+    """響應的有效期（秒）；不可緩存時返回 None"""
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-store" in directives or headers.get("Vary", "").strip() == "*":
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name):
+            try:
+                return max(0.0, float(directives[name]))
+            except ValueError:
+                return 0.0
+    date = _http_date(headers.get("Date")) or now
+    expires = _http_date(headers.get("Expires"))
+    if headers.get("Expires") is not None:
+        return max(0.0, expires - date) if expires is not None else 0.0
+    last_modified = _http_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        return min(HEURISTIC_MAX_SECONDS, max(0.0, (date - last_modified) * HEURISTIC_FRACTION))
+    return 0.0
+
+
+class CacheEntry:
+    """索引中的一條緩存記錄（內容保存在單獨的文件中）"""
+    __slots__ = ("key", "file", "size", "etag", "last_modified", "expires", "simhash", "text_length")
+
+    def __init__(self, key: str, file: str, size: int, etag: Optional[str],
+                 last_modified: Optional[str], expires: float, simhash: Optional[int] = None,
+                 text_length: Optional[int] = None):
+        self.key = key
+        self.file = file
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+        # 只有保存了自己內容文件的條目有指紋；近似重複的條目與原條目共用文件
+        self.simhash = simhash
+        # 正文字符數，指紋近似時按長度之比確認
+        self.text_length = text_length
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class URLCache:
+    """
+    網頁內容磁盤緩存
+    - lookup(): 查找條目（不計數）；fresh 為真時可直接 load()
+    - load(): 讀取緩存內容並計為命中（revalidated=True 時計為重新驗證）
+    - refresh(): 條件請求返回 304 後按新響應頭更新有效期
+    - store(): 下載和提取後調用，計為未命中；可緩存且未被截斷時寫入並按 LRU 淘汰
+    - find_duplicate() / reuse_duplicate(): 按正文指紋和長度之比查找近似重複的條目（其他主機的條目距離要求更嚴），
+      讀取它的內容並為新 URL 記錄共用文件的條目
+    多個條目可以共用一個內容文件，文件按引用計數刪除，total_bytes 每個文件只計一次
+    """
+
+    INDEX_FILE = "index.json"
+    # 命中只改變 LRU 順序，索引最多每隔這麼多秒寫回一次
+    INDEX_FLUSH_INTERVAL = 5.0
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, max_distance: int = 2,
+                 cross_host_distance: Optional[int] = None, min_length_ratio: float = 0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # 跨主機的近似重複使用更嚴格的距離（默認 max_distance 的一半），負數表示只在同一主機內查找
+        self.cross_host_distance = max_distance // 2 if cross_host_distance is None else cross_host_distance
+        self.min_length_ratio = min_length_ratio
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.fingerprints = SimHashIndex(max_distance) if max_distance >= 0 else None
+        self._file_refs: Dict[str, int] = {}
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0, "duplicates": 0}
+        self._dirty = False
+        self._flushed_at = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # ---- 索引 ----
+
+    def _load_index(self):
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = []
+        for record in records:
+            entry = CacheEntry(**record)
+            if os.path.exists(os.path.join(self.directory, entry.file)):
+                self._add_entry(entry)
+        # 清理不在索引中的內容文件（例如寫入索引前進程退出）
+        known = {entry.file for entry in self.entries.values()}
+        for name in os.listdir(self.directory):
+            if name.endswith(".json.z") and name not in known:
+                self._remove_file(name)
+
+    def flush(self):
+        """把索引（包括 LRU 順序）寫回磁盤"""
+        if not self._dirty:
+            return
+        path = os.path.join(self.directory, self.INDEX_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([entry.to_dict() for entry in self.entries.values()], f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+    def _mark_dirty(self, force: bool = False):
+        self._dirty = True
+        if force or time.monotonic() - self._flushed_at >= self.INDEX_FLUSH_INTERVAL:
+            self.flush()
+
+    def _add_entry(self, entry: CacheEntry):
+        self.entries[entry.key] = entry
+        refs = self._file_refs.get(entry.file, 0)
+        if refs == 0:
+            self.total_bytes += entry.size
+        self._file_refs[entry.file] = refs + 1
+        if entry.simhash is not None and self.fingerprints is not None:
+            self.fingerprints.add(entry.key, entry.simhash)
+
+    def _remove_file(self, name: str):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    # ---- 查找和讀取 ----
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        return self.entries.get(normalize_cache_key(url))
+
+    def _read(self, entry: CacheEntry) -> Optional[Dict[str, Any]]:
+        """讀取內容文件；文件丟失或損壞時移除條目並返回 None"""
+        try:
+            with open(os.path.join(self.directory, entry.file), "rb") as f:
+                content = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            self._drop(entry.key)
+            self._mark_dirty(force=True)
+            return None
+        self.entries.move_to_end(entry.key)
+        return content
+
+    def load(self, entry: CacheEntry, revalidated: bool = False) -> Optional[Dict[str, Any]]:
+        """讀取緩存內容；文件丟失或損壞時移除條目並返回 None"""
+        content = self._read(entry)
+        if content is None:
+            return None
+        self.stats["revalidated" if revalidated else "hits"] += 1
+        self._mark_dirty()
+        return content
+
+    def refresh(self, entry: CacheEntry, headers: Mapping[str, str]):
+        """304 響應：更新有效期和校驗器"""
+        lifetime = freshness_lifetime(headers, time.time())
+        if lifetime is None:
+            self._drop(entry.key)
+            self._mark_dirty(force=True)
+            return
+        entry.expires = time.time() + lifetime
+        entry.etag = headers.get("ETag") or entry.etag
+        entry.last_modified = headers.get("Last-Modified") or entry.last_modified
+        self._mark_dirty()
+
+    # ---- 寫入和淘汰 ----
+
+    def _cacheable_lifetime(self, key: str, headers: Mapping[str, str]) -> Optional[float]:
+        """響應值得緩存時返回有效期；否則移除該鍵的舊條目並返回 None"""
+        lifetime = freshness_lifetime(headers, time.time())
+        # 已過期且無法條件驗證的響應下次仍需完整下載，不值得佔用磁盤
+        if lifetime is None or (lifetime <= 0 and not headers.get("ETag") and not headers.get("Last-Modified")):
+            if key in self.entries:
+                self._drop(key)
+                self._mark_dirty(force=True)
+            return None
+        return lifetime
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            oldest = next(iter(self.entries))
+            self._drop(oldest)
+            self.stats["evictions"] += 1
+
+    def store(self, url: str, headers: Mapping[str, str], content: Dict[str, Any],
+              simhash: Optional[int] = None, text_length: Optional[int] = None,
+              truncated: bool = False) -> bool:
+        """
+        保存一次獲取的結果（simhash 為正文指紋，text_length 為正文字符數）；
+        響應不可緩存或沒有用處時返回 False
+        truncated 為真（正文超過下載或提取上限被截斷）時不緩存：截斷的內容不能當作完整頁面返回，
+        該 URL 的舊條目同樣移除，下次請求重新完整獲取
+        """
+        self.stats["misses"] += 1
+        key = normalize_cache_key(url)
+        if truncated:
+            if key in self.entries:
+                self._drop(key)
+                self._mark_dirty(force=True)
+            return False
+        lifetime = self._cacheable_lifetime(key, headers)
+        if lifetime is None:
+            return False
+
+        data = zlib.compress(json.dumps(content, ensure_ascii=False).encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return False
+        # 文件按內容命名：重新保存不會改寫仍被近似重複條目共用的舊文件
+        name = hashlib.blake2b(data, digest_size=16).hexdigest() + ".json.z"
+        if name not in self._file_refs:
+            tmp_path = os.path.join(self.directory, name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        self._replace(CacheEntry(key, name, len(data), headers.get("ETag"), headers.get("Last-Modified"),
+                                 time.time() + lifetime, simhash, text_length))
+        self.stats["stores"] += 1
+        self._evict()
+        self._mark_dirty(force=True)
+        return True
+
+    def find_duplicate(self, url: str, simhash: int, text_length: int) -> Optional[CacheEntry]:
+        """
+        查找正文指紋與 simhash 近似的其他 URL 的條目
+        指紋相近還要求正文長度之比不低於 min_length_ratio，排除模板相同、正文長短差別很大的頁面；
+        模板佔比高的同站頁面指紋容易相近，其他主機的條目因此只在距離不超過 cross_host_distance 時接受
+        """
+        if self.fingerprints is None:
+            return None
+        key = normalize_cache_key(url)
+        host = urlsplit(key).netloc
+
+        def accept(candidate: str, distance: int) -> bool:
+            entry = self.entries.get(candidate)
+            if entry is None or not entry.text_length or not text_length:
+                return False
+            if min(entry.text_length, text_length) / max(entry.text_length, text_length) < self.min_length_ratio:
+                return False
+            return urlsplit(candidate).netloc == host or distance <= self.cross_host_distance
+
+        match = self.fingerprints.find(simhash, exclude=key, accept=accept)
+        return self.entries.get(match[0]) if match else None
+
+    def reuse_duplicate(self, url: str, headers: Mapping[str, str],
+                        original: CacheEntry) -> Optional[Dict[str, Any]]:
+        """
+        url 的正文與 original 近似重複：返回 original 的內容，並為 url 記錄共用內容文件的條目
+        （有效期和校驗器來自 url 自己的響應頭）；original 的文件不可讀時返回 None
+        """
+        content = self._read(original)
+        if content is None:
+            return None
+        self.stats["misses"] += 1
+        self.stats["duplicates"] += 1
+        key = normalize_cache_key(url)
+        lifetime = self._cacheable_lifetime(key, headers)
+        if lifetime is not None:
+            self._replace(CacheEntry(key, original.file, original.size, headers.get("ETag"),
+                                     headers.get("Last-Modified"), time.time() + lifetime))
+            self._evict()
+            self._mark_dirty(force=True)
+        return content
+
+    def _replace(self, entry: CacheEntry):
+        # 先登記新條目再釋放舊條目，兩者共用文件時文件不會被刪除
+        previous = self._pop(entry.key)
+        self._add_entry(entry)
+        if previous is not None:
+            self._release(previous)
+
+    def _pop(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.pop(key, None)
+        if entry is not None and self.fingerprints is not None:
+            self.fingerprints.remove(key)
+        return entry
+
+    def _release(self, entry: CacheEntry):
+        """釋放條目對內容文件的引用，最後一個引用釋放時刪除文件"""
+        refs = self._file_refs.get(entry.file, 0) - 1
+        if refs > 0:
+            self._file_refs[entry.file] = refs
+            return
+        self._file_refs.pop(entry.file, None)
+        self.total_bytes -= entry.size
+        self._remove_file(entry.file)
+
+    def _drop(self, key: str):
+        entry = self._pop(key)
+        if entry is not None:
+            self._release(entry)
+
+    def invalidate(self, url: str):
+        key = normalize_cache_key(url)
+        if key in self.entries:
+            self._drop(key)
+            self._mark_dirty(force=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["revalidated"] + self.stats["misses"]
+        served = self.stats["hits"] + self.stats["revalidated"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "files": len(self._file_refs),
+            "fingerprints": len(self.fingerprints) if self.fingerprints is not None else 0,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        }
+
+
+_url_cache: Optional[URLCache] = None
+_url_cache_created = False
+
+
+def create_url_cache() -> Optional[URLCache]:
+    """
+    根據環境變量創建緩存：URL_CACHE_DIR / URL_CACHE_MAX_MB（0 表示禁用）/
+    URL_DEDUP_MAX_DISTANCE（近似重複的最大漢明距離，默認 2，負數表示不檢測近似重複）/
+    URL_DEDUP_CROSS_HOST_DISTANCE（其他主機上的近似重複的最大距離，默認 MAX_DISTANCE 的一半，負數表示不跨主機）
+    """
+    cross_host_distance = os.environ.get("URL_DEDUP_CROSS_HOST_DISTANCE")
+    max_mb = float(os.environ.get("URL_CACHE_MAX_MB", "256"))
+    if max_mb <= 0:
+        return None
+    return URLCache(
+        directory=os.environ.get(
+            "URL_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "claudeditor-url-cache")
+        ),
+        max_bytes=int(max_mb * 1024 * 1024),
+        max_distance=int(os.environ.get("URL_DEDUP_MAX_DISTANCE", "2")),
+        cross_host_distance=int(cross_host_distance) if cross_host_distance else None,
+    )
+
+
+def get_url_cache() -> Optional[URLCache]:
+    """應用級共享緩存（首次調用時創建）"""
+    global _url_cache, _url_cache_created
+    if not _url_cache_created:
+        _url_cache = create_url_cache()
+        _url_cache_created = True
+    return _url_cache
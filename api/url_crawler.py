@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+URL Crawler - 文檔站點爬取
+基於 URLProcessor 把整個文檔站點導入上下文：
+- 從起始 URL 和 sitemap 出發的廣度優先隊列，受深度和頁面數限制
+- 只爬取同源（可選路徑前綴）的頁面，遵守 robots.txt（包括 Crawl-delay）
+- URL 規範化後去重（去掉片段、跟蹤參數，查詢參數排序）
+- 多個頁面並發獲取，每個主機按最小請求間隔限速
+- 定期把隊列和已完成集合寫入檢查點，中斷後可以從檢查點繼續
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import logging
+from dataclasses import dataclass, asdict, field
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Set
+from urllib.parse import urljoin, urldefrag, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+import aiohttp
+
+from http_pool import DEFAULT_HEADERS, close_shared_client
+from url_cache import normalize_cache_key
+from url_processor import URLProcessor
+
+logger = logging.getLogger(__name__)
+
+# 不是網頁的鏈接
+SKIP_EXTENSIONS = frozenset({
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".json",
+    ".pdf", ".zip", ".gz", ".tar", ".tgz", ".whl", ".exe", ".dmg", ".mp4", ".mp3", ".woff", ".woff2",
+})
+
+# 規範化時去掉的跟蹤參數
+TRACKING_PARAMS = frozenset({"fbclid", "gclid", "ref", "ref_src"})
+
+USER_AGENT = DEFAULT_HEADERS["User-Agent"]
+
+
+def canonicalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """解析相對鏈接並規範化；不是 http(s) 網頁鏈接時返回 None"""
+    if base is not None:
+        url = urljoin(base, url.strip())
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    if os.path.splitext(parts.path)[1].lower() in SKIP_EXTENSIONS:
+        return None
+    query = [
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.startswith("utm_") and name not in TRACKING_PARAMS
+    ]
+    return normalize_cache_key(urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), "")))
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+@dataclass
+class CrawlConfig:
+    """
+    爬取配置
+    - path_prefix: 只爬取路徑以此開頭的頁面（默認整個源站）
+    - rate: 每個主機每秒最多請求數（robots.txt 的 Crawl-delay 更嚴格時以它為準）
+    """
+    start_url: str
+    max_depth: int = 3
+    max_pages: int = 200
+    path_prefix: str = ""
+    concurrency: int = 4
+    rate: float = 2.0
+    respect_robots: bool = True
+    use_sitemap: bool = True
+    checkpoint_path: Optional[str] = None
+    checkpoint_every: int = 20
+
+
+@dataclass
+class CrawlState:
+    """可以寫入檢查點的爬取進度"""
+    frontier: List[Tuple[str, int]] = field(default_factory=list)
+    seen: List[str] = field(default_factory=list)
+    done: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+class URLCrawler:
+    """
+    文檔站點爬取器
+    - crawl(): 異步生成器，每完成一個頁面返回 {"url", "depth", "success", "content" | "error"}
+    - 配置了 checkpoint_path 時，已有的檢查點會被加載，已完成的頁面不會再次返回
+    """
+
+    def __init__(self, config: CrawlConfig, processor: Optional[URLProcessor] = None):
+        self.config = config
+        self.processor = processor
+        start = canonicalize_url(config.start_url if "://" in config.start_url else "https://" + config.start_url)
+        if start is None:
+            raise ValueError(f"無效的起始 URL: {config.start_url}")
+        self.start_url = start
+        self.origin = _origin(start)
+        self.robots: Optional[RobotFileParser] = None
+        self.interval = 1.0 / config.rate if config.rate > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._seen: Set[str] = set()
+        self._done: Set[str] = set()
+        self._failed: Dict[str, str] = {}
+        # 已排隊或正在獲取的頁面（url -> 深度），寫入檢查點的隊列
+        self._pending: Dict[str, int] = {}
+        self._frontier: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        self._scheduled = 0
+        self._since_checkpoint = 0
+        self._resumed = self._load_checkpoint()
+
+    # ---- 範圍和去重 ----
+
+    def in_scope(self, url: str) -> bool:
+        if _origin(url) != self.origin:
+            return False
+        if self.config.path_prefix and not urlsplit(url).path.startswith(self.config.path_prefix):
+            return False
+        return self.robots is None or self.robots.can_fetch(USER_AGENT, url)
+
+    def _schedule(self, url: str, depth: int) -> bool:
+        if url in self._seen or depth > self.config.max_depth or not self.in_scope(url):
+            return False
+        if self._scheduled >= self.config.max_pages:
+            return False
+        self._seen.add(url)
+        self._scheduled += 1
+        self._pending[url] = depth
+        self._frontier.put_nowait((url, depth))
+        return True
+
+    # ---- 檢查點 ----
+
+    def _load_checkpoint(self) -> bool:
+        path = self.config.checkpoint_path
+        if not path or not os.path.exists(path):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            state = CrawlState(**json.load(f)["state"])
+        self._seen = set(state.seen)
+        self._done = set(state.done)
+        self._failed = dict(state.failed)
+        self._scheduled = len(self._done) + len(self._failed) + len(state.frontier)
+        for url, depth in state.frontier:
+            self._pending[url] = depth
+            self._frontier.put_nowait((url, depth))
+        logger.info(f"從檢查點繼續爬取: 已完成 {len(self._done)} 頁，隊列 {len(state.frontier)} 頁")
+        return True
+
+    def state(self) -> CrawlState:
+        # 正在獲取的頁面也寫入隊列，恢復時重新獲取
+        return CrawlState(
+            frontier=[[url, depth] for url, depth in self._pending.items()],
+            seen=sorted(self._seen),
+            done=sorted(self._done),
+            failed=dict(self._failed),
+        )
+
+    def save_checkpoint(self):
+        path = self.config.checkpoint_path
+        if not path:
+            return
+        data = {"config": asdict(self.config), "saved_at": time.time(), "state": asdict(self.state())}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._since_checkpoint = 0
+
+    # ---- robots.txt 和 sitemap ----
+
+    async def _get(self, session: aiohttp.ClientSession, url: str) -> Tuple[int, bytes, Optional[str]]:
+        async with session.get(url) as response:
+            if response.status != 200:
+                return response.status, b"", None
+            body = await response.read()
+            if url.endswith(".gz") and body[:2] == b"\x1f\x8b":
+                body = gzip.decompress(body)
+            return response.status, body, response.charset
+
+    async def _load_robots(self, session: aiohttp.ClientSession):
+        robots = RobotFileParser(self.origin + "/robots.txt")
+        try:
+            status, body, charset = await self._get(session, robots.url)
+        except aiohttp.ClientError as e:
+            logger.warning(f"robots.txt 獲取失敗，按允許處理: {e}")
+            return
+        if status in (401, 403):
+            robots.disallow_all = True
+        elif status == 200:
+            robots.parse(body.decode(charset or "utf-8", errors="replace").splitlines())
+        else:
+            robots.allow_all = True
+        self.robots = robots
+        delay = robots.crawl_delay(USER_AGENT)
+        if delay:
+            self.interval = max(self.interval, float(delay))
+
+    async def _sitemap_urls(self, session: aiohttp.ClientSession) -> List[str]:
+        pending = list((self.robots.site_maps() if self.robots else None) or [self.origin + "/sitemap.xml"])
+        urls: List[str] = []
+        visited = 0
+        while pending and visited < 10 and len(urls) < self.config.max_pages:
+            sitemap = pending.pop(0)
+            visited += 1
+            try:
+                status, body, _ = await self._get(session, sitemap)
+                if status != 200:
+                    continue
+                root = ElementTree.fromstring(body)
+            except (aiohttp.ClientError, ElementTree.ParseError, OSError) as e:
+                logger.warning(f"sitemap 解析失敗 {sitemap}: {e}")
+                continue
+            is_index = root.tag.endswith("sitemapindex")
+            for element in root.iter():
+                if element.tag.endswith("loc") and element.text:
+                    (pending if is_index else urls).append(element.text.strip())
+        return urls
+
+    # ---- 爬取 ----
+
+    async def _wait_turn(self, host: str):
+        """每個主機的請求至少間隔 interval 秒；先預約時間槽再等待"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self, processor: URLProcessor, results: asyncio.Queue):
+        while True:
+            url, depth = await self._frontier.get()
+            try:
+                cached = processor.cache.lookup(url) if processor.cache else None
+                if cached is None or not cached.fresh:
+                    # 新鮮的緩存不發請求，不佔用限速
+                    await self._wait_turn(urlsplit(url).netloc)
+                try:
+                    content = await processor.fetch_and_process(url)
+                except Exception as e:
+                    await results.put({"url": url, "depth": depth, "success": False, "error": str(e)})
+                    continue
+                if depth < self.config.max_depth:
+                    for link in content.links or []:
+                        canonical = canonicalize_url(link, url)
+                        if canonical is not None:
+                            self._schedule(canonical, depth + 1)
+                await results.put({"url": url, "depth": depth, "success": True, "content": content})
+            finally:
+                self._frontier.task_done()
+
+    def _record(self, result: Dict[str, Any]):
+        """頁面交給調用方時才計為完成；中斷時未交付的頁面留在隊列中，恢復後重新獲取"""
+        url = result["url"]
+        self._pending.pop(url, None)
+        if result["success"]:
+            self._done.add(url)
+        else:
+            self._failed[url] = result["error"]
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.config.checkpoint_every:
+            self.save_checkpoint()
+
+    async def crawl(self) -> AsyncIterator[Dict[str, Any]]:
+        async with (self.processor or URLProcessor()) as processor:
+            if self.config.respect_robots:
+                await self._load_robots(processor.session)
+            if not self._resumed:
+                self._schedule(self.start_url, 0)
+                if self.config.use_sitemap:
+                    for url in await self._sitemap_urls(processor.session):
+                        canonical = canonicalize_url(url)
+                        if canonical is not None:
+                            self._schedule(canonical, 1)
+
+            results: asyncio.Queue = asyncio.Queue()
+
+            async def close_when_drained():
+                await self._frontier.join()
+                await results.put(None)
+
+            tasks = [asyncio.create_task(self._worker(processor, results))
+                     for _ in range(self.config.concurrency)]
+            tasks.append(asyncio.create_task(close_when_drained()))
+            try:
+                while True:
+                    result = await results.get()
+                    if result is None:
+                        break
+                    self._record(result)
+                    yield result
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.save_checkpoint()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "start_url": self.start_url,
+            "done": len(self._done),
+            "failed": len(self._failed),
+            "pending": len(self._pending),
+        }
+
+
+async def crawl_site(config: CrawlConfig) -> List[Dict[str, Any]]:
+    """爬取站點並返回所有頁面（按完成順序）"""
+    crawler = URLCrawler(config)
+    return [result async for result in crawler.crawl()]
+
+
+async def _main(args):
+    config = CrawlConfig(
+        start_url=args.url,
+        max_depth=args.depth,
+        max_pages=args.pages,
+        path_prefix=args.prefix,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        respect_robots=not args.ignore_robots,
+        use_sitemap=not args.no_sitemap,
+        checkpoint_path=args.checkpoint,
+    )
+    crawler = URLCrawler(config)
+    try:
+        async for result in crawler.crawl():
+            content = result.pop("content", None)
+            if content is not None:
+                result.update(title=content.title, word_count=content.word_count)
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+    finally:
+        await close_shared_client()
+    print(json.dumps(crawler.summary(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="爬取文檔站點")
+    parser.add_argument("url")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="每個主機每秒最多請求數")
+    parser.add_argument("--checkpoint", default=None, help="檢查點文件，存在時從中繼續")
+    parser.add_argument("--ignore-robots", action="store_true")
+    parser.add_argument("--no-sitemap", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
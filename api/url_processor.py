@@ -4,19 +4,35 @@ URL Processor - 網頁內容獲取和處理器
 為 ClaudeEditor 提供網頁內容提取功能
 """
 
+import os
+import sys
 import asyncio
 import aiohttp
 import re
 import json
 import logging
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Iterator
 from urllib.parse import urljoin, urlparse
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import html
 
+from http_pool import SharedHTTPClient, get_shared_client, close_shared_client
+from url_cache import URLCache, CacheEntry, get_url_cache, normalize_cache_key
+from html_extractor import ExtractedHTML, HTMLContentExtractor, extract_html, extract_bytes, incremental_decoder, resolve_charset
+from extraction_pool import ExtractionPool, get_extraction_pool, shutdown_extraction_pool
+from text_chunker import ChunkConfig, TextChunk, iter_chunks
+from near_duplicate import simhash
+
 logger = logging.getLogger(__name__)
 
+# 正文少於這麼多詞時不做近似重複檢測
+NEAR_DUPLICATE_MIN_TOKENS = 50
+
+# 離線測試和基準測試使用的固定頁面
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "html")
+
 @dataclass
 class WebContent:
     """網頁內容"""
@@ -29,30 +45,53 @@ class WebContent:
     word_count: int = 0
     language: str = "auto"
     metadata: Dict[str, Any] = None
+    links: List[str] = None
+
+@dataclass
+class FetchLimits:
+    """下載限制：正文最大字節數、提取到多少字符的正文後提前停止、允許的內容類型"""
+    max_bytes: int = 5 * 1024 * 1024
+    max_text_chars: int = 200_000
+    content_types: Tuple[str, ...] = ("text/html", "application/xhtml+xml", "text/plain")
+    chunk_size: int = 64 * 1024
+
+def create_fetch_limits() -> FetchLimits:
+    """根據環境變量創建下載限制：URL_FETCH_MAX_MB / URL_FETCH_MAX_TEXT_CHARS / URL_FETCH_CONTENT_TYPES（逗號分隔）"""
+    content_types = os.environ.get("URL_FETCH_CONTENT_TYPES")
+    return FetchLimits(
+        max_bytes=int(float(os.environ.get("URL_FETCH_MAX_MB", "5")) * 1024 * 1024),
+        max_text_chars=int(os.environ.get("URL_FETCH_MAX_TEXT_CHARS", "200000")),
+        content_types=tuple(t.strip().lower() for t in content_types.split(",") if t.strip())
+        if content_types else FetchLimits.content_types,
+    )
 
 class URLProcessor:
-    """URL 處理器"""
+    """
+    URL 處理器
+    默認使用應用級共享連接池；傳入 session 時使用調用方的 ClientSession，退出時均不關閉連接
+    默認使用應用級內容緩存（URL_CACHE_MAX_MB=0 或 use_cache=False 時不緩存）；受 FetchLimits 截斷的頁面不緩存
+    正文分塊下載並直接送入增量提取器，受 FetchLimits 限制；大頁面交給提取進程池
+    與已緩存頁面近似重複（指紋相近且正文長度接近；其他主機的頁面要求指紋更接近）的頁面（鏡像、打印版、查詢參數變體）返回已有的提取結果，不另存副本
+    """
     
-    def __init__(self):
-        self.session = None
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (ClaudeEditor/1.0) ClaudeCode Content Processor',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'zh-TW,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None,
+                 client: Optional[SharedHTTPClient] = None,
+                 cache: Optional[URLCache] = None, use_cache: bool = True,
+                 limits: Optional[FetchLimits] = None, pool: Optional[ExtractionPool] = None):
+        self.session = session
+        self.client = client
+        self.cache = (cache or get_url_cache()) if use_cache else None
+        self.limits = limits or create_fetch_limits()
+        self.pool = pool or get_extraction_pool()
     
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(
-            headers=self.headers,
-            timeout=aiohttp.ClientTimeout(total=30)
-        )
+        if self.session is None:
+            self.session = await (self.client or get_shared_client()).session()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
-            await self.session.close()
+        # 連接歸還連接池，保持 keep-alive 供下一次獲取復用
+        pass
     
     async def fetch_and_process(self, url: str) -> WebContent:
         """獲取並處理網頁內容"""
@@ -60,42 +99,178 @@ class URLProcessor:
             # 標準化 URL
             url = self._normalize_url(url)
             
-            # 獲取網頁內容
-            html_content = await self._fetch_html(url)
+            # 新鮮的緩存直接返回，跳過下載和提取
+            cached = self.cache.lookup(url) if self.cache else None
+            if cached is not None and cached.fresh:
+                content = self._load_cached(cached, revalidated=False)
+                if content:
+                    return content
+                cached = None
+            
+            # 邊下載邊提取（有緩存時發送條件請求）
+            extracted, headers, fetch_info = await self._fetch_extracted(
+                url, cached.conditional_headers() if cached else None
+            )
+            if extracted is None:
+                # 304：內容未變化
+                self.cache.refresh(cached, headers)
+                content = self._load_cached(cached, revalidated=True)
+                if content:
+                    return content
+                extracted, headers, fetch_info = await self._fetch_extracted(url)
             
-            # 提取內容
-            content = self._extract_content(html_content, url)
+            content = self._build_content(extracted, url)
+            content.metadata.update(fetch_info)
+            
+            fingerprint = None
+            if self.cache:
+                fingerprint = simhash(content.text, min_tokens=NEAR_DUPLICATE_MIN_TOKENS)
+                duplicate = (self._reuse_duplicate(url, headers, fingerprint, len(content.text))
+                             if fingerprint is not None else None)
+                if duplicate:
+                    return duplicate
             
             # 轉換為 Claude Code 友好格式
             processed_content = self._format_for_claude_code(content)
             
+            if self.cache:
+                self.cache.store(url, headers, asdict(processed_content), simhash=fingerprint,
+                                 text_length=len(content.text),
+                                 truncated=fetch_info['truncated'] or fetch_info['text_limited'])
+                processed_content.metadata["cache"] = "miss"
+            
             return processed_content
             
         except Exception as e:
             logger.error(f"URL 處理失敗 {url}: {e}")
             raise
     
+    def _load_cached(self, entry: CacheEntry, revalidated: bool) -> Optional[WebContent]:
+        data = self.cache.load(entry, revalidated=revalidated)
+        if data is None:
+            return None
+        data["metadata"] = dict(data.get("metadata") or {}, cache="revalidated" if revalidated else "hit")
+        return self._as_requested(data, entry.key)
+    
+    def _reuse_duplicate(self, url: str, headers, fingerprint: int, text_length: int) -> Optional[WebContent]:
+        original = self.cache.find_duplicate(url, fingerprint, text_length)
+        if original is None:
+            return None
+        data = self.cache.reuse_duplicate(url, headers, original)
+        if data is None:
+            return None
+        data["metadata"] = dict(data.get("metadata") or {}, cache="duplicate")
+        return self._as_requested(data, url)
+    
+    def _as_requested(self, data: Dict[str, Any], url: str) -> WebContent:
+        """近似重複的條目保存的是原頁面的內容：url 改為請求的 URL，duplicate_of 記錄原頁面"""
+        if normalize_cache_key(data["url"]) != normalize_cache_key(url):
+            data["metadata"]["duplicate_of"] = data["url"]
+            data["url"] = url
+        return WebContent(**data)
+    
     def _normalize_url(self, url: str) -> str:
         """標準化 URL"""
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
         return url
     
-    async def _fetch_html(self, url: str) -> str:
-        """獲取 HTML 內容"""
+    async def _fetch_extracted(self, url: str, headers: Optional[Dict[str, str]] = None
+                               ) -> Tuple[Optional[ExtractedHTML], Any, Dict[str, Any]]:
+        """
+        分塊下載正文並增量解碼、提取，返回 (提取結果, 響應頭, 下載信息)
+        - 內容類型不在允許列表中時不讀取正文，直接失敗
+        - 讀取超過 max_bytes 後截斷；提取器認為正文已完整時提前停止
+        - 先在事件循環中增量提取（多數頁面在正文結束後即可提前停止），不保留原始字節；
+          已讀取的正文超過進程池的內聯閾值仍未完成時，之後的原始字節才收集起來，
+          下載完成後連同提取器和解碼器狀態交給進程池繼續提取
+        - 發送了條件請求且服務器返回 304 時提取結果為 None
+        """
+        limits = self.limits
+        pool = self.pool
         try:
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    return content
-                else:
+            async with self.session.get(url, headers=headers) as response:
+                if response.status == 304 and headers:
+                    return None, response.headers, {}
+                if response.status != 200:
                     raise Exception(f"HTTP {response.status}: {response.reason}")
-                    
+                
+                content_type = response.content_type.lower()
+                if response.headers.get("Content-Type") and content_type not in limits.content_types:
+                    raise Exception(f"不支持的內容類型: {content_type}")
+                
+                offload = False
+                extractor = HTMLContentExtractor(max_text_chars=limits.max_text_chars)
+                charset = decoder = None
+                rest: List[bytes] = []
+                bytes_read = 0
+                truncated = stopped_early = False
+                async for chunk in response.content.iter_chunked(limits.chunk_size):
+                    if bytes_read + len(chunk) > limits.max_bytes:
+                        chunk = chunk[:limits.max_bytes - bytes_read]
+                        truncated = True
+                    bytes_read += len(chunk)
+                    if offload:
+                        rest.append(chunk)
+                    else:
+                        if decoder is None:
+                            charset = resolve_charset(response.charset, chunk)
+                            decoder = incremental_decoder(charset, chunk)
+                        extractor.feed(decoder.decode(chunk))
+                        if extractor.done:
+                            stopped_early = True
+                            break
+                        # 超過內聯閾值仍未提取完：剩餘正文收集起來交給進程池
+                        offload = pool.should_offload(bytes_read)
+                    if truncated:
+                        break
+                response_headers = response.headers
+            
+            if offload:
+                # 連接已歸還連接池，再等待進程池
+                extracted = await pool.resume(extractor, charset, decoder.getstate(), b"".join(rest))
+            else:
+                if decoder is not None:
+                    extractor.feed(decoder.decode(b"", final=True))
+                extracted = extractor.result()
+            
+            return extracted, response_headers, {
+                'bytes_read': bytes_read,
+                'truncated': truncated,
+                'stopped_early': stopped_early,
+                'text_limited': extracted.text_limited,
+                'extracted_in': 'pool' if offload else 'inline'
+            }
+                
         except aiohttp.ClientError as e:
             raise Exception(f"網絡請求失敗: {e}")
     
     def _extract_content(self, html_content: str, url: str) -> WebContent:
-        """提取網頁主要內容"""
+        """提取網頁主要內容（單次掃描同時收集標題、元數據和正文）"""
+        return self._build_content(extract_html(html_content), url)
+    
+    def _build_content(self, extracted: ExtractedHTML, url: str) -> WebContent:
+        text = extracted.text
+        return WebContent(
+            url=url,
+            title=extracted.title,
+            text=text,
+            description=extracted.description,
+            author=extracted.author,
+            publish_date=extracted.publish_date,
+            word_count=len(text.split()),
+            language=self._detect_language(text),
+            metadata={
+                'extraction_time': datetime.now().isoformat(),
+                'content_length': len(text),
+                'html_length': extracted.html_length,
+                'main_candidate': extracted.main_candidate
+            },
+            links=extracted.links
+        )
+    
+    def _extract_content_regex(self, html_content: str, url: str) -> WebContent:
+        """原多次正則掃描的提取方式，保留用於對照基準測試"""
         
         # 提取標題
         title = self._extract_title(html_content)
@@ -165,7 +340,7 @@ class URLProcessor:
         ]
         
         main_content = ""
-        for pattern in patterns:
+        for pattern in article_patterns:
             match = re.search(pattern, html_content, re.DOTALL | re.IGNORECASE)
             if match:
                 main_content = match.group(1)
@@ -284,7 +459,7 @@ class URLProcessor:
     def _format_for_claude_code(self, content: WebContent) -> WebContent:
         """格式化為 Claude Code 友好格式"""
         # 添加結構化標題
-        formatted_text = f"""# {content.title}
+        header = f"""# {content.title}
 
 **來源：** {content.url}
 **作者：** {content.author or '未知'}
@@ -297,12 +472,16 @@ class URLProcessor:
 
 ## 正文內容
 
-{content.text}
+"""
+        footer = f"""
 
 ---
 *內容由 ClaudeEditor 自動提取和格式化*
 *提取時間：{content.metadata.get('extraction_time', '')}*
 """
+        formatted_text = header + content.text + footer
+        # 正文在格式化文本中的位置，分塊時只切分正文
+        content.metadata['body_span'] = [len(header), len(header) + len(content.text)]
         
         return WebContent(
             url=content.url,
@@ -313,28 +492,44 @@ class URLProcessor:
             publish_date=content.publish_date,
             word_count=content.word_count,
             language=content.language,
-            metadata=content.metadata
+            metadata=content.metadata,
+            links=content.links
         )
 
+    def chunk_content(self, content: WebContent, config: Optional[ChunkConfig] = None) -> Iterator[TextChunk]:
+        """
+        把正文切分為不超過 token 預算的分塊，偏移相對於 content.text，標題路徑以頁面標題開頭
+        分塊以生成器逐個產出；沒有 body_span 的舊緩存條目切分整個文本
+        """
+        return _iter_content_chunks(content.url, content.title, content.text, content.metadata or {}, config)
+
+def _iter_content_chunks(url: str, title: str, text: str, metadata: Dict[str, Any],
+                         config: Optional[ChunkConfig]) -> Iterator[TextChunk]:
+    start, end = metadata.get('body_span') or (0, len(text))
+    return iter_chunks(text, url, config, start=start, end=end, heading_path=[title])
+
 # FastAPI 端點
 async def fetch_url_content(url: str) -> Dict[str, Any]:
     """獲取 URL 內容的 API 端點"""
+    async with URLProcessor() as processor:
+        return await _fetch_content_response(processor, url)
+
+async def _fetch_content_response(processor: URLProcessor, url: str) -> Dict[str, Any]:
     try:
-        async with URLProcessor() as processor:
-            content = await processor.fetch_and_process(url)
-            
-            return {
-                "success": True,
-                "title": content.title,
-                "text": content.text,
-                "description": content.description,
-                "author": content.author,
-                "publishDate": content.publish_date,
-                "wordCount": content.word_count,
-                "language": content.language,
-                "metadata": content.metadata
-            }
-            
+        content = await processor.fetch_and_process(url)
+        
+        return {
+            "success": True,
+            "title": content.title,
+            "text": content.text,
+            "description": content.description,
+            "author": content.author,
+            "publishDate": content.publish_date,
+            "wordCount": content.word_count,
+            "language": content.language,
+            "metadata": content.metadata
+        }
+        
     except Exception as e:
         logger.error(f"URL 內容獲取失敗: {e}")
         return {
@@ -342,17 +537,99 @@ async def fetch_url_content(url: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
+async def fetch_urls_content(urls: List[str], concurrency: Optional[int] = None,
+                             per_host: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    批量獲取 URL 內容，按完成順序逐個返回結果
+    - 同一批中標準化後相同的 URL 只獲取一次，結果的 indices 列出它在輸入中的所有位置
+    - concurrency: 全局並發上限（URL_BATCH_CONCURRENCY，默認 8）
+    - per_host: 同一主機的並發上限（URL_BATCH_PER_HOST，默認 2）
+    - 單個 URL 失敗只影響它自己的結果（success 為 False）
+    """
+    concurrency = concurrency or int(os.environ.get("URL_BATCH_CONCURRENCY", "8"))
+    per_host = per_host or int(os.environ.get("URL_BATCH_PER_HOST", "2"))
+    
+    async with URLProcessor() as processor:
+        groups: Dict[str, Dict[str, Any]] = {}
+        for index, raw_url in enumerate(urls):
+            url = processor._normalize_url(raw_url.strip())
+            group = groups.setdefault(normalize_cache_key(url), {"url": url, "indices": []})
+            group["indices"].append(index)
+        
+        global_limit = asyncio.Semaphore(concurrency)
+        host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+        
+        async def fetch_one(group: Dict[str, Any]) -> Dict[str, Any]:
+            # 先佔主機配額再佔全局配額，等待同一主機的任務不會佔用全局並發
+            async with host_limits[urlparse(group["url"]).hostname or ""]:
+                async with global_limit:
+                    result = await _fetch_content_response(processor, group["url"])
+            return {"url": group["url"], "indices": group["indices"], **result}
+        
+        tasks = [asyncio.create_task(fetch_one(group)) for group in groups.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 調用方提前停止迭代時取消尚未完成的獲取
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def fetch_urls_chunks(urls: List[str], config: Optional[ChunkConfig] = None,
+                            concurrency: Optional[int] = None,
+                            per_host: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    批量獲取 URL 並逐個返回正文分塊（url、index、text、start、end、tokens、heading_path）
+    先完成的頁面先切分，下游索引不必等整批頁面下載和提取完成；失敗的 URL 返回一條 success 為 False 的結果
+    """
+    async for result in fetch_urls_content(urls, concurrency=concurrency, per_host=per_host):
+        if not result["success"]:
+            yield {"url": result["url"], "success": False, "error": result["error"]}
+            continue
+        for chunk in _iter_content_chunks(result["url"], result["title"], result["text"],
+                                          result["metadata"], config):
+            yield {"success": True, **asdict(chunk)}
+
+def get_url_cache_stats() -> Dict[str, Any]:
+    """內容緩存的命中、未命中、重新驗證計數"""
+    cache = get_url_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.get_stats()}
+
 # 測試函數
-async def test_url_processor():
-    """測試 URL 處理器"""
-    test_urls = [
-        "https://www.example.com",
-        "https://github.com",
-        "https://docs.python.org"
-    ]
+async def test_url_processor(urls: Optional[List[str]] = None):
+    """
+    測試 URL 處理器
+    默認離線處理 fixtures/html 中的固定頁面（不發網絡請求）；傳入 URL 時獲取真實網頁
+    """
+    if not urls:
+        processor = URLProcessor(use_cache=False)
+        failures = 0
+        for name in sorted(os.listdir(FIXTURES_DIR)):
+            if not name.endswith(".html"):
+                continue
+            print(f"\n測試頁面: {name}")
+            with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+                data = f.read()
+            extracted = extract_bytes(data, max_text_chars=processor.limits.max_text_chars)
+            content = processor._format_for_claude_code(
+                processor._build_content(extracted, f"https://fixtures.local/{name}")
+            )
+            chunks = list(processor.chunk_content(content))
+            print(f"標題: {content.title}")
+            print(f"字數: {content.word_count}")
+            print(f"語言: {content.language}")
+            print(f"正文區域: {extracted.main_candidate}，分塊: {len(chunks)}")
+            if content.title == "無標題" or any(chunk.text != content.text[chunk.start:chunk.end] for chunk in chunks):
+                failures += 1
+                print("測試失敗: 標題缺失或分塊偏移錯誤")
+        print(f"\n完成，失敗 {failures} 個")
+        return failures
     
     async with URLProcessor() as processor:
-        for url in test_urls:
+        for url in urls:
             try:
                 print(f"\n測試 URL: {url}")
                 content = await processor.fetch_and_process(url)
@@ -363,6 +640,12 @@ async def test_url_processor():
                 
             except Exception as e:
                 print(f"測試失敗: {e}")
+    
+    await close_shared_client()
+    shutdown_extraction_pool()
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(test_url_processor())
\ No newline at end of file
+    # python url_processor.py            離線測試固定頁面
+    # python url_processor.py URL [...]  測試真實網頁
+    sys.exit(1 if asyncio.run(test_url_processor(sys.argv[1:])) else 0)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+ASGI 模式并发基准测试
+
+用桩协调器（process_request 只 await asyncio.sleep(--latency) 模拟一次慢速模型调用）替换真实的多模型协调器，
+在子进程中启动服务，对 POST /api/ai-assistant/process 施加不同并发度的负载：
+- flask_pool:     Flask 应用运行在固定大小线程池的 WSGI 服务器上（相当于 gunicorn --threads N 的同步 worker），
+                  同时进行的模型调用数受线程数限制
+- flask_threaded: Flask 开发服务器（threaded=True），每个请求一个线程，线程数随并发增长
+- asgi:           uvicorn 运行 api/src/asgi.py，/process 在事件循环中原生 await 协调器
+每种模式、每个并发度报告吞吐（req/s）、延迟 p50 / p99、服务进程的峰值线程数和峰值 RSS
+
+用法: python benchmarks/bench_asgi_concurrency.py --concurrency 50 200 500 --latency 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "src")
+MODES = ("flask_pool", "flask_threaded", "asgi")
+PATH = "/api/ai-assistant/process"
+
+
+class _StubCoordinator:
+    """只模拟模型调用耗时的协调器"""
+
+    claude_client = None
+    gemini_client = None
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    async def process_request(self, task_type, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        return {"success": True, "task_type": task_type, "model": "stub", "content": prompt}
+
+    def get_statistics(self):
+        return {}
+
+
+def _serve(mode, port, latency, threads):
+    """子进程：加载应用、注入桩协调器并启动服务"""
+    sys.path.insert(0, SRC)
+    from routes import ai_assistant
+    ai_assistant.coordinator = _StubCoordinator(latency)
+
+    if mode == "asgi":
+        import uvicorn
+        from asgi import app
+        uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+        return
+
+    from werkzeug.serving import BaseWSGIServer, make_server
+    from main import app
+    if mode == "flask_threaded":
+        server = make_server("127.0.0.1", port, app, threaded=True)
+    else:
+        from socketserver import ThreadingMixIn
+        from concurrent.futures import ThreadPoolExecutor
+
+        class PooledWSGIServer(BaseWSGIServer):
+            request_queue_size = 4096
+            pool = ThreadPoolExecutor(threads)
+
+            def process_request(self, request, client_address):
+                self.pool.submit(ThreadingMixIn.process_request_thread, self, request, client_address)
+
+        server = PooledWSGIServer("127.0.0.1", port, app)
+    server.request_queue_size = 4096
+    server.serve_forever()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出: {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("服务启动超时")
+
+
+class _ProcSampler:
+    """定期读取 /proc/<pid>/status，记录峰值线程数和峰值 RSS"""
+
+    def __init__(self, pid, interval=0.02):
+        self.pid = pid
+        self.interval = interval
+        self.threads = 0
+        self.rss_kb = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read(self):
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        self.threads = max(self.threads, int(line.split()[1]))
+                    elif line.startswith("VmRSS:"):
+                        self.rss_kb = max(self.rss_kb, int(line.split()[1]))
+        except OSError:
+            pass
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._read()
+
+    def __enter__(self):
+        self._read()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._read()
+
+
+async def _load(url, concurrency, total):
+    import aiohttp
+
+    timings = []
+    errors = 0
+    remaining = iter(range(total))
+    payload = {"task_type": "code_generation", "prompt": "print('hello')"}
+
+    async def worker(session):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    body = await response.json()
+                    if response.status != 200 or not body.get("success"):
+                        errors += 1
+                        continue
+            except Exception:
+                errors += 1
+                continue
+            timings.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return timings, errors, elapsed
+
+
+def _measure(mode, levels, latency, rounds, threads):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port),
+         "--latency", str(latency), "--threads", str(threads)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        _wait_ready(port, process)
+        url = f"http://127.0.0.1:{port}{PATH}"
+        # 预热：加载应用、建立后台事件循环
+        asyncio.run(_load(url, 4, 8))
+        for concurrency in levels:
+            with _ProcSampler(process.pid) as sampler:
+                timings, errors, elapsed = asyncio.run(_load(url, concurrency, concurrency * rounds))
+            timings.sort()
+            results[str(concurrency)] = {
+                "requests": len(timings) + errors,
+                "errors": errors,
+                "req_per_sec": round(len(timings) / elapsed, 1),
+                "p50_ms": round(timings[len(timings) // 2] * 1000, 1) if timings else None,
+                "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 1) if timings else None,
+                "peak_threads": sampler.threads,
+                "peak_rss_mb": round(sampler.rss_kb / 1024, 1),
+            }
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASGI 模式并发基准测试")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--latency", type=float, default=0.2, help="桩模型调用耗时（秒）")
+    parser.add_argument("--rounds", type=int, default=3, help="每个并发连接发送的请求数")
+    parser.add_argument("--threads", type=int, default=32, help="flask_pool 模式的线程数")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--serve", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        _serve(args.serve, args.port, args.latency, args.threads)
+        return
+
+    report = {"latency_ms": args.latency * 1000, "rounds": args.rounds, "pool_threads": args.threads}
+    for mode in args.modes:
+        report[mode] = _measure(mode, args.concurrency, args.latency, args.rounds, args.threads)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+提取進程池交叉點基準測試
+
+對不同大小的頁面分別測量：
+- inline: 在事件循環中提取的耗時（即事件循環被阻塞的時間）
+- pool:   交給進程池提取的端到端耗時，以及期間事件循環的最長停頓
+overhead = pool - inline 是進程間通信（序列化、傳輸、調度）的額外延遲。
+交叉點取 inline 耗時首次同時超過 overhead 和事件循環停頓預算（--stall-budget-ms）的頁面大小：
+大於它的頁面交給進程池時，增加的延遲小於原本阻塞事件循環的時間，可作為 URL_EXTRACT_INLINE_KB 的參考值
+
+用法: python benchmarks/bench_extraction_pool.py --workers 2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from html_extractor import extract_bytes
+from extraction_pool import ExtractionPool
+
+SIZES_KB = [4, 16, 32, 64, 128, 256, 512, 1024, 4096]
+WORDS = ["session", "editor", "document", "request", "stream", "cache", "latency", "context", "worker"]
+
+
+def _page(size, rng):
+    parts = ["<html><head><title>Pool</title><meta name='description' content='bench'></head><body><main>"]
+    length = len(parts[0])
+    while length < size:
+        paragraph = "<p>" + " ".join(rng.choice(WORDS) for _ in range(40)) + " <a href='/x'>link</a></p>"
+        parts.append(paragraph)
+        length += len(paragraph)
+    parts.append("</main></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+async def _max_stall(task):
+    """運行 task 期間事件循環的最長停頓（毫秒）"""
+    stall = 0.0
+    finished = False
+
+    async def probe():
+        nonlocal stall
+        last = time.perf_counter()
+        while not finished:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            stall = max(stall, now - last - 0.001)
+            last = now
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0.005)
+    try:
+        await task()
+    finally:
+        finished = True
+        await probe_task
+    return stall * 1000
+
+
+async def _run(args):
+    rng = random.Random(args.seed)
+    pool = ExtractionPool(workers=args.workers, timeout=60, inline_threshold=0)
+    pool.warm_up()
+    rows = []
+    crossover = None
+    try:
+        for size_kb in SIZES_KB:
+            data = _page(size_kb * 1024, rng)
+            inline_ms = pool_ms = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                extract_bytes(data)
+                inline_ms = min(inline_ms, (time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                await pool.extract(data)
+                pool_ms = min(pool_ms, (time.perf_counter() - started) * 1000)
+
+            async def inline_task():
+                extract_bytes(data)
+
+            async def pool_task():
+                await pool.extract(data)
+
+            overhead_ms = max(0.0, pool_ms - inline_ms)
+            row = {
+                "size_kb": size_kb,
+                "inline_ms": round(inline_ms, 2),
+                "pool_ms": round(pool_ms, 2),
+                "overhead_ms": round(overhead_ms, 2),
+                "loop_stall_inline_ms": round(await _max_stall(inline_task), 2),
+                "loop_stall_pool_ms": round(await _max_stall(pool_task), 2),
+            }
+            rows.append(row)
+            if crossover is None and inline_ms > max(overhead_ms, args.stall_budget_ms):
+                crossover = size_kb
+    finally:
+        pool.shutdown()
+    return {"workers": args.workers, "stall_budget_ms": args.stall_budget_ms, "sizes": rows, "crossover_kb": crossover}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提取進程池交叉點基準測試")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--stall-budget-ms", type=float, default=10.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
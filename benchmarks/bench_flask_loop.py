@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Flask 蓝图事件循环基准测试
+
+对比 Flask 视图函数运行协程的两种方式的单请求延迟：
+- per_request: 原 ai_assistant / smartui 蓝图的写法，每个请求 new_event_loop + run_until_complete + close
+- background:  api/src/background_loop 的应用级后台事件循环，run_coroutine_threadsafe 提交
+每种方式测两类协程：
+- noop: 只让出一次控制权，差值即事件循环创建和销毁的开销
+- http: 通过 aiohttp 请求本地 HTTP 服务。per_request 方式中客户端无法跨事件循环复用，
+        每个请求都要新建 ClientSession 和 TCP 连接；background 方式复用同一个 ClientSession 的 keep-alive 连接
+
+用法: python benchmarks/bench_flask_loop.py --requests 2000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "src"))
+
+from background_loop import BackgroundLoop
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和正文分两次写出，keep-alive 连接上不关闭 Nagle 会触发 40ms 的延迟确认
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _SharedClient:
+    """background 方式下在后台循环中创建一次并复用的客户端（模拟协调器持有的 API 客户端）"""
+
+    def __init__(self):
+        self.session = None
+
+    async def get(self, url):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        async with self.session.get(url) as response:
+            return await response.json()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+async def _noop():
+    await asyncio.sleep(0)
+    return {"ok": True}
+
+
+async def _fetch_once(url):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+
+def _create_app(background, client, url):
+    app = Flask(__name__)
+
+    def per_request(coro):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
+    @app.route("/per_request/noop")
+    def per_request_noop():
+        return jsonify(per_request(_noop()))
+
+    @app.route("/per_request/http")
+    def per_request_http():
+        return jsonify(per_request(_fetch_once(url)))
+
+    @app.route("/background/noop")
+    def background_noop():
+        return jsonify(background.run(_noop()))
+
+    @app.route("/background/http")
+    def background_http():
+        return jsonify(background.run(client.get(url)))
+
+    return app
+
+
+def _measure(test_client, path, requests):
+    for _ in range(min(50, requests)):
+        test_client.get(path)
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = test_client.get(path)
+        timings.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.data
+    timings.sort()
+    return {
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95)] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask 蓝图事件循环基准测试")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    background = BackgroundLoop(name="bench-loop")
+    client = _SharedClient()
+    test_client = _create_app(background, client, url).test_client()
+
+    report = {"requests": args.requests}
+    try:
+        for kind in ("noop", "http"):
+            per_request = _measure(test_client, f"/per_request/{kind}", args.requests)
+            shared = _measure(test_client, f"/background/{kind}", args.requests)
+            report[kind] = {
+                "per_request": per_request,
+                "background": shared,
+                "mean_saved_ms": round(per_request["mean_ms"] - shared["mean_ms"], 3),
+                "speedup": round(per_request["mean_ms"] / shared["mean_ms"], 2),
+            }
+    finally:
+        background.run(client.close())
+        background.stop()
+        server.shutdown()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
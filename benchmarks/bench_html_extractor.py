@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+網頁內容提取基準測試
+
+在一組生成的頁面上對比兩種提取方式的吞吐（MB/s）：
+- regex:  原 URLProcessor 的多次全文正則掃描
+- parser: html_extractor 的單次分詞掃描
+頁面包括小頁面、典型博客、大型文檔頁、以內聯腳本為主的 SPA 外殼，以及標籤未閉合的畸形頁面
+
+用法: python benchmarks/bench_html_extractor.py --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from url_processor import URLProcessor
+
+WORDS = ["session", "editor", "collaboration", "document", "request", "stream", "cache",
+         "latency", "context", "payload", "worker", "extract", "render", "network"]
+
+
+def _sentence(rng, words=14):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _head(title, rng):
+    return (
+        f"<head><meta charset='utf-8'><title>{title}</title>"
+        f"<meta name='description' content='{_sentence(rng, 10)}'>"
+        "<meta property='article:author' content='Bench Author'>"
+        "<meta property='article:published_time' content='2024-05-01T10:00:00Z'>"
+        "<style>body{margin:0}.nav a{color:#333}</style></head>"
+    )
+
+
+def _nav(rng, links):
+    items = "".join(f"<li><a href='/page/{i}'>Link {i}</a></li>" for i in range(links))
+    return f"<nav class='nav'><ul>{items}</ul></nav>"
+
+
+def _paragraphs(rng, count):
+    return "".join(
+        f"<p>{_sentence(rng)} <a href='/ref/{i}'>{_sentence(rng, 3)}</a> {_sentence(rng)}</p>"
+        for i in range(count)
+    )
+
+
+def _corpus(rng):
+    pages = {}
+    pages["tiny"] = f"<html>{_head('Tiny', rng)}<body><p>{_sentence(rng)}</p></body></html>"
+    pages["blog"] = (
+        f"<html>{_head('Blog post', rng)}<body>{_nav(rng, 40)}"
+        f"<article><h1>Blog post</h1>{_paragraphs(rng, 120)}</article>"
+        f"<footer>{_sentence(rng)}</footer></body></html>"
+    )
+    sections = "".join(
+        f"<section><h2>Section {i}</h2>{_paragraphs(rng, 40)}<pre><code>{_sentence(rng) * 4}</code></pre></section>"
+        for i in range(60)
+    )
+    pages["docs"] = (
+        f"<html>{_head('Reference', rng)}<body>{_nav(rng, 400)}"
+        f"<main><div class='content'>{sections}</div></main></body></html>"
+    )
+    bundle = "".join(f"function f{i}(a,b){{return a<b?'<div>'+a:b}}\n" for i in range(60000))
+    pages["spa_shell"] = (
+        f"<html>{_head('App', rng)}<body><div id='root'></div>"
+        f"<script>{bundle}</script><noscript>{_sentence(rng)}</noscript></body></html>"
+    )
+    # 大量未閉合的 <article> / <div class="content">：原正則每個起始位置都會掃描到文檔末尾
+    broken = "".join(f"<div class='content'><article><p>{_sentence(rng)}" for _ in range(1500))
+    pages["malformed"] = f"<html>{_head('Broken', rng)}<body>{broken}</body>"
+    return pages
+
+
+def _measure(extract, html_content, url, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract(html_content, url)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="網頁內容提取基準測試")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    processor = URLProcessor(use_cache=False)
+    pages = _corpus(random.Random(args.seed))
+    extractors = {"regex": processor._extract_content_regex, "parser": processor._extract_content}
+
+    report = {"pages": {}, "total": {}}
+    totals = {name: 0.0 for name in extractors}
+    total_bytes = 0
+    for name, html_content in pages.items():
+        size = len(html_content.encode("utf-8"))
+        total_bytes += size
+        row = {"bytes": size}
+        for extractor_name, extract in extractors.items():
+            seconds = _measure(extract, html_content, "https://bench.local/" + name, args.repeat)
+            totals[extractor_name] += seconds
+            row[extractor_name] = {
+                "ms": round(seconds * 1000, 2),
+                "mb_per_sec": round(size / 1024 / 1024 / seconds, 2),
+            }
+        row["speedup"] = round(row["regex"]["ms"] / row["parser"]["ms"], 2)
+        report["pages"][name] = row
+
+    for extractor_name, seconds in totals.items():
+        report["total"][extractor_name] = {
+            "ms": round(seconds * 1000, 1),
+            "mb_per_sec": round(total_bytes / 1024 / 1024 / seconds, 2),
+        }
+    report["total"]["bytes"] = total_bytes
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+近似重複檢測基準測試
+
+- simhash:  不同長度正文計算指紋的耗時和吞吐（MB/s）
+- lookup:   分段索引中有 N 個指紋時，單次查找的平均 / 最差耗時
+- accuracy: 對原文做少量修改（打印版頁腳、替換個別詞、截斷末尾）後的漢明距離和檢出率，
+            以及不相關頁面被誤判為重複的比例
+
+用法: python benchmarks/bench_near_duplicate.py --entries 100000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+from near_duplicate import SimHashIndex, simhash, hamming_distance
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def _variants(rng, text):
+    words = text.split()
+    replaced = list(words)
+    for _ in range(max(1, len(words) // 200)):
+        replaced[rng.randrange(len(words))] = "edited"
+    return {
+        "print_footer": text + " printed from the example site, all rights reserved",
+        "word_edits": " ".join(replaced),
+        "truncated_tail": " ".join(words[:int(len(words) * 0.97)]),
+    }
+
+
+def _bench_simhash(rng, repeat):
+    rows = {}
+    for words in (200, 2000, 20000):
+        text = _text(rng, words)
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            simhash(text)
+            best = min(best, time.perf_counter() - started)
+        rows[f"{words}_words"] = {
+            "ms": round(best * 1000, 3),
+            "mb_per_sec": round(len(text.encode("utf-8")) / 1024 / 1024 / best, 2),
+        }
+    return rows
+
+
+def _bench_lookup(rng, entries, max_distance, queries):
+    index = SimHashIndex(max_distance)
+    fingerprints = [rng.getrandbits(64) for _ in range(entries)]
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(f"page-{i}", fingerprint)
+    timings = []
+    found = 0
+    for i in range(queries):
+        # 一半查詢是已有指紋翻轉 max_distance 位，一半是隨機指紋
+        if i % 2 == 0:
+            query = fingerprints[rng.randrange(entries)]
+            for bit in rng.sample(range(64), max_distance):
+                query ^= 1 << bit
+        else:
+            query = rng.getrandbits(64)
+        started = time.perf_counter()
+        found += index.find(query) is not None
+        timings.append(time.perf_counter() - started)
+    return {
+        "entries": entries,
+        "mean_us": round(sum(timings) / len(timings) * 1e6, 2),
+        "max_us": round(max(timings) * 1e6, 2),
+        "found": found,
+        "queries": queries,
+    }
+
+
+def _bench_accuracy(rng, documents, max_distance):
+    distances = {}
+    detected = {}
+    false_positives = 0
+    originals = [_text(rng, 1500) for _ in range(documents)]
+    fingerprints = [simhash(text) for text in originals]
+    for text, fingerprint in zip(originals, fingerprints):
+        for name, variant in _variants(rng, text).items():
+            distance = hamming_distance(fingerprint, simhash(variant))
+            distances.setdefault(name, []).append(distance)
+            detected[name] = detected.get(name, 0) + (distance <= max_distance)
+    for i in range(documents):
+        for j in range(i + 1, documents):
+            false_positives += hamming_distance(fingerprints[i], fingerprints[j]) <= max_distance
+    pairs = documents * (documents - 1) // 2
+    return {
+        "variants": {
+            name: {
+                "mean_distance": round(sum(values) / len(values), 2),
+                "detected": round(detected[name] / len(values), 3),
+            }
+            for name, values in distances.items()
+        },
+        "unrelated_false_positive_rate": round(false_positives / pairs, 5) if pairs else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重複檢測基準測試")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--documents", type=int, default=60)
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    report = {
+        "simhash": _bench_simhash(rng, args.repeat),
+        "lookup": _bench_lookup(rng, args.entries, args.max_distance, args.queries),
+        "accuracy": _bench_accuracy(rng, args.documents, args.max_distance),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+會話代理跨 worker 廣播延遲基準測試
+
+啟動 N 個 worker 進程，每個進程運行一個 UnixSocketSessionBroker，
+由 worker 0 發布事件，統計其他 worker 收到事件的延遲。
+
+用法: python benchmarks/bench_session_broker.py --workers 4 --events 2000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_broker import UnixSocketSessionBroker
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run_worker(index, socket_dir, workers, events, interval, ready, results):
+    latencies = []
+    done = asyncio.Event()
+
+    async def on_event(session_id, event):
+        # CLOCK_MONOTONIC 在同一台機器的進程間共享
+        latencies.append(time.monotonic() - event["sent_at"])
+        if event["seq"] == events - 1:
+            done.set()
+
+    broker = UnixSocketSessionBroker(socket_dir, workers=workers, worker_id=f"worker-{index}",
+                                      peer_refresh_interval=0.05)
+    broker.set_handler(on_event if index else _ignore)
+    await broker.start()
+    ready.wait()
+    # 等待所有 worker 發現彼此
+    await asyncio.sleep(0.3)
+
+    if index == 0:
+        await broker._refresh_peers(force=True)
+        for seq in range(events):
+            await broker.publish("bench-session", {"type": "new_message", "seq": seq,
+                                                   "sent_at": time.monotonic(),
+                                                   "content": "x" * 200})
+            if interval:
+                await asyncio.sleep(interval)
+        results.put((index, []))
+    else:
+        try:
+            await asyncio.wait_for(done.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+        results.put((index, latencies))
+
+    await asyncio.sleep(0.2)
+    await broker.close()
+
+
+async def _ignore(session_id, event):
+    pass
+
+
+def _worker_main(*args):
+    asyncio.run(_run_worker(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會話代理跨 worker 廣播延遲測試")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=0.0, help="發布間隔（秒）")
+    args = parser.parse_args()
+
+    socket_dir = tempfile.mkdtemp(prefix="session-broker-bench-")
+    ready = multiprocessing.Barrier(args.workers)
+    results = multiprocessing.Queue()
+
+    processes = [
+        multiprocessing.Process(target=_worker_main,
+                                args=(i, socket_dir, args.workers, args.events, args.interval, ready, results))
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies = []
+    for _ in processes:
+        index, worker_latencies = results.get(timeout=60)
+        latencies.extend(worker_latencies)
+    for process in processes:
+        process.join()
+
+    received = len(latencies)
+    expected = args.events * (args.workers - 1)
+    ms = [value * 1000 for value in latencies]
+    report = {
+        "workers": args.workers,
+        "events": args.events,
+        "delivered": received,
+        "expected": expected,
+        "latency_ms": {
+            "mean": round(statistics.mean(ms), 3) if ms else 0.0,
+            "p50": round(_percentile(ms, 50), 3),
+            "p95": round(_percentile(ms, 95), 3),
+            "p99": round(_percentile(ms, 99), 3),
+            "max": round(max(ms), 3) if ms else 0.0,
+        },
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
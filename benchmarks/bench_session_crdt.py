@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+協作文檔 CRDT 基準測試
+
+在一個 10k 行的文件上模擬多名編輯者交替編輯（連續輸入、退格、粘貼、刪除選區、跳行），統計：
+- 服務端按位置應用操作的吞吐（含 ID 解析和增量生成）
+- 把生成的按 ID 增量回放到另一副本的吞吐（遠端操作合併）
+- 文檔內存（tracemalloc）、段數、墓碑數，壓縮耗時和快照大小
+
+用法: python benchmarks/bench_session_crdt.py --editors 20 --lines 10000 --ops 200000
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_crdt import CRDTDocument
+
+
+def _source_file(lines, rng):
+    words = ["def", "return", "self", "value", "items", "for", "in", "if", "None", "await", "session", "index"]
+    return "".join(
+        "    " * rng.randint(0, 3) + " ".join(rng.choice(words) for _ in range(rng.randint(2, 9))) + "\n"
+        for _ in range(lines)
+    )
+
+
+def _edit_script(editors, ops, length, rng):
+    """
+    每名編輯者維護自己的光標，其他人的編輯會平移光標（與真實編輯器一致）；
+    生成 (編輯者, 操作) 序列，按位置表示
+    """
+    cursors = [rng.randrange(length) for _ in range(editors)]
+    script = []
+    for _ in range(ops):
+        editor = rng.randrange(editors)
+        cursor = min(cursors[editor], length)
+        roll = rng.random()
+        if roll < 0.70:
+            op = {"op": "insert", "index": cursor, "text": rng.choice("abcdefghij (),:=")}
+        elif roll < 0.85 and cursor > 0:
+            op = {"op": "delete", "index": cursor - 1, "length": 1}
+        elif roll < 0.90:
+            op = {"op": "insert", "index": cursor, "text": "x" * rng.randint(20, 200)}
+        elif roll < 0.95 and cursor < length:
+            op = {"op": "delete", "index": cursor, "length": min(rng.randint(5, 80), length - cursor)}
+        else:
+            cursors[editor] = rng.randrange(length)
+            continue
+
+        start = op["index"]
+        if op["op"] == "insert":
+            shift = len(op["text"])
+            cursors = [c + shift if c > start else c for c in cursors]
+            cursors[editor] = start + shift
+        else:
+            end = start + op["length"]
+            cursors = [c - op["length"] if c >= end else min(c, start) if c > start else c for c in cursors]
+            cursors[editor] = start
+            shift = -op["length"]
+        length += shift
+        script.append((f"editor-{editor}", op))
+    return script
+
+
+def main():
+    parser = argparse.ArgumentParser(description="協作文檔 CRDT 基準測試")
+    parser.add_argument("--editors", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    source = _source_file(args.lines, rng)
+    script = _edit_script(args.editors, args.ops, len(source), rng)
+
+    document = CRDTDocument("main")
+    document.apply("loader", [{"op": "insert", "index": 0, "text": source}])
+    initial = document.snapshot()
+
+    deltas = []
+    started = time.perf_counter()
+    for editor, op in script:
+        deltas.append((editor, document.apply(editor, [op])[0]))
+    local_seconds = time.perf_counter() - started
+    before_compact = document.stats()
+
+    started = time.perf_counter()
+    compact_result = document.compact(grace_epochs=0)
+    compact_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    snapshot = zlib.compress(json.dumps(document.snapshot(), separators=(",", ":")).encode("utf-8"))
+    snapshot_seconds = time.perf_counter() - started
+
+    replica = CRDTDocument.from_snapshot(initial)
+    started = time.perf_counter()
+    for editor, ops in deltas:
+        replica.apply(editor, [{key: value for key, value in op.items() if key != "index"} for op in ops])
+    remote_seconds = time.perf_counter() - started
+    assert replica.text() == document.text()
+
+    # 內存：在 tracemalloc 下重放同一腳本
+    tracemalloc.start()
+    measured = CRDTDocument.from_snapshot(initial)
+    base = tracemalloc.get_traced_memory()[0]
+    for editor, op in script:
+        measured.apply(editor, [op])
+    edited_bytes = tracemalloc.get_traced_memory()[0] - base
+    measured.compact(grace_epochs=0)
+    measured.compact(grace_epochs=0)
+    compacted_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    compacted = measured.stats()
+
+    report = {
+        "editors": args.editors,
+        "lines": args.lines,
+        "chars": len(source),
+        "ops": len(script),
+        "local_ops_per_sec": round(len(script) / local_seconds),
+        "remote_ops_per_sec": round(sum(len(ops) for _, ops in deltas) / remote_seconds),
+        "document": before_compact,
+        "compact": {**compact_result, "ms": round(compact_seconds * 1000, 1), "after": document.stats()},
+        "snapshot": {"bytes": len(snapshot), "ms": round(snapshot_seconds * 1000, 1)},
+        "memory_mb": {
+            "edit_growth": round(edited_bytes / 1024 / 1024, 2),
+            "after_compact_growth": round(compacted_bytes / 1024 / 1024, 2),
+            "after_compact_items": compacted["items"],
+            "after_compact_tombstones": compacted["tombstones"],
+        },
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
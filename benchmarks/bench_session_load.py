@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+會話服務端到端壓測
+
+在子進程中用 uvicorn 啟動 session_sharing_backend，創建 N 個會話、每個會話 M 個 WebSocket 參與者，
+每個參與者按固定速率發消息，統計消息吞吐、端到端廣播延遲（p50/p95/p99）、每會話內存和服務端 CPU。
+客戶端只用標準庫（asyncio + 手寫的最小 WebSocket 客戶端），不依賴外部服務。
+
+發送方式:
+  ws   - 通過 WebSocket "message" 幀發送（純廣播路徑，不落日誌）
+  http - 通過 POST /api/sessions/{id}/messages 發送（寫入消息日誌、索引和回放事件後廣播）
+
+結果寫入 JSON 文件，便於不同版本之間對比。
+
+用法: python benchmarks/bench_session_load.py --sessions 50 --participants 10 --rate 2 --duration 30 \
+          --output session_load.json
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_OP_CONTINUATION, _OP_TEXT, _OP_BINARY, _OP_CLOSE, _OP_PING, _OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _mask(data: bytes, key: bytes) -> bytes:
+    if not data:
+        return data
+    length = len(data)
+    pad = (key * (length // 4 + 1))[:length]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(pad, "big")).to_bytes(length, "big")
+
+
+class WebSocketClient:
+    """最小 WebSocket 客戶端（RFC 6455，僅文本幀，不支持擴展）"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host: str, port: int, path: str) -> "WebSocketClient":
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}:{port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = head.split(b"\r\n", 1)[0]
+        if b" 101 " not in status + b" ":
+            writer.close()
+            raise ConnectionError(f"WebSocket 握手失敗: {status.decode(errors='replace')}")
+        return cls(reader, writer)
+
+    def _write_frame(self, opcode: int, payload: bytes):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header += length.to_bytes(2, "big")
+        else:
+            header.append(0x80 | 127)
+            header += length.to_bytes(8, "big")
+        key = os.urandom(4)
+        self.writer.write(bytes(header) + key + _mask(payload, key))
+
+    async def send_json(self, data):
+        self._write_frame(_OP_TEXT, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        await self.writer.drain()
+
+    async def recv(self):
+        """返回下一條文本消息；連接關閉時返回 None"""
+        fragments = []
+        while True:
+            try:
+                first, second = await self.reader.readexactly(2)
+                length = second & 0x7F
+                if length == 126:
+                    length = int.from_bytes(await self.reader.readexactly(2), "big")
+                elif length == 127:
+                    length = int.from_bytes(await self.reader.readexactly(8), "big")
+                key = await self.reader.readexactly(4) if second & 0x80 else None
+                payload = await self.reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return None
+            if key:
+                payload = _mask(payload, key)
+
+            opcode = first & 0x0F
+            if opcode == _OP_PING:
+                self._write_frame(_OP_PONG, payload)
+                continue
+            if opcode == _OP_PONG:
+                continue
+            if opcode == _OP_CLOSE:
+                return None
+            fragments.append(payload)
+            if first & 0x80:
+                return b"".join(fragments).decode("utf-8")
+
+    async def close(self):
+        try:
+            self._write_frame(_OP_CLOSE, (1000).to_bytes(2, "big"))
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+
+
+class HTTPClient:
+    """最小 HTTP/1.1 keep-alive 客戶端，只處理帶 Content-Length 的 JSON 響應"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method: str, path: str, payload=None):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        self._writer.write((
+            f"{method} {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n"
+        ).encode() + body)
+        await self._writer.drain()
+
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            data = await self._reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await self._reader.read()
+        if headers.get("connection", "").lower() == "close" or "content-length" not in headers:
+            await self.close()
+        return status, json.loads(data) if data else None
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class ServerProcess:
+    """在子進程中運行會話服務，並通過 /proc 採集內存和 CPU"""
+
+    def __init__(self, port: int, workdir: str, extra_env=None):
+        self.port = port
+        self.workdir = workdir
+        self.extra_env = extra_env or {}
+        self.process = None
+
+    def start(self):
+        env = dict(os.environ)
+        env.update({
+            "SESSION_STORAGE_DIR": os.path.join(self.workdir, "sessions"),
+            "SHARE_TOKEN_DB": os.path.join(self.workdir, "share_tokens.db"),
+            "PYTHONPATH": REPO_ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        })
+        env.update(self.extra_env)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "session_sharing_backend:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=REPO_ROOT, env=env
+        )
+
+    async def wait_ready(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"服務進程提前退出 (code={self.process.returncode})")
+            client = HTTPClient("127.0.0.1", self.port)
+            try:
+                status, _ = await client.request("GET", "/api/sessions/public")
+                if status == 200:
+                    return
+            except (OSError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                await client.close()
+            await asyncio.sleep(0.1)
+        raise TimeoutError("等待服務啟動超時")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def rss_bytes(self):
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def cpu_seconds(self):
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            # utime / stime 是第 14、15 個字段（去掉 pid 和 comm 後下標 11、12）
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            return None
+
+
+class LoadStats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.latencies = []
+
+
+async def _participant(host, port, session_id, user_id, args, stats, start_at, stop_at, drain_until):
+    http = HTTPClient(host, port)
+    status, _ = await http.request("POST", f"/api/sessions/{session_id}/join",
+                                   {"user_id": user_id, "user_name": user_id})
+    if status != 200:
+        stats.errors += 1
+    ws = await WebSocketClient.connect(host, port, f"/ws/sessions/{session_id}")
+
+    async def receive():
+        while True:
+            raw = await ws.recv()
+            if raw is None:
+                return
+            now = time.time()
+            frame = json.loads(raw)
+            if frame.get("type") == "message":
+                sent_at = frame.get("sent_at")
+            elif frame.get("type") == "new_message":
+                sent_at = (frame["message"].get("metadata") or {}).get("sent_at")
+            else:
+                continue
+            if sent_at is not None and now <= drain_until:
+                stats.received += 1
+                stats.latencies.append((now - sent_at) * 1000)
+
+    receiver = asyncio.ensure_future(receive())
+    content = "x" * args.message_size
+    interval = 1.0 / args.rate
+    # 錯開各參與者的發送相位，避免所有人同時發送
+    next_at = start_at + random.random() * interval
+    try:
+        while True:
+            delay = next_at - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if time.time() >= stop_at:
+                break
+            sent_at = time.time()
+            try:
+                if args.transport == "ws":
+                    await ws.send_json({"type": "message", "user_id": user_id,
+                                        "content": content, "sent_at": sent_at})
+                else:
+                    status, _ = await http.request("POST", f"/api/sessions/{session_id}/messages", {
+                        "user_id": user_id, "user_name": user_id, "message_type": "user",
+                        "content": content, "metadata": {"sent_at": sent_at}
+                    })
+                    if status != 200:
+                        stats.errors += 1
+                        continue
+                stats.sent += 1
+            except (OSError, asyncio.IncompleteReadError):
+                stats.errors += 1
+            next_at += interval
+
+        await asyncio.sleep(max(drain_until - time.time(), 0))
+    finally:
+        receiver.cancel()
+        await ws.close()
+        await http.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    server = None
+    workdir = tempfile.mkdtemp(prefix="session-load-")
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = "127.0.0.1", _free_port()
+        server = ServerProcess(port, workdir)
+        server.start()
+
+    try:
+        if server:
+            await server.wait_ready()
+            rss_baseline = server.rss_bytes()
+
+        admin = HTTPClient(host, port)
+        session_ids = []
+        for i in range(args.sessions):
+            status, body = await admin.request("POST", "/api/sessions/create", {
+                "creator_id": f"creator-{i}", "creator_name": f"creator-{i}", "title": f"load-{i}"
+            })
+            if status != 200:
+                raise RuntimeError(f"創建會話失敗: {status} {body}")
+            session_ids.append(body["session_id"])
+        await admin.close()
+
+        stats = LoadStats()
+        # 留出建立連接的時間，所有參與者在同一時刻開始發送
+        start_at = time.time() + args.ramp_up
+        stop_at = start_at + args.duration
+        drain_until = stop_at + args.drain
+        participants = [
+            _participant(host, port, sid, f"user-{s}-{p}", args, stats, start_at, stop_at, drain_until)
+            for s, sid in enumerate(session_ids) for p in range(args.participants)
+        ]
+        tasks = [asyncio.ensure_future(p) for p in participants]
+
+        await asyncio.sleep(max(start_at - time.time(), 0))
+        rss_connected = server.rss_bytes() if server else None
+        cpu_start = server.cpu_seconds() if server else None
+        wall_start = time.monotonic()
+
+        await asyncio.sleep(max(stop_at - time.time(), 0))
+        cpu_end = server.cpu_seconds() if server else None
+        wall = time.monotonic() - wall_start
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failures = [r for r in results if isinstance(r, BaseException)]
+        rss_end = server.rss_bytes() if server else None
+    finally:
+        if server:
+            server.stop()
+
+    expected = stats.sent * args.participants
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            "sessions": args.sessions,
+            "participants": args.participants,
+            "rate_per_participant": args.rate,
+            "duration": args.duration,
+            "message_size": args.message_size,
+            "transport": args.transport,
+        },
+        "throughput": {
+            "sent": stats.sent,
+            "sent_per_sec": round(stats.sent / args.duration, 1),
+            "delivered": stats.received,
+            "delivered_per_sec": round(stats.received / args.duration, 1),
+            "delivery_ratio": round(stats.received / expected, 4) if expected else None,
+            "errors": stats.errors,
+            "failed_participants": len(failures),
+        },
+        "latency_ms": {
+            "p50": round(_percentile(stats.latencies, 50), 3),
+            "p95": round(_percentile(stats.latencies, 95), 3),
+            "p99": round(_percentile(stats.latencies, 99), 3),
+            "max": round(max(stats.latencies), 3) if stats.latencies else 0.0,
+        },
+    }
+    if server and rss_baseline:
+        report["memory"] = {
+            "rss_baseline_mb": round(rss_baseline / 1024 / 1024, 1),
+            "rss_connected_mb": round(rss_connected / 1024 / 1024, 1) if rss_connected else None,
+            "rss_end_mb": round(rss_end / 1024 / 1024, 1) if rss_end else None,
+            "per_session_kb": round((rss_end - rss_baseline) / args.sessions / 1024, 1) if rss_end else None,
+        }
+    if cpu_start is not None and cpu_end is not None:
+        report["cpu"] = {
+            "server_seconds": round(cpu_end - cpu_start, 2),
+            "server_percent": round((cpu_end - cpu_start) / wall * 100, 1),
+        }
+    if failures:
+        report["failures"] = sorted({f"{type(f).__name__}: {f}" for f in failures})[:10]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會話服務端到端壓測")
+    parser.add_argument("--sessions", type=int, default=20, help="會話數 N")
+    parser.add_argument("--participants", type=int, default=5, help="每個會話的參與者數 M")
+    parser.add_argument("--rate", type=float, default=2.0, help="每個參與者每秒發送的消息數")
+    parser.add_argument("--duration", type=float, default=20.0, help="發送階段時長（秒）")
+    parser.add_argument("--message-size", type=int, default=200, help="消息內容字節數")
+    parser.add_argument("--transport", choices=("ws", "http"), default="ws")
+    parser.add_argument("--ramp-up", type=float, default=3.0, help="建立連接的時間（秒）")
+    parser.add_argument("--drain", type=float, default=2.0, help="停止發送後繼續接收的時間（秒）")
+    parser.add_argument("--url", help="壓測已運行的服務（如 http://127.0.0.1:8083），此時不採集內存/CPU")
+    parser.add_argument("--output", default="session_load.json", help="結果 JSON 文件")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+會話消息內存佔用基準測試
+
+對比兩種表示方式存儲 N 條消息（及對應回放事件）的內存：
+- before: dataclass + ISO 時間字符串 + UUID 字符串 id，回放事件保存一份 asdict 副本
+- after:  session_sharing_backend 中的 __slots__ 記錄，回放事件引用消息
+
+每種表示在獨立子進程中測量，用 tracemalloc 統計分配的內存。
+
+用法: python benchmarks/bench_session_memory.py --messages 1000000
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tracemalloc
+import multiprocessing
+from datetime import datetime
+from dataclasses import dataclass, asdict
+from typing import Dict, Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SESSION_ID = str(uuid.uuid4())
+USERS = 50
+
+
+@dataclass
+class LegacySessionMessage:
+    id: str
+    session_id: str
+    user_id: str
+    user_name: str
+    message_type: str
+    content: str
+    timestamp: str
+    metadata: Dict[str, Any]
+
+
+@dataclass
+class LegacyReplayEvent:
+    event_id: str
+    session_id: str
+    event_type: str
+    timestamp: str
+    data: Dict[str, Any]
+    duration: float
+
+
+def _request_fields(i):
+    # 模擬每個請求解析 JSON 後得到的新字符串對象
+    user = i % USERS
+    return (
+        "".join(["user-", str(user)]),
+        "".join(["開發者", str(user)]),
+        "".join(["user"]),
+        f"第 {i} 條消息：修復 websocket 重連後消息丟失的問題，並補充測試用例",
+    )
+
+
+def _build_before(count):
+    messages, events = [], []
+    session_id = "".join([SESSION_ID])
+    for i in range(count):
+        user_id, user_name, message_type, content = _request_fields(i)
+        message = LegacySessionMessage(
+            id=str(uuid.uuid4()),
+            session_id=session_id,
+            user_id=user_id,
+            user_name=user_name,
+            message_type=message_type,
+            content=content,
+            timestamp=datetime.now().isoformat(),
+            metadata={}
+        )
+        messages.append(message)
+        events.append(LegacyReplayEvent(
+            event_id=str(uuid.uuid4()),
+            session_id=session_id,
+            event_type="message",
+            timestamp=datetime.now().isoformat(),
+            data=asdict(message),
+            duration=0.1
+        ))
+    return messages, events
+
+
+def _build_after(count):
+    from session_sharing_backend import SessionMessage, ReplayEvent
+
+    messages, events = [], []
+    session_id = "".join([SESSION_ID])
+    for i in range(count):
+        user_id, user_name, message_type, content = _request_fields(i)
+        message = SessionMessage(
+            seq=i,
+            session_id=session_id,
+            user_id=user_id,
+            user_name=user_name,
+            message_type=message_type,
+            content=content,
+            created_at=time.time()
+        )
+        messages.append(message)
+        events.append(ReplayEvent(
+            seq=i,
+            session_id=session_id,
+            event_type="message",
+            created_at=time.time(),
+            message=message
+        ))
+    return messages, events
+
+
+def _measure(variant, count, results):
+    if variant == "after":
+        # 預先導入，避免模塊加載計入測量
+        import session_sharing_backend  # noqa: F401
+
+    builder = _build_before if variant == "before" else _build_after
+    tracemalloc.start()
+    started = time.perf_counter()
+    data = builder(count)
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.put((variant, current, elapsed))
+    del data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會話消息內存佔用對比")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    results = multiprocessing.Queue()
+    report = {"messages": args.messages}
+    for variant in ("before", "after"):
+        process = multiprocessing.Process(target=_measure, args=(variant, args.messages, results))
+        process.start()
+        name, current, elapsed = results.get()
+        process.join()
+        report[name] = {
+            "total_mb": round(current / 1024 / 1024, 1),
+            "bytes_per_message": round(current / args.messages, 1),
+            "build_seconds": round(elapsed, 2),
+        }
+
+    report["reduction"] = f"{(1 - report['after']['total_mb'] / report['before']['total_mb']) * 100:.1f}%"
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
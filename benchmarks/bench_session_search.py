@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+會話全文檢索基準測試
+
+用合成的中英混合消息建立索引，統計索引吞吐和查詢延遲（全局 / 單會話）。
+
+用法: python benchmarks/bench_session_search.py --messages 1000000 --sessions 2000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_search import SessionSearchIndex
+
+CJK_PHRASES = ["修復", "連接", "重連", "消息", "丟失", "測試", "部署", "性能", "優化", "會話",
+               "回放", "分享", "編輯器", "數據庫", "緩存", "索引", "錯誤", "日誌", "配置", "接口"]
+
+
+def _vocabulary(size, rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = {"websocket", "bug", "reconnect", "session", "deploy", "cache", "index", "latency"}
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 9))))
+    return sorted(words)
+
+
+def _messages(count, vocabulary, rng):
+    # Zipf 分佈：少數詞很常見，大部分詞很少見
+    cumulative, total = [], 0.0
+    for rank in range(len(vocabulary)):
+        total += 1 / (rank + 1)
+        cumulative.append(total)
+    for _ in range(count):
+        words = rng.choices(vocabulary, cum_weights=cumulative, k=rng.randint(6, 24))
+        if rng.random() < 0.4:
+            words.append("".join(rng.sample(CJK_PHRASES, 3)))
+        yield " ".join(words)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="會話全文檢索基準測試")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(args.vocabulary, rng)
+    session_ids = [f"session-{i}" for i in range(args.sessions)]
+    next_seq = [0] * args.sessions
+
+    index = SessionSearchIndex()
+    started = time.perf_counter()
+    for text in _messages(args.messages, vocabulary, rng):
+        session = rng.randrange(args.sessions)
+        index.add(session_ids[session], next_seq[session], text)
+        next_seq[session] += 1
+    index_seconds = time.perf_counter() - started
+
+    query_sets = {
+        "rare_term": [rng.choice(vocabulary[len(vocabulary) // 2:]) for _ in range(args.queries)],
+        "common_term": [rng.choice(vocabulary[:20]) for _ in range(args.queries)],
+        "two_terms": [f"{rng.choice(vocabulary[:200])} {rng.choice(vocabulary[:2000])}" for _ in range(args.queries)],
+        "cjk": ["".join(rng.sample(CJK_PHRASES, 2)) for _ in range(args.queries)],
+    }
+
+    report = {
+        "messages": args.messages,
+        "sessions": args.sessions,
+        "index": {
+            "seconds": round(index_seconds, 2),
+            "messages_per_sec": round(args.messages / index_seconds),
+            **index.stats()
+        },
+        "query_ms": {}
+    }
+    for name, queries in query_sets.items():
+        for scope in ("global", "session"):
+            latencies = []
+            for query in queries:
+                session_id = rng.choice(session_ids) if scope == "session" else None
+                t0 = time.perf_counter()
+                index.search(query, session_id=session_id, limit=20)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            report["query_ms"][f"{name}/{scope}"] = {
+                "mean": round(statistics.mean(latencies), 3),
+                "p50": round(_percentile(latencies, 50), 3),
+                "p95": round(_percentile(latencies, 95), 3),
+                "max": round(max(latencies), 3),
+            }
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+URL 內容處理流水線基準測試（離線）
+
+在 api/fixtures/html 中的固定頁面（小頁面、典型博客、大型 SPA 外殼、中文頁面、畸形標記）上
+逐階段測量 url_processor 的處理流水線：
+- decode:   按響應頭 / meta 聲明的字符集解碼原始字節
+- extract:  HTMLContentExtractor 分塊 feed 並生成提取結果
+- format:   構建 WebContent（含語言檢測）並轉換為 Claude Code 友好格式
+- chunk:    按 token 預算切分正文
+- simhash:  計算正文的近似重複指紋
+每個階段報告 pages/sec、MB/s（按該階段的輸入大小計算）和單頁的峰值內存（tracemalloc）。
+
+回歸檢查：--save-baseline 把本次結果寫入基線文件；--check 與基線比較，
+任一階段相對吞吐下降或峰值內存增長超過 --threshold 時以非零狀態退出。
+絕對吞吐隨機器變化，因此每輪測量前運行一個固定的純 Python 校準負載，各階段耗時除以緊鄰的校準耗時
+並取中位數，得到相對吞吐（每輪校準時間內處理的 MB 數）後再比較；默認容差 40%，
+吸收共享機器上約 ±20% 的抖動。基線同時記錄生成它的機器（平台、處理器、Python 版本），機器不同時報告中會註明。
+倉庫中的基線（benchmarks/baselines/url_extraction.json）可以直接用於 --check；
+需要更嚴格的比較時，在同一台機器上用上一個發布版本生成基線再比較：
+
+    git checkout <上一個發布標籤> && python benchmarks/bench_url_extraction.py --save-baseline --baseline /tmp/url_extraction.json
+    git checkout - && python benchmarks/bench_url_extraction.py --check --baseline /tmp/url_extraction.json
+
+用法: python benchmarks/bench_url_extraction.py --repeat 20
+"""
+
+import os
+import sys
+import gc
+import re
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+
+from html_extractor import HTMLContentExtractor, incremental_decoder
+from text_chunker import ChunkConfig
+from near_duplicate import simhash
+from url_processor import URLProcessor, FIXTURES_DIR
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "url_extraction.json")
+STAGES = ("decode", "extract", "format", "chunk", "simhash")
+FEED_SIZE = 64 * 1024
+
+
+_CALIBRATION_TEXT = " ".join(f"<p class='c{i % 7}'>word{i} text &amp; more</p>" for i in range(500))
+_CALIBRATION_TAG = re.compile(r"<(/?)([a-z]+)([^>]*)>")
+
+
+def _calibration_round():
+    """
+    固定的純 Python 校準負載（正則、字符串、字典、JSON，與提取流水線的操作類似）；
+    每輪測量前運行一次，各階段耗時除以緊鄰的校準耗時得到與機器無關的相對值
+    """
+    counts = {}
+    for match in _CALIBRATION_TAG.finditer(_CALIBRATION_TEXT):
+        counts[match.group(2)] = counts.get(match.group(2), 0) + len(match.group(3))
+    words = _CALIBRATION_TEXT.replace("&amp;", "&").lower().split()
+    json.loads(json.dumps({"counts": counts, "words": words}))
+
+
+def _machine():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def _load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+                fixtures[name[:-len(".html")]] = f.read()
+    return fixtures
+
+
+def _pipeline(processor, url, data):
+    """返回共享狀態和按順序執行的各階段；每個階段從 state 讀取上一階段的輸出"""
+    state = {}
+
+    def decode():
+        state["html"] = incremental_decoder(None, data[:4096]).decode(data, final=True)
+
+    def extract():
+        html_content = state["html"]
+        extractor = HTMLContentExtractor(max_text_chars=processor.limits.max_text_chars)
+        for start in range(0, len(html_content), FEED_SIZE):
+            extractor.feed(html_content[start:start + FEED_SIZE])
+            if extractor.done:
+                break
+        state["extracted"] = extractor.result()
+
+    def format_():
+        state["content"] = processor._format_for_claude_code(processor._build_content(state["extracted"], url))
+
+    def chunk():
+        state["chunks"] = list(processor.chunk_content(state["content"], state["chunk_config"]))
+
+    def fingerprint():
+        simhash(state["extracted"].text)
+
+    return state, [("decode", decode), ("extract", extract), ("format", format_),
+                   ("chunk", chunk), ("simhash", fingerprint)]
+
+
+def _stage_input(stage, data, state):
+    if stage == "decode":
+        return len(data)
+    if stage == "extract":
+        return len(state["html"].encode("utf-8"))
+    return len(state["extracted"].text.encode("utf-8"))
+
+
+def _measure(processor, fixtures, repeat, chunk_config):
+    seconds = {stage: 0.0 for stage in STAGES}
+    input_bytes = {stage: 0 for stage in STAGES}
+    peak = {stage: 0 for stage in STAGES}
+    pages = {}
+    calibration = float("inf")
+    # 各階段耗時相當於多少輪校準負載（每輪與緊鄰的校準相除，取中位數），機器快慢和短時降頻在比值中抵消
+    relative_rounds = {stage: 0.0 for stage in STAGES}
+
+    for name, data in fixtures.items():
+        url = f"https://fixtures.local/{name}.html"
+        best = {stage: float("inf") for stage in STAGES}
+        ratios = {stage: [] for stage in STAGES}
+        gc.disable()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _calibration_round()
+            round_seconds = time.perf_counter() - started
+            calibration = min(calibration, round_seconds)
+            state, stages = _pipeline(processor, url, data)
+            state["chunk_config"] = chunk_config
+            for stage, run in stages:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                best[stage] = min(best[stage], elapsed)
+                ratios[stage].append(elapsed / round_seconds)
+        gc.enable()
+        for stage in STAGES:
+            relative_rounds[stage] += statistics.median(ratios[stage])
+
+        # 峰值內存單獨跑一遍：tracemalloc 會拖慢計時
+        state, stages = _pipeline(processor, url, data)
+        state["chunk_config"] = chunk_config
+        for stage, run in stages:
+            tracemalloc.start()
+            run()
+            peak[stage] = max(peak[stage], tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            input_bytes[stage] += _stage_input(stage, data, state)
+
+        for stage in STAGES:
+            seconds[stage] += best[stage]
+        pages[name] = {
+            "bytes": len(data),
+            "text_chars": len(state["extracted"].text),
+            "main_candidate": state["extracted"].main_candidate,
+            "chunks": len(state["chunks"]),
+            "ms": round(sum(best.values()) * 1000, 3),
+        }
+
+    stages = {}
+    for stage in STAGES:
+        elapsed = max(seconds[stage], 1e-9)
+        stages[stage] = {
+            "pages_per_sec": round(len(fixtures) / elapsed, 1),
+            "mb_per_sec": round(input_bytes[stage] / 1024 / 1024 / elapsed, 2),
+            # 相對吞吐：每輪校準負載的時間內處理的 MB 數，與機器無關，用於回歸檢查
+            "relative": round(input_bytes[stage] / 1024 / 1024 / max(relative_rounds[stage], 1e-9), 4),
+            "peak_kb": round(peak[stage] / 1024, 1),
+        }
+    total = max(sum(seconds.values()), 1e-9)
+    html_bytes = sum(len(data) for data in fixtures.values())
+    return {
+        "pages": pages,
+        "stages": stages,
+        "total": {
+            "pages_per_sec": round(len(fixtures) / total, 1),
+            "mb_per_sec": round(html_bytes / 1024 / 1024 / total, 2),
+        },
+        "calibration": {"score": round(1 / calibration, 1)},
+    }
+
+
+def _check(report, baseline, threshold):
+    """
+    返回超過閾值的回歸列表
+    吞吐比較相對值（相對校準負載）；沒有相對值的舊基線按絕對 MB/s 比較
+    """
+    regressions = []
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        if previous.get("relative"):
+            ratio = current["relative"] / previous["relative"]
+        else:
+            ratio = current["mb_per_sec"] / previous["mb_per_sec"]
+        if ratio < 1 - threshold:
+            regressions.append(f"{stage}: 相對吞吐為基線的 {ratio:.0%}"
+                               f"（{current['mb_per_sec']} MB/s，基線 {previous['mb_per_sec']} MB/s）")
+        # 峰值內存很小時的波動沒有意義
+        if current["peak_kb"] > max(previous["peak_kb"] * (1 + threshold), previous["peak_kb"] + 64):
+            regressions.append(f"{stage}: 峰值內存 {current['peak_kb']} KB > 基線 {previous['peak_kb']} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL 內容處理流水線基準測試")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--overlap-tokens", type=int, default=64)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="把本次結果寫入基線文件")
+    parser.add_argument("--check", action="store_true", help="與基線比較，有回歸時以非零狀態退出")
+    parser.add_argument("--threshold", type=float, default=0.4, help="允許的相對吞吐下降 / 內存增長比例")
+    args = parser.parse_args()
+
+    processor = URLProcessor(use_cache=False)
+    report = _measure(processor, _load_fixtures(), args.repeat,
+                      ChunkConfig(max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens))
+    report["machine"] = _machine()
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+    regressions = []
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = _check(report, baseline, args.threshold)
+        report["regressions"] = regressions
+        if baseline.get("machine") != report["machine"]:
+            report["baseline_machine"] = baseline.get("machine")
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
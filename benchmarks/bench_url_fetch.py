@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+URL 獲取連接池基準測試
+
+在本地啟動一個 aiohttp 測試服務器，按順序獲取同一頁面 N 次，對比：
+- per-call: 每次獲取創建並關閉一個 ClientSession（原行為，每次都重新建立 TCP/TLS 連接）
+- pooled:   使用應用級共享連接池（keep-alive 復用連接）
+統計總耗時、p50/p95 延遲和服務端看到的 TCP 連接數。--tls 使用臨時自簽證書（需要 openssl）
+
+用法: python benchmarks/bench_url_fetch.py --requests 100 --tls
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+
+def _page(paragraphs):
+    body = "".join(
+        f"<p>Paragraph {i}: the session service keeps connections alive between fetches.</p>"
+        for i in range(paragraphs)
+    )
+    return f"<html><head><title>Bench</title></head><body><article>{body}</article></body></html>"
+
+
+def _self_signed_cert(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", key, "-out", cert, "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def _run(args, cert):
+    import ssl
+    from aiohttp import web, ClientSession
+    from http_pool import SharedHTTPClient
+    from url_processor import URLProcessor
+
+    page = _page(args.paragraphs)
+    connections = set()
+
+    async def handler(request):
+        connections.add(request.transport.get_extra_info("peername"))
+        return web.Response(text=page, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    ssl_context = None
+    if cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(*cert)
+    site = web.TCPSite(runner, "localhost", args.port, ssl_context=ssl_context)
+    await site.start()
+    url = f"{'https' if cert else 'http'}://localhost:{args.port}/page"
+
+    async def per_call():
+        async with ClientSession() as session:
+            async with URLProcessor(session=session) as processor:
+                await processor.fetch_and_process(url)
+
+    client = SharedHTTPClient()
+
+    async def pooled():
+        async with URLProcessor(client=client) as processor:
+            await processor.fetch_and_process(url)
+
+    report = {"url": url, "requests": args.requests, "page_bytes": len(page)}
+    try:
+        for name, fetch in (("per_call", per_call), ("pooled", pooled)):
+            await fetch()  # 預熱（導入、首次 DNS 解析）
+            connections.clear()
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(args.requests):
+                t0 = time.perf_counter()
+                await fetch()
+                latencies.append((time.perf_counter() - t0) * 1000)
+            elapsed = time.perf_counter() - started
+            report[name] = {
+                "total_ms": round(elapsed * 1000, 1),
+                "fetches_per_sec": round(args.requests / elapsed, 1),
+                "p50_ms": round(_percentile(latencies, 0.50), 3),
+                "p95_ms": round(_percentile(latencies, 0.95), 3),
+                "server_connections": len(connections),
+            }
+        report["speedup"] = round(report["per_call"]["total_ms"] / report["pooled"]["total_ms"], 2)
+    finally:
+        await client.close()
+        await runner.cleanup()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="URL 獲取連接池基準測試")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tls", action="store_true", help="使用自簽證書的 HTTPS 測試服務器")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert = None
+        if args.tls:
+            cert = _self_signed_cert(directory)
+            # 客戶端信任自簽證書：aiohttp 在導入時創建默認 SSL 上下文，須在導入前設置
+            os.environ["SSL_CERT_FILE"] = cert[0]
+        report = asyncio.run(_run(args, cert))
+    report["tls"] = args.tls
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
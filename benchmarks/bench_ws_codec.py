@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+WebSocket 幀編碼基準測試
+
+對典型的廣播幀（會話消息、回放事件、typing 狀態、UI 組件更新）比較 JSON 和 MessagePack：
+每條消息的字節數（原始 / 經 permessage-deflate 壓縮後）和編碼、解碼耗時。
+deflate 按 permessage-deflate 的默認方式模擬：同一連接上共用壓縮上下文，每條消息 Z_SYNC_FLUSH 後去掉尾部 4 字節。
+
+用法: python benchmarks/bench_ws_codec.py --messages 20000
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws_codec import WebSocketCodec, MessagePackCodec, msgpack
+from session_sharing_backend import SessionMessage, ReplayEvent
+
+WORDS = ["修復", "websocket", "重連", "消息", "session", "bug", "測試", "deploy", "緩存", "index", "latency", "性能"]
+
+
+def _session_message_frame(seq, rng):
+    message = SessionMessage(
+        seq=seq, session_id="2f1c9a7e-4b7d-4c55-9a51-5d0b8c6e2a10", user_id=f"user-{rng.randrange(8)}",
+        user_name=f"開發者{rng.randrange(8)}", message_type="user",
+        content=" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))),
+        created_at=time.time(), metadata={"client": "claudeditor", "reply_to": rng.randrange(max(seq, 1))}
+    )
+    return {"type": "new_message", "seq": seq, "message": message.to_dict()}
+
+
+def _replay_event_frame(seq, rng):
+    event = ReplayEvent(seq=seq, session_id="2f1c9a7e-4b7d-4c55-9a51-5d0b8c6e2a10", event_type="task_progress",
+                        created_at=time.time(),
+                        data={"updates": [{"task_id": f"task-{i}", "progress": rng.random()} for i in range(3)],
+                              "count": rng.randint(2, 30)},
+                        duration=rng.random())
+    return {"type": "replay_event", "seq": seq, "event": event.to_dict()}
+
+
+def _presence_frame(seq, rng):
+    return {"type": "typing", "seq": seq, "user_id": f"user-{rng.randrange(8)}", "typing": True, "coalesced": 3}
+
+
+def _component_update_frame(seq, rng):
+    return {
+        "type": "component_update",
+        "component_id": "test-statistics-panel",
+        "data": {"total_tests": 25, "running_tests": rng.randrange(5), "success_rate": round(rng.random() * 100, 1),
+                 "recent": [{"name": f"test_{i}", "status": rng.choice(["passed", "failed"]),
+                             "duration": round(rng.random() * 10, 2)} for i in range(5)]},
+        "timestamp": "2025-07-17T05:58:21.123456"
+    }
+
+
+PAYLOADS = {
+    "session_message": _session_message_frame,
+    "replay_event": _replay_event_frame,
+    "presence": _presence_frame,
+    "component_update": _component_update_frame,
+}
+
+
+def _wire_bytes(payloads):
+    """(原始字節, deflate 後字節)，deflate 使用連接級壓縮上下文"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    raw = compressed = 0
+    for payload in payloads:
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        raw += len(data)
+        compressed += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return raw, compressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 幀編碼基準測試")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    codecs = [WebSocketCodec()]
+    if msgpack is not None:
+        codecs.append(MessagePackCodec())
+
+    report = {"messages": args.messages, "msgpack_available": msgpack is not None, "payloads": {}}
+    for name, factory in PAYLOADS.items():
+        rng = random.Random(args.seed)
+        frames = [factory(seq, rng) for seq in range(args.messages)]
+        results = {}
+        for codec in codecs:
+            started = time.perf_counter()
+            payloads = [codec.encode(frame) for frame in frames]
+            encode_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for payload in payloads:
+                codec.decode(payload)
+            decode_seconds = time.perf_counter() - started
+
+            raw, compressed = _wire_bytes(payloads)
+            results[codec.name] = {
+                "bytes_per_message": round(raw / args.messages, 1),
+                "deflate_bytes_per_message": round(compressed / args.messages, 1),
+                "encode_us": round(encode_seconds / args.messages * 1e6, 2),
+                "decode_us": round(decode_seconds / args.messages * 1e6, 2),
+            }
+        report["payloads"][name] = results
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
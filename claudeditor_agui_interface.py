@@ -18,6 +18,8 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 import uvicorn
 
+import ws_codec
+
 # 导入AG-UI组件
 from core.components.ag_ui_mcp import (
     AGUIComponentGenerator,
@@ -249,18 +251,17 @@ class ClaudEditorAGUIInterface:
         
         @self.app.websocket("/ws")
         async def websocket_endpoint(websocket: WebSocket):
-            """WebSocket连接"""
-            await websocket.accept()
+            """WebSocket连接（子协议 claudeditor.msgpack 使用二进制帧，否则为 JSON）"""
+            codec = await ws_codec.accept(websocket)
             self.active_connections.append(websocket)
             
             try:
                 while True:
-                    data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = await codec.receive(websocket)
                     
                     # 处理WebSocket消息
                     response = await self.handle_websocket_message(message)
-                    await websocket.send_text(json.dumps(response))
+                    await codec.send(websocket, response)
                     
             except WebSocketDisconnect:
                 self.active_connections.remove(websocket)
@@ -648,7 +649,8 @@ async def main():
             interface.app,
             host="0.0.0.0",
             port=8000,
-            log_level="info"
+            log_level="info",
+            ws_per_message_deflate=ws_codec.per_message_deflate_enabled()
         )
         server = uvicorn.Server(config)
         
@@ -17,6 +17,8 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 import uvicorn
 
+import ws_codec
+
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -153,25 +155,24 @@ class ClaudEditorSimpleUI:
         
         @self.app.websocket("/ws")
         async def websocket_endpoint(websocket: WebSocket):
-            """WebSocket连接"""
-            await websocket.accept()
+            """WebSocket连接（子协议 claudeditor.msgpack 使用二进制帧，否则为 JSON）"""
+            codec = await ws_codec.accept(websocket)
             self.active_connections.append(websocket)
             
             try:
                 # 发送欢迎消息
-                await websocket.send_text(json.dumps({
+                await codec.send(websocket, {
                     "type": "welcome",
                     "message": "WebSocket连接已建立",
                     "timestamp": datetime.now().isoformat()
-                }))
+                })
                 
                 while True:
-                    data = await websocket.receive_text()
-                    message = json.loads(data)
+                    message = await codec.receive(websocket)
                     
                     # 处理不同类型的消息
                     response = await self.handle_websocket_message(message)
-                    await websocket.send_text(json.dumps(response))
+                    await codec.send(websocket, response)
                     
             except WebSocketDisconnect:
                 self.active_connections.remove(websocket)
@@ -488,7 +489,8 @@ class ClaudEditorSimpleUI:
             app=self.app,
             host=host,
             port=port,
-            log_level="info"
+            log_level="info",
+            ws_per_message_deflate=ws_codec.per_message_deflate_enabled()
         )
         server = uvicorn.Server(config)
         
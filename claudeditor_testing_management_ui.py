@@ -16,6 +16,8 @@ from pathlib import Path
 from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, JSONResponse
 
+import ws_codec
+
 # 导入测试管理器 - 已迁移到test_mcp
 # from test.test_manager import get_test_manager, TestType, TestPriority
 # from test.ui_test_registry import UITestRegistry
@@ -148,20 +150,20 @@ class TestingManagementUI:
     
     async def handle_websocket_connection(self, websocket: WebSocket):
         """处理WebSocket连接 - 支持AG-UI组件的实时更新"""
-        await websocket.accept()
+        codec = await ws_codec.accept(websocket)
         self.active_connections.append(websocket)
         
         try:
             while True:
                 # 接收客户端消息
-                data = await websocket.receive_json()
+                data = await codec.receive(websocket)
                 
                 # 处理AG-UI组件消息
                 response = await self._handle_agui_message(data)
                 
                 # 发送响应
                 if response:
-                    await websocket.send_json(response)
+                    await codec.send(websocket, response)
                     
         except WebSocketDisconnect:
             self.active_connections.remove(websocket)
@@ -213,10 +215,10 @@ class TestingManagementUI:
                 'timestamp': datetime.now().isoformat()
             }
             
-            message_json = json.dumps(message)
+            frame = ws_codec.EncodedFrame(message)
             for connection in self.active_connections.copy():
                 try:
-                    await connection.send_text(message_json)
+                    await frame.send(connection)
                 except:
                     self.active_connections.remove(connection)
     
@@ -0,0 +1,450 @@
+"""
+會話事件代理 - 跨 worker 的會話廣播和請求路由
+讓多個 uvicorn worker 共享同一套會話事件流
+
+SessionManager 只通過 SessionBroker 接口發布事件和轉發調用：
+- LocalSessionBroker: 單進程內直接分發（默認）
+- UnixSocketSessionBroker: 同一台機器上的多個 worker 通過 Unix domain socket 互相轉發，無需外部服務
+
+每個會話只有一個歸屬 worker，會話狀態和 SESSION_STORAGE_DIR 下該會話的分段都只由它讀寫：
+- call(): 會話級請求（加入、消息、分享、文檔等）在歸屬 worker 上執行，其他 worker 轉發調用並等待結果
+- call_all(): 跨會話的查詢（公開列表、全局檢索）在每個 worker 上執行，由調用方合併
+- broadcast(): 廣播幀序號（seq）只由歸屬 worker 分配：非歸屬 worker 把未編號的幀轉發給歸屬 worker，
+  由它編號後再扇出，所有 worker 收到的序號一致且有序，客戶端可以用 seq 重連續傳
+
+接入外部代理（Redis、NATS 等）時需實現 start/close/publish/owns/call/call_all，
+並在收到遠端事件時調用 _dispatch、收到遠端調用時調用 _serve。
+"""
+
+import os
+import json
+import time
+import fcntl
+import struct
+import asyncio
+import hashlib
+import itertools
+import tempfile
+import logging
+from typing import Dict, Any, Callable, Awaitable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+# 為會話的廣播幀分配序號（由 SessionManager 提供）
+EventStamper = Callable[[str, Dict[str, Any]], Dict[str, Any]]
+# 執行轉發來的調用：(方法名, 位置參數, 關鍵字參數) -> 可 JSON 序列化的結果
+RequestHandler = Callable[[str, List[Any], Dict[str, Any]], Awaitable[Any]]
+
+# 幀格式：4 字節大端長度 + JSON 內容
+_FRAME_HEADER = struct.Struct("!I")
+
+
+class OwnerUnavailable(ConnectionError):
+    """會話的歸屬 worker 不可達（未啟動、已退出或響應超時）"""
+
+
+class SessionBroker:
+    """會話事件代理基類"""
+
+    # 參與路由的 worker 數；為 1 時所有會話都歸本 worker
+    workers = 1
+
+    def __init__(self):
+        self._handler: Optional[EventHandler] = None
+        self._stamper: Optional[EventStamper] = None
+        self._request_handler: Optional[RequestHandler] = None
+
+    def set_handler(self, handler: EventHandler):
+        """設置本地事件處理器（通常是 SessionManager 的本地投遞方法）"""
+        self._handler = handler
+
+    def set_stamper(self, stamper: EventStamper):
+        """設置序號分配器；只在會話的歸屬 worker 上調用"""
+        self._stamper = stamper
+
+    def set_request_handler(self, handler: RequestHandler):
+        """設置調用處理器，執行其他 worker 轉發給本 worker 的調用"""
+        self._request_handler = handler
+
+    async def start(self):
+        """啟動代理"""
+
+    async def close(self):
+        """關閉代理"""
+
+    async def publish(self, session_id: str, event: Dict[str, Any]):
+        """發布會話事件到所有 worker（包括本 worker）"""
+        raise NotImplementedError
+
+    async def broadcast(self, session_id: str, event: Dict[str, Any]):
+        """由會話的歸屬 worker 分配序號後發布；單進程代理中本 worker 即歸屬 worker"""
+        await self.publish(session_id, self._stamp(session_id, event))
+
+    def owns(self, session_id: str) -> bool:
+        """本 worker 是否是會話的歸屬 worker"""
+        return True
+
+    async def call(self, session_id: str, method: str, args: List[Any],
+                   kwargs: Dict[str, Any] = None) -> Any:
+        """在會話的歸屬 worker 上執行調用並返回結果"""
+        return await self._serve(method, args, kwargs or {})
+
+    async def call_all(self, method: str, args: List[Any], kwargs: Dict[str, Any] = None) -> List[Any]:
+        """在每個可達的 worker 上執行調用，返回各 worker 的結果（本 worker 在前）"""
+        return [await self._serve(method, args, kwargs or {})]
+
+    def _stamp(self, session_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        return self._stamper(session_id, event) if self._stamper is not None else event
+
+    async def _dispatch(self, session_id: str, event: Dict[str, Any]):
+        """將事件交給本地處理器"""
+        if self._handler is None:
+            return
+        try:
+            await self._handler(session_id, event)
+        except Exception as e:
+            logger.error(f"會話事件處理失敗 {session_id}: {e}")
+
+    async def _serve(self, method: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        """在本 worker 上執行調用"""
+        if self._request_handler is None:
+            raise RuntimeError(f"未設置調用處理器: {method}")
+        return await self._request_handler(method, args, kwargs)
+
+
+class LocalSessionBroker(SessionBroker):
+    """進程內代理，單 worker 部署使用"""
+
+    async def publish(self, session_id: str, event: Dict[str, Any]):
+        await self._dispatch(session_id, event)
+
+
+class UnixSocketSessionBroker(SessionBroker):
+    """
+    基於 Unix domain socket 的本機代理
+    - 成員固定為 worker-0 .. worker-{workers-1}：啟動時用 flock 認領共享目錄下空閒的槽位鎖，
+      worker 退出後鎖自動釋放，重啟的進程接管同一個槽位，會話歸屬不變
+    - 會話的歸屬 worker 由 rendezvous 哈希在固定成員中選出，與哪些 worker 當前在線無關，
+      不會出現兩個 worker 同時持有一個會話
+    - 每個 worker 監聽 <worker_id>.sock，定期掃描目錄連接其他 worker；發布時直接寫給所有已連接的 worker，
+      寫入失敗或連接斷開的 worker 被移除，retry_interval 後重新連接
+    - 轉發的調用和結果在同一個連接上往返，按請求 ID 配對；歸屬 worker 不可達時拋出 OwnerUnavailable
+    """
+
+    def __init__(self, socket_dir: str, workers: int = 1, worker_id: str = None,
+                 peer_refresh_interval: float = 1.0, retry_interval: float = 5.0,
+                 call_timeout: float = 10.0):
+        super().__init__()
+        if workers < 1:
+            raise ValueError("workers 必須大於 0")
+        self.socket_dir = socket_dir
+        self.workers = workers
+        self.members = [f"worker-{i}" for i in range(workers)]
+        if worker_id is not None and worker_id not in self.members:
+            raise ValueError(f"worker_id 必須是 {self.members[0]} .. {self.members[-1]} 之一: {worker_id}")
+        # 未指定時在 start() 中認領空閒槽位
+        self.worker_id = worker_id
+        self.socket_path: Optional[str] = None
+        self.peer_refresh_interval = peer_refresh_interval
+        self.retry_interval = retry_interval
+        self.call_timeout = call_timeout
+
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Dict[str, asyncio.StreamWriter] = {}
+        self._readers: Dict[str, asyncio.Task] = {}
+        self._inbound: Set[asyncio.StreamWriter] = set()
+        self._serving: Set[asyncio.Task] = set()
+        self._unreachable: Dict[str, float] = {}
+        self._calls: Dict[int, Tuple[str, asyncio.Future]] = {}
+        self._call_ids = itertools.count()
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._connect_lock = asyncio.Lock()
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self.worker_id = self._claim_slot()
+        self.socket_path = self._socket_path(self.worker_id)
+        if os.path.exists(self.socket_path):
+            # 上一個持有該槽位的進程留下的 socket 文件
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_peer, path=self.socket_path)
+        await self._refresh_peers(force=True)
+        logger.info(f"📡 會話代理已啟動: {self.socket_path} ({self.workers} 個 worker)")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._inbound):
+                writer.close()
+            for task in list(self._serving):
+                task.cancel()
+            await self._server.wait_closed()
+            self._server = None
+        for worker_id in list(self._peers):
+            self._drop_peer(worker_id)
+        readers = list(self._readers.values())
+        for task in readers:
+            task.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _claim_slot(self) -> str:
+        """用 flock 認領槽位（指定了 worker_id 時只認領該槽位），返回 worker ID"""
+        for worker_id in ([self.worker_id] if self.worker_id else self.members):
+            fd = os.open(os.path.join(self.socket_dir, f"{worker_id}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self._lock_fd = fd
+            return worker_id
+        raise RuntimeError(f"{self.socket_dir} 下沒有空閒的 worker 槽位（共 {self.workers} 個）")
+
+    def _socket_path(self, worker_id: str) -> str:
+        return os.path.join(self.socket_dir, f"{worker_id}.sock")
+
+    def owner_of(self, session_id: str) -> str:
+        """會話的歸屬 worker（在固定成員中做 rendezvous 哈希）"""
+        return max(self.members, key=lambda worker_id: _owner_score(worker_id, session_id))
+
+    def owns(self, session_id: str) -> bool:
+        return self.owner_of(session_id) == self.worker_id
+
+    async def publish(self, session_id: str, event: Dict[str, Any]):
+        await self._dispatch(session_id, event)
+
+        await self._refresh_peers()
+        if not self._peers:
+            return
+
+        frame = self._encode({"o": self.worker_id, "s": session_id, "e": event})
+        writers = list(self._peers.items())
+        for _, writer in writers:
+            writer.write(frame)
+
+        results = await asyncio.gather(*(writer.drain() for _, writer in writers), return_exceptions=True)
+        for (worker_id, writer), result in zip(writers, results):
+            if isinstance(result, Exception):
+                self._drop_peer(worker_id)
+
+    async def broadcast(self, session_id: str, event: Dict[str, Any]):
+        owner = self.owner_of(session_id)
+        if owner == self.worker_id:
+            await self.publish(session_id, self._stamp(session_id, event))
+            return
+        # 轉發給歸屬 worker 編號並扇出（包括發回本 worker）
+        writer = await self._connect(owner)
+        try:
+            writer.write(self._encode({"o": self.worker_id, "s": session_id, "e": event, "f": 1}))
+            await writer.drain()
+        except (ConnectionError, OSError) as e:
+            self._drop_peer(owner)
+            raise OwnerUnavailable(f"會話歸屬 worker {owner} 不可達: {e}") from e
+
+    async def call(self, session_id: str, method: str, args: List[Any],
+                   kwargs: Dict[str, Any] = None) -> Any:
+        owner = self.owner_of(session_id)
+        if owner == self.worker_id:
+            return await self._serve(method, args, kwargs or {})
+        return await self._call_peer(owner, method, args, kwargs or {})
+
+    async def call_all(self, method: str, args: List[Any], kwargs: Dict[str, Any] = None) -> List[Any]:
+        kwargs = kwargs or {}
+        others = [worker_id for worker_id in self.members if worker_id != self.worker_id]
+        replies = await asyncio.gather(
+            self._serve(method, args, kwargs),
+            *(self._call_peer(worker_id, method, args, kwargs) for worker_id in others),
+            return_exceptions=True
+        )
+        results = []
+        for worker_id, reply in zip([self.worker_id] + others, replies):
+            if isinstance(reply, OwnerUnavailable):
+                # 不可達的 worker 持有的會話暫時不出現在結果中
+                logger.warning(f"{method}: worker {worker_id} 不可達，跳過: {reply}")
+                continue
+            if isinstance(reply, BaseException):
+                raise reply
+            results.append(reply)
+        return results
+
+    async def _call_peer(self, worker_id: str, method: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        """把調用轉發給指定 worker 並等待結果"""
+        writer = await self._connect(worker_id)
+        call_id = next(self._call_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._calls[call_id] = (worker_id, future)
+        try:
+            writer.write(self._encode({"o": self.worker_id, "r": call_id, "m": method, "a": args, "k": kwargs}))
+            await writer.drain()
+            return await asyncio.wait_for(future, self.call_timeout)
+        except OwnerUnavailable:
+            raise
+        except asyncio.TimeoutError:
+            raise OwnerUnavailable(f"worker {worker_id} 響應超時: {method}")
+        except (ConnectionError, OSError) as e:
+            self._drop_peer(worker_id)
+            raise OwnerUnavailable(f"worker {worker_id} 不可達: {e}") from e
+        finally:
+            self._calls.pop(call_id, None)
+
+    async def _connect(self, worker_id: str) -> asyncio.StreamWriter:
+        """返回到指定 worker 的連接，尚未連接時建立連接並開始讀取調用結果"""
+        writer = self._peers.get(worker_id)
+        if writer is not None:
+            return writer
+        async with self._connect_lock:
+            writer = self._peers.get(worker_id)
+            if writer is not None:
+                return writer
+            try:
+                reader, writer = await asyncio.open_unix_connection(self._socket_path(worker_id))
+            except OSError as e:
+                self._unreachable[worker_id] = time.monotonic()
+                raise OwnerUnavailable(f"worker {worker_id} 不可達: {e}") from e
+            self._peers[worker_id] = writer
+            self._unreachable.pop(worker_id, None)
+            self._readers[worker_id] = asyncio.create_task(self._read_replies(worker_id, reader, writer))
+            return writer
+
+    @staticmethod
+    def _encode(envelope: Dict[str, Any]) -> bytes:
+        payload = json.dumps(envelope, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return _FRAME_HEADER.pack(len(payload)) + payload
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> Dict[str, Any]:
+        (length,) = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+        return json.loads(await reader.readexactly(length))
+
+    async def _refresh_peers(self, force: bool = False):
+        """掃描共享目錄，連接新出現的 worker，移除 socket 文件已消失的 worker"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.peer_refresh_interval:
+            return
+
+        async with self._refresh_lock:
+            if not force and now - self._last_refresh < self.peer_refresh_interval:
+                return
+            self._last_refresh = now
+
+            try:
+                found = {entry.name[:-len(".sock")] for entry in os.scandir(self.socket_dir)
+                         if entry.name.endswith(".sock")}
+            except FileNotFoundError:
+                return
+
+            for worker_id in self.members:
+                if worker_id == self.worker_id or worker_id in self._peers or worker_id not in found:
+                    continue
+                if now - self._unreachable.get(worker_id, -self.retry_interval) < self.retry_interval:
+                    continue
+                try:
+                    await self._connect(worker_id)
+                except OwnerUnavailable:
+                    # 殘留的 socket 文件（worker 已退出），稍後重試
+                    pass
+
+            for worker_id in list(self._peers):
+                if worker_id not in found:
+                    self._drop_peer(worker_id)
+
+    def _drop_peer(self, worker_id: str):
+        """移除 worker 的連接，等待其結果的調用以 OwnerUnavailable 結束"""
+        writer = self._peers.pop(worker_id, None)
+        if writer:
+            writer.close()
+        self._unreachable[worker_id] = time.monotonic()
+        for peer, future in list(self._calls.values()):
+            if peer == worker_id and not future.done():
+                future.set_exception(OwnerUnavailable(f"worker {worker_id} 連接已斷開"))
+
+    async def _read_replies(self, worker_id: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """讀取發往 worker 的調用的結果；連接斷開時移除該 worker"""
+        try:
+            while True:
+                envelope = await self._read_frame(reader)
+                entry = self._calls.get(envelope.get("r"))
+                if entry is None or entry[1].done():
+                    continue
+                if "x" in envelope:
+                    error = ValueError if envelope["x"] == "ValueError" else RuntimeError
+                    entry[1].set_exception(error(envelope["d"]))
+                else:
+                    entry[1].set_result(envelope.get("v"))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._readers.pop(worker_id, None)
+            if self._peers.get(worker_id) is writer:
+                self._drop_peer(worker_id)
+
+    async def _handle_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """接收其他 worker 轉發的事件和調用"""
+        self._inbound.add(writer)
+        try:
+            while True:
+                envelope = await self._read_frame(reader)
+                if "m" in envelope:
+                    # 調用可能等待 I/O，不阻塞同一連接上的後續幀
+                    task = asyncio.create_task(self._answer(envelope, writer))
+                    self._serving.add(task)
+                    task.add_done_callback(self._serving.discard)
+                    continue
+                if envelope.get("f"):
+                    # 其他 worker 轉發的未編號幀：本 worker 是歸屬 worker，編號後扇出
+                    await self.publish(envelope["s"], self._stamp(envelope["s"], envelope["e"]))
+                    continue
+                if envelope.get("o") == self.worker_id:
+                    continue
+                await self._dispatch(envelope["s"], envelope["e"])
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._inbound.discard(writer)
+            writer.close()
+
+    async def _answer(self, envelope: Dict[str, Any], writer: asyncio.StreamWriter):
+        """執行轉發來的調用，把結果或錯誤寫回調用方；ValueError 原樣傳回，其他錯誤傳回 RuntimeError"""
+        reply: Dict[str, Any] = {"r": envelope["r"]}
+        try:
+            reply["v"] = await self._serve(envelope["m"], envelope.get("a", []), envelope.get("k", {}))
+        except ValueError as e:
+            reply.update(x="ValueError", d=str(e))
+        except Exception as e:
+            logger.error(f"轉發調用失敗 {envelope['m']}: {e}")
+            reply.update(x="RuntimeError", d=str(e))
+        try:
+            writer.write(self._encode(reply))
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+
+
+def _owner_score(worker_id: str, session_id: str) -> bytes:
+    return hashlib.blake2b(f"{worker_id}/{session_id}".encode("utf-8"), digest_size=8).digest()
+
+
+def create_session_broker() -> SessionBroker:
+    """
+    根據環境變量創建代理
+    SESSION_BROKER=local|unix，SESSION_BROKER_DIR 指定 unix socket 目錄，
+    SESSION_WORKERS 為參與路由的 worker 數（與 uvicorn 的 worker 數相同）
+    """
+    kind = os.environ.get("SESSION_BROKER", "local").lower()
+    if kind == "unix":
+        socket_dir = os.environ.get(
+            "SESSION_BROKER_DIR",
+            os.path.join(tempfile.gettempdir(), "claudeditor-session-broker")
+        )
+        return UnixSocketSessionBroker(socket_dir, workers=int(os.environ.get("SESSION_WORKERS", "1")))
+    if kind != "local":
+        logger.warning(f"未知的會話代理類型 {kind}，使用本地代理")
+    return LocalSessionBroker()
@@ -0,0 +1,120 @@
+"""
+高頻會話事件合併
+任務進度（progress）和輸入/在線狀態（typing / presence）更新按會話、按類型開窗口，
+窗口內同一個 key 只保留最新狀態，窗口結束時一次性發送，並壓縮成一條帶持續時間的回放事件
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Any, Callable, Awaitable, Hashable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CoalescedBurst:
+    """一個窗口內合併後的事件"""
+    session_id: str
+    kind: str
+    updates: List[Dict[str, Any]]  # 每個 key 的最新幀
+    counts: List[int]              # 與 updates 對應：每個 key 在窗口內收到的原始事件數
+    count: int                     # 窗口內收到的原始事件總數
+    started_at: float
+    ended_at: float
+
+    @property
+    def duration(self) -> float:
+        return max(self.ended_at - self.started_at, 0.0)
+
+
+class _Window:
+    __slots__ = ("latest", "counts", "count", "started_at", "ended_at")
+
+    def __init__(self, now: float):
+        self.latest: Dict[Hashable, Dict[str, Any]] = {}
+        self.counts: Dict[Hashable, int] = {}
+        self.count = 0
+        self.started_at = now
+        self.ended_at = now
+
+
+FlushHandler = Callable[[CoalescedBurst], Awaitable[None]]
+
+
+class EventCoalescer:
+    """
+    事件合併器
+    windows: 事件類型 -> 窗口長度（秒），未配置的類型不合併
+    """
+
+    def __init__(self, windows: Dict[str, float], flush: FlushHandler):
+        self.windows = {kind: seconds for kind, seconds in windows.items() if seconds > 0}
+        self._flush = flush
+        self._pending: Dict[Tuple[str, str], _Window] = {}
+        self._handles: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def handles(self, kind: str) -> bool:
+        return kind in self.windows
+
+    def submit(self, session_id: str, kind: str, key: Hashable, frame: Dict[str, Any]):
+        """提交一個事件；窗口內同 key 的舊狀態被覆蓋"""
+        now = time.time()
+        slot = (session_id, kind)
+        window = self._pending.get(slot)
+        if window is None:
+            window = self._pending[slot] = _Window(now)
+            self._handles[slot] = asyncio.get_running_loop().call_later(
+                self.windows[kind], self._fire, slot
+            )
+        window.latest.pop(key, None)
+        window.latest[key] = frame
+        window.counts[key] = window.counts.get(key, 0) + 1
+        window.count += 1
+        window.ended_at = now
+
+    def _fire(self, slot: Tuple[str, str]):
+        self._handles.pop(slot, None)
+        window = self._pending.pop(slot, None)
+        if window is None:
+            return
+        task = asyncio.ensure_future(self._run_flush(slot, window))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_flush(self, slot: Tuple[str, str], window: _Window):
+        session_id, kind = slot
+        try:
+            await self._flush(CoalescedBurst(
+                session_id=session_id,
+                kind=kind,
+                updates=list(window.latest.values()),
+                counts=[window.counts[key] for key in window.latest],
+                count=window.count,
+                started_at=window.started_at,
+                ended_at=window.ended_at
+            ))
+        except Exception as e:
+            logger.error(f"合併事件發送失敗 {session_id}/{kind}: {e}")
+
+    async def flush_all(self):
+        """立即發送所有未結束的窗口（關閉時調用）"""
+        for slot, handle in list(self._handles.items()):
+            handle.cancel()
+            self._fire(slot)
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+
+def coalesce_windows_from_env() -> Dict[str, float]:
+    """
+    從環境變量讀取窗口長度（毫秒，0 表示不合併）
+    SESSION_COALESCE_PROGRESS_MS / SESSION_COALESCE_PRESENCE_MS
+    """
+    return {
+        "progress": float(os.environ.get("SESSION_COALESCE_PROGRESS_MS", "250")) / 1000,
+        "presence": float(os.environ.get("SESSION_COALESCE_PRESENCE_MS", "500")) / 1000,
+    }
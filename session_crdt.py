@@ -0,0 +1,520 @@
+"""
+會話協作文檔 - 服務端 RGA 序列 CRDT
+每個字符有唯一 ID (client, clock)，clock 是 Lamport 時鐘；插入操作以左側字符 ID 為錨點，
+併發插入按 (clock, client) 從大到小排列，所有副本得到相同順序。
+同一次插入的連續字符合併為一個段（run），段按塊（block）組織，定位和拆分都只掃描一個塊；
+刪除只打墓碑標記並釋放內容，定期壓縮時合併相鄰段並清除已過寬限期的墓碑，再寫入快照
+"""
+
+import os
+import re
+import json
+import zlib
+import time
+import bisect
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DOC_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+ItemId = Tuple[str, int]
+
+
+class UnknownOriginError(KeyError):
+    """操作引用的錨點字符不存在（未同步或已被壓縮清除），客戶端需要重新同步"""
+
+
+class _Item:
+    """一段連續字符：ID 為 (client, clock) ... (client, clock + length - 1)"""
+    __slots__ = ("client", "clock", "length", "content", "deleted", "block")
+
+    def __init__(self, client: str, clock: int, content: Optional[str], length: int,
+                 deleted: Optional[int] = None):
+        self.client = client
+        self.clock = clock
+        self.length = length
+        self.content = content   # 刪除後為 None
+        self.deleted = deleted   # 刪除時的壓縮紀元，None 表示未刪除
+        self.block = None
+
+    def newer_than(self, clock: int, client: str) -> bool:
+        return (self.clock, self.client) > (clock, client)
+
+
+class _Block:
+    __slots__ = ("items", "visible")
+
+    def __init__(self, items: List[_Item] = None):
+        self.items = items or []
+        self.visible = 0
+        for item in self.items:
+            item.block = self
+            if item.deleted is None:
+                self.visible += item.length
+
+
+class CRDTDocument:
+    """
+    RGA 文本文檔
+    - apply(): 應用客戶端操作，返回帶可見位置的增量，用於廣播
+    - compact(): 合併相鄰段、清除過期墓碑
+    - snapshot() / from_snapshot(): 持久化
+    """
+
+    BLOCK_SIZE = 128
+
+    def __init__(self, doc_id: str):
+        self.doc_id = doc_id
+        self.clock = 1       # 下一個可用的 Lamport 時鐘
+        self.version = 0     # 已應用的操作數
+        self.epoch = 0       # 壓縮紀元
+        self.length = 0      # 可見字符數
+        self._blocks: List[_Block] = [_Block()]
+        # client -> (段起始 clock 列表, 段列表)，按 clock 排序
+        self._index: Dict[str, Tuple[List[int], List[_Item]]] = {}
+
+    # ---- 索引和定位 ----
+
+    def _register(self, item: _Item):
+        starts, items = self._index.setdefault(item.client, ([], []))
+        position = bisect.bisect_left(starts, item.clock)
+        starts.insert(position, item.clock)
+        items.insert(position, item)
+
+    def _find(self, client: str, clock: int) -> Optional[_Item]:
+        entry = self._index.get(client)
+        if entry is None:
+            return None
+        starts, items = entry
+        position = bisect.bisect_right(starts, clock) - 1
+        if position < 0:
+            return None
+        item = items[position]
+        return item if clock < item.clock + item.length else None
+
+    def _locate(self, item: _Item) -> Tuple[int, int]:
+        block_index = self._blocks.index(item.block)
+        return block_index, item.block.items.index(item)
+
+    def _visible_index(self, item: _Item) -> int:
+        block_index, item_index = self._locate(item)
+        index = sum(block.visible for block in self._blocks[:block_index])
+        for other in self._blocks[block_index].items[:item_index]:
+            if other.deleted is None:
+                index += other.length
+        return index
+
+    def _split(self, item: _Item, offset: int) -> _Item:
+        """在 offset 處拆分段，返回右半段"""
+        right = _Item(item.client, item.clock + offset,
+                      item.content[offset:] if item.content is not None else None,
+                      item.length - offset, item.deleted)
+        if item.content is not None:
+            item.content = item.content[:offset]
+        item.length = offset
+
+        block = item.block
+        right.block = block
+        block.items.insert(block.items.index(item) + 1, right)
+        self._register(right)
+        self._rebalance(block)
+        return right
+
+    def _insert_item(self, block_index: int, item_index: int, item: _Item):
+        block = self._blocks[block_index]
+        block.items.insert(item_index, item)
+        item.block = block
+        if item.deleted is None:
+            block.visible += item.length
+            self.length += item.length
+        self._register(item)
+        self._rebalance(block)
+
+    def _rebalance(self, block: _Block):
+        if len(block.items) <= 2 * self.BLOCK_SIZE:
+            return
+        block_index = self._blocks.index(block)
+        tail = _Block(block.items[self.BLOCK_SIZE:])
+        del block.items[self.BLOCK_SIZE:]
+        block.visible -= tail.visible
+        self._blocks.insert(block_index + 1, tail)
+
+    def _next_item(self, item: _Item) -> Optional[_Item]:
+        """文檔順序中緊跟在 item 之後的段（包括墓碑）"""
+        block_index, item_index = self._locate(item)
+        items = self._blocks[block_index].items
+        if item_index + 1 < len(items):
+            return items[item_index + 1]
+        for block in self._blocks[block_index + 1:]:
+            if block.items:
+                return block.items[0]
+        return None
+
+    def _extendable(self, anchor: _Item, clock: int, length: int) -> bool:
+        """
+        新文本能否直接接在同一客戶端的段末尾：ID 範圍未被佔用，且錨點之後沒有更新的段
+        （此時 RGA 也會把它放在錨點正後方，原地擴展與逐字符插入結果相同）
+        """
+        starts, _ = self._index[anchor.client]
+        following = bisect.bisect_right(starts, anchor.clock)
+        if following < len(starts) and starts[following] < clock + length:
+            return False
+        after = self._next_item(anchor)
+        return after is None or not after.newer_than(clock, anchor.client)
+
+    def _item_at(self, index: int) -> Tuple[_Item, int]:
+        """可見位置 index 處的段和段內偏移"""
+        for block in self._blocks:
+            if index >= block.visible:
+                index -= block.visible
+                continue
+            for item in block.items:
+                if item.deleted is not None:
+                    continue
+                if index < item.length:
+                    return item, index
+                index -= item.length
+        raise IndexError(f"位置超出文檔長度: {index}")
+
+    # ---- 核心操作 ----
+
+    def _integrate(self, client: str, clock: int, origin: Optional[ItemId], text: str) -> Optional[int]:
+        """
+        插入一段文本（RGA）：從錨點之後開始，跳過所有比新段更新的段
+        返回插入後的可見位置；ID 已存在（重複操作）時返回 None
+        """
+        if self._find(client, clock) is not None:
+            return None
+
+        if origin is None:
+            block_index, item_index = 0, 0
+        else:
+            anchor = self._find(*origin)
+            if anchor is None:
+                raise UnknownOriginError(origin)
+            offset = origin[1] - anchor.clock
+            if (offset == anchor.length - 1 and anchor.client == client and anchor.deleted is None
+                    and clock == anchor.clock + anchor.length and self._extendable(anchor, clock, len(text))):
+                # 連續輸入：擴展原段，不新建段
+                anchor.content += text
+                anchor.length += len(text)
+                anchor.block.visible += len(text)
+                self.length += len(text)
+                self.clock = max(self.clock, clock + len(text))
+                return self._visible_index(anchor) + offset + 1
+            if offset < anchor.length - 1:
+                self._split(anchor, offset + 1)
+            block_index, item_index = self._locate(anchor)
+            item_index += 1
+
+        while block_index < len(self._blocks):
+            items = self._blocks[block_index].items
+            while item_index < len(items) and items[item_index].newer_than(clock, client):
+                item_index += 1
+            if item_index < len(items):
+                break
+            if block_index == len(self._blocks) - 1:
+                break
+            block_index += 1
+            item_index = 0
+
+        item = _Item(client, clock, text, len(text))
+        self._insert_item(block_index, item_index, item)
+        self.clock = max(self.clock, clock + len(text))
+        return self._visible_index(item)
+
+    def _delete(self, client: str, clock: int, length: int) -> List[Tuple[int, int]]:
+        """刪除 ID 範圍內的字符，返回依次刪除的 (可見位置, 字符數)"""
+        entry = self._index.get(client)
+        if entry is None:
+            return []
+        starts, items = entry
+        removed = []
+        position, end = clock, clock + length
+        while position < end:
+            found = bisect.bisect_right(starts, position) - 1
+            if found < 0 or starts[found] + items[found].length <= position:
+                found += 1
+                if found >= len(starts) or starts[found] >= end:
+                    break
+                position = starts[found]
+            item = items[found]
+            if item.clock < position:
+                item = self._split(item, position - item.clock)
+            if item.clock + item.length > end:
+                self._split(item, end - item.clock)
+            position = item.clock + item.length
+            if item.deleted is not None:
+                continue
+            removed.append((self._visible_index(item), item.length))
+            item.deleted = self.epoch
+            item.content = None
+            item.block.visible -= item.length
+            self.length -= item.length
+        return removed
+
+    def _visible_spans(self, index: int, length: int) -> List[Tuple[str, int, int]]:
+        """把可見範圍轉換成 (client, clock, 字符數) 的 ID 範圍"""
+        spans = []
+        if length <= 0 or index >= self.length:
+            return spans
+        item, offset = self._item_at(index)
+        block_index, item_index = self._locate(item)
+        remaining = length
+        while remaining > 0 and block_index < len(self._blocks):
+            items = self._blocks[block_index].items
+            while remaining > 0 and item_index < len(items):
+                current = items[item_index]
+                item_index += 1
+                if current.deleted is not None:
+                    continue
+                count = min(current.length - offset, remaining)
+                spans.append((current.client, current.clock + offset, count))
+                remaining -= count
+                offset = 0
+            block_index += 1
+            item_index = 0
+        return spans
+
+    def apply(self, client: str, ops: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        應用一批操作，返回 (需要廣播的增量, 被拒絕的操作數)；每個增量帶解析後的可見位置 index
+        操作格式:
+          {"op": "insert", "index": 12, "text": "abc"}               按位置插入（服務端分配 ID）
+          {"op": "delete", "index": 12, "length": 3}                  按位置刪除
+          {"op": "insert", "id": [c, clock], "after": [c, clock] | null, "text": "abc"}  按 ID 插入
+          {"op": "delete", "id": [c, clock], "length": 3}             按 ID 刪除
+        錨點未知或格式錯誤的操作被跳過並計入拒絕數，客戶端應重新同步
+        """
+        deltas = []
+        rejected = 0
+        for op in ops:
+            try:
+                applied = self._apply_op(client, op)
+            except (UnknownOriginError, ValueError, TypeError, IndexError, AttributeError):
+                rejected += 1
+                continue
+            if applied:
+                deltas.extend(applied)
+                self.version += 1
+        return deltas, rejected
+
+    def _apply_op(self, client: str, op: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        kind = op.get("op")
+        if kind == "insert":
+            text = str(op.get("text", ""))
+            if not text:
+                return None
+            if "id" in op:
+                op_client, clock = str(op["id"][0]), int(op["id"][1])
+                after = op.get("after")
+                origin = (str(after[0]), int(after[1])) if after else None
+            else:
+                index = max(0, min(int(op.get("index", self.length)), self.length))
+                op_client, clock = client, self.clock
+                if index > 0:
+                    anchor, offset = self._item_at(index - 1)
+                    origin = (anchor.client, anchor.clock + offset)
+                    # 在自己的段末尾繼續輸入時沿用段內連續的 ID，便於合併
+                    if (anchor.client == client and offset == anchor.length - 1
+                            and self._extendable(anchor, anchor.clock + anchor.length, len(text))):
+                        clock = anchor.clock + anchor.length
+                else:
+                    origin = None
+            position = self._integrate(op_client, clock, origin, text)
+            if position is None:
+                return None
+            return [{"op": "insert", "id": [op_client, clock], "after": list(origin) if origin else None,
+                     "text": text, "index": position}]
+
+        if kind == "delete":
+            if "id" in op:
+                spans = [(str(op["id"][0]), int(op["id"][1]), int(op.get("length", 1)))]
+            else:
+                spans = self._visible_spans(max(int(op.get("index", 0)), 0), int(op.get("length", 1)))
+            return [
+                {"op": "delete", "id": [span_client, clock], "length": count, "index": position}
+                for span_client, clock, length in spans
+                for position, count in self._delete(span_client, clock, length)
+            ]
+        return None
+
+    # ---- 讀取、壓縮和快照 ----
+
+    def text(self) -> str:
+        return "".join(item.content for block in self._blocks for item in block.items
+                       if item.deleted is None)
+
+    def visible_runs(self) -> List[List[Any]]:
+        """可見字符的 ID 段 [client, clock, length]，客戶端據此把位置映射為 ID"""
+        runs = []
+        for block in self._blocks:
+            for item in block.items:
+                if item.deleted is not None:
+                    continue
+                last = runs[-1] if runs else None
+                if last and last[0] == item.client and last[1] + last[2] == item.clock:
+                    last[2] += item.length
+                else:
+                    runs.append([item.client, item.clock, item.length])
+        return runs
+
+    def stats(self) -> Dict[str, Any]:
+        items = sum(len(block.items) for block in self._blocks)
+        tombstones = sum(1 for block in self._blocks for item in block.items if item.deleted is not None)
+        return {"length": self.length, "items": items, "tombstones": tombstones,
+                "blocks": len(self._blocks), "version": self.version, "epoch": self.epoch}
+
+    def compact(self, grace_epochs: int = 1) -> Dict[str, int]:
+        """
+        壓縮：清除刪除時間早於 grace_epochs 個紀元的墓碑，合併 ID 連續的相鄰段
+        之後引用被清除字符的操作會被拒絕，客戶端需重新同步
+        """
+        horizon = self.epoch - grace_epochs
+        merged: List[_Item] = []
+        dropped = 0
+        for block in self._blocks:
+            for item in block.items:
+                if item.deleted is not None and item.deleted < horizon:
+                    dropped += 1
+                    continue
+                last = merged[-1] if merged else None
+                if (last is not None and last.client == item.client
+                        and last.clock + last.length == item.clock
+                        and (last.deleted is None) == (item.deleted is None)):
+                    if item.deleted is None:
+                        last.content += item.content
+                    else:
+                        last.deleted = max(last.deleted, item.deleted)
+                    last.length += item.length
+                    continue
+                merged.append(item)
+
+        before = sum(len(block.items) for block in self._blocks)
+        self._rebuild(merged)
+        self.epoch += 1
+        return {"items_before": before, "items_after": len(merged), "tombstones_dropped": dropped}
+
+    def _rebuild(self, items: List[_Item]):
+        size = self.BLOCK_SIZE
+        self._blocks = [_Block(items[i:i + size]) for i in range(0, len(items), size)] or [_Block()]
+        self._index = {}
+        for item in sorted(items, key=lambda item: item.clock):
+            starts, entries = self._index.setdefault(item.client, ([], []))
+            starts.append(item.clock)
+            entries.append(item)
+        self.length = sum(block.visible for block in self._blocks)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "doc_id": self.doc_id,
+            "clock": self.clock,
+            "version": self.version,
+            "epoch": self.epoch,
+            # 未刪除: [client, clock, text]；墓碑: [client, clock, length, epoch]
+            "items": [
+                [item.client, item.clock, item.content] if item.deleted is None
+                else [item.client, item.clock, item.length, item.deleted]
+                for block in self._blocks for item in block.items
+            ]
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any]) -> "CRDTDocument":
+        document = cls(data["doc_id"])
+        document.clock = data["clock"]
+        document.version = data["version"]
+        document.epoch = data["epoch"]
+        items = []
+        for record in data["items"]:
+            if len(record) == 3:
+                items.append(_Item(record[0], record[1], record[2], len(record[2])))
+            else:
+                items.append(_Item(record[0], record[1], None, record[2], record[3]))
+        document._rebuild(items)
+        return document
+
+
+class SessionDocumentStore:
+    """
+    會話文檔存儲
+    文檔按 (session_id, doc_id) 加載到內存，有修改的文檔定期壓縮並寫入會話目錄下的快照
+    """
+
+    def __init__(self, retention, snapshot_interval: float = 30):
+        self.retention = retention
+        self.snapshot_interval = snapshot_interval
+        self._documents: Dict[Tuple[str, str], CRDTDocument] = {}
+        self._dirty: set = set()
+
+    @staticmethod
+    def _blob_name(doc_id: str) -> str:
+        return f"crdt-{doc_id}.json.z"
+
+    def get(self, session_id: str, doc_id: str) -> CRDTDocument:
+        if not _DOC_ID_RE.match(doc_id):
+            raise ValueError(f"無效的文檔 ID: {doc_id}")
+        key = (session_id, doc_id)
+        document = self._documents.get(key)
+        if document is None:
+            data = self.retention.read_blob(session_id, self._blob_name(doc_id))
+            if data:
+                document = CRDTDocument.from_snapshot(json.loads(zlib.decompress(data)))
+            else:
+                document = CRDTDocument(doc_id)
+            self._documents[key] = document
+        return document
+
+    def apply(self, session_id: str, doc_id: str, client: str,
+              ops: List[Dict[str, Any]]) -> Tuple[CRDTDocument, List[Dict[str, Any]], int]:
+        document = self.get(session_id, doc_id)
+        deltas, rejected = document.apply(client, ops)
+        if deltas:
+            self._dirty.add((session_id, doc_id))
+        return document, deltas, rejected
+
+    def snapshot(self, session_id: str, doc_id: str, compact: bool = True):
+        """壓縮並寫入快照"""
+        document = self._documents.get((session_id, doc_id))
+        if document is None:
+            return
+        if compact:
+            document.compact()
+        data = json.dumps(document.snapshot(), ensure_ascii=False, separators=(",", ":"))
+        self.retention.write_blob(session_id, self._blob_name(doc_id), zlib.compress(data.encode("utf-8")))
+        self._dirty.discard((session_id, doc_id))
+
+    def flush(self):
+        for session_id, doc_id in list(self._dirty):
+            try:
+                self.snapshot(session_id, doc_id)
+            except Exception as e:
+                logger.error(f"文檔快照寫入失敗 {session_id}/{doc_id}: {e}")
+
+    def unload(self, session_id: str):
+        """寫入會話全部文檔的快照並釋放內存"""
+        for key in [key for key in self._documents if key[0] == session_id]:
+            if key in self._dirty:
+                self.snapshot(*key)
+            del self._documents[key]
+
+    async def run(self):
+        """定期壓縮並快照有修改的文檔"""
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            started = time.perf_counter()
+            count = len(self._dirty)
+            self.flush()
+            if count:
+                logger.debug(f"文檔快照 {count} 個，耗時 {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+def create_document_store(retention) -> SessionDocumentStore:
+    """根據環境變量創建文檔存儲：SESSION_DOC_SNAPSHOT_INTERVAL（秒）"""
+    return SessionDocumentStore(
+        retention,
+        snapshot_interval=float(os.environ.get("SESSION_DOC_SNAPSHOT_INTERVAL", "30"))
+    )
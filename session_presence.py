@@ -0,0 +1,126 @@
+"""
+會話在線狀態
+在線狀態由 WebSocket 連接和心跳共同決定：用戶至少有一個打開的連接，且最近一次心跳未超過 TTL。
+每個會話的在線用戶按最近活動時間排序保存，加入、離開、查詢都是 O(1)，
+過期掃描只訪問已過期的用戶，分頁列出在線用戶只訪問返回的部分
+"""
+
+import time
+from datetime import datetime
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Any, Tuple
+
+
+class _Presence:
+    __slots__ = ("user_name", "since", "last_seen")
+
+    def __init__(self, user_name: str, now: float):
+        self.user_name = user_name
+        self.since = now
+        self.last_seen = now
+
+
+class _SessionPresence:
+    __slots__ = ("online", "sockets")
+
+    def __init__(self):
+        # user_id -> 在線狀態，按最近活動時間排序（最舊的在前）
+        self.online: "OrderedDict[str, _Presence]" = OrderedDict()
+        # user_id -> 打開的連接數（心跳過期後保留，用於再次心跳時恢復在線）
+        self.sockets: Dict[str, int] = {}
+
+
+class PresenceTracker:
+    """
+    在線狀態跟蹤
+    - ttl: 心跳超時（秒），超過後即使連接未關閉也視為離線
+    - connect / disconnect / heartbeat 返回用戶的在線狀態是否發生變化
+    """
+
+    def __init__(self, ttl: float = 90.0):
+        self.ttl = ttl
+        self._sessions: Dict[str, _SessionPresence] = {}
+
+    def connect(self, session_id: str, user_id: str, user_name: str) -> bool:
+        state = self._sessions.setdefault(session_id, _SessionPresence())
+        state.sockets[user_id] = state.sockets.get(user_id, 0) + 1
+        return self._mark_seen(state, user_id, user_name)
+
+    def disconnect(self, session_id: str, user_id: str) -> bool:
+        state = self._sessions.get(session_id)
+        if state is None or user_id not in state.sockets:
+            return False
+        state.sockets[user_id] -= 1
+        if state.sockets[user_id] > 0:
+            return False
+        del state.sockets[user_id]
+        went_offline = state.online.pop(user_id, None) is not None
+        if not state.sockets:
+            del self._sessions[session_id]
+        return went_offline
+
+    def heartbeat(self, session_id: str, user_id: str, user_name: str) -> bool:
+        """有打開連接的用戶刷新心跳；過期後再次心跳會恢復在線"""
+        state = self._sessions.get(session_id)
+        if state is None or user_id not in state.sockets:
+            return False
+        return self._mark_seen(state, user_id, user_name)
+
+    def _mark_seen(self, state: _SessionPresence, user_id: str, user_name: str) -> bool:
+        now = time.monotonic()
+        presence = state.online.get(user_id)
+        if presence is not None:
+            presence.last_seen = now
+            state.online.move_to_end(user_id)
+            return False
+        state.online[user_id] = _Presence(user_name, now)
+        return True
+
+    def is_online(self, session_id: str, user_id: str) -> bool:
+        state = self._sessions.get(session_id)
+        return state is not None and user_id in state.online
+
+    def online_count(self, session_id: str) -> int:
+        state = self._sessions.get(session_id)
+        return len(state.online) if state else 0
+
+    def online(self, session_id: str, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """在線用戶，最近活動的在前"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return []
+        now = time.monotonic()
+        wall = time.time()
+        return [
+            {
+                "user_id": user_id,
+                "user_name": presence.user_name,
+                "online_since": datetime.fromtimestamp(wall - (now - presence.since)).isoformat(),
+                "last_seen": datetime.fromtimestamp(wall - (now - presence.last_seen)).isoformat(),
+            }
+            for user_id, presence in islice(reversed(state.online.items()), offset, offset + limit)
+        ]
+
+    def expire(self) -> List[Tuple[str, str]]:
+        """移除心跳超時的用戶，返回 [(session_id, user_id)]"""
+        deadline = time.monotonic() - self.ttl
+        expired = []
+        for session_id, state in self._sessions.items():
+            while state.online:
+                user_id, presence = next(iter(state.online.items()))
+                if presence.last_seen >= deadline:
+                    break
+                del state.online[user_id]
+                expired.append((session_id, user_id))
+        return expired
+
+
+def summarize_participants(info: Dict[str, Any], limit: int, online_count: int) -> Dict[str, Any]:
+    """會話信息的響應形式：參與者列表最多保留 limit 個，附帶總數和在線數"""
+    participants = info.get("participants") or []
+    summary = dict(info)
+    summary["participants"] = participants[:limit]
+    summary["participant_count"] = len(participants)
+    summary["online_count"] = online_count
+    return summary
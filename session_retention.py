@@ -0,0 +1,345 @@
+"""
+會話保留管理 - 控制長時間會話的內存佔用
+每個會話只在內存中保留最近的熱數據，較舊的消息和回放事件寫入壓縮的磁盤分段，
+閒置超過 TTL 的會話整體卸載到磁盤，訪問時再透明加載
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import bisect
+import shutil
+import tempfile
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+class SpillableLog:
+    """
+    可溢出到磁盤的追加日誌
+    行為類似列表（len / 索引 / 切片 / 迭代），舊數據存放在 gzip JSONL 分段中
+    """
+
+    def __init__(self, directory: str, kind: str,
+                 encode: Callable[[Any], Dict[str, Any]],
+                 decode: Callable[[Dict[str, Any]], Any],
+                 hot_limit: int = 500,
+                 estimate: Callable[[Any], int] = None,
+                 state: Dict[str, Any] = None):
+        self.directory = directory
+        self.kind = kind
+        self.encode = encode
+        self.decode = decode
+        self.hot_limit = hot_limit
+        self.estimate = estimate or (lambda item: 512)
+
+        self.hot: List[Any] = []
+        self.hot_bytes = 0
+        # 分段索引: (起始序號, 條數, 文件名)
+        self.segments: List[Tuple[int, int, str]] = [tuple(s) for s in (state or {}).get("segments", [])]
+        self._segment_starts = [s[0] for s in self.segments]
+        self.spilled_count = sum(s[1] for s in self.segments)
+        self._segment_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self.spilled_count + len(self.hot)
+
+    def append(self, item: Any):
+        self.hot.append(item)
+        self.hot_bytes += self.estimate(item)
+        # 攢夠一批再溢出，避免每條消息都寫盤
+        if len(self.hot) >= self.hot_limit + max(self.hot_limit // 2, 50):
+            self.spill(self.hot_limit)
+
+    def spill(self, keep: int = 0):
+        """將熱數據中除最近 keep 條以外的部分寫入新分段"""
+        count = len(self.hot) - keep
+        if count <= 0:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        start = self.spilled_count
+        name = f"{self.kind}-{start:010d}.jsonl.gz"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            for item in self.hot[:count]:
+                f.write(json.dumps(self.encode(item), ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+        os.replace(tmp_path, path)
+
+        for item in self.hot[:count]:
+            self.hot_bytes -= self.estimate(item)
+        del self.hot[:count]
+
+        self.segments.append((start, count, name))
+        self._segment_starts.append(start)
+        self.spilled_count += count
+
+    def state(self) -> Dict[str, Any]:
+        """分段索引，寫入會話清單"""
+        return {"segments": [list(s) for s in self.segments]}
+
+    def _read_segment(self, name: str) -> List[Dict[str, Any]]:
+        records = self._segment_cache.get(name)
+        if records is not None:
+            self._segment_cache.move_to_end(name)
+            return records
+
+        with gzip.open(os.path.join(self.directory, name), "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        # 分頁和回放通常按順序讀取，保留最近兩個分段即可
+        self._segment_cache[name] = records
+        if len(self._segment_cache) > 2:
+            self._segment_cache.popitem(last=False)
+        return records
+
+    def _read_spilled(self, start: int, stop: int) -> List[Any]:
+        items = []
+        index = bisect.bisect_right(self._segment_starts, start) - 1
+        position = start
+        while position < stop and index < len(self.segments):
+            seg_start, seg_count, name = self.segments[index]
+            records = self._read_segment(name)
+            lo = position - seg_start
+            hi = min(stop, seg_start + seg_count) - seg_start
+            items.extend(self.decode(record) for record in records[lo:hi])
+            position = seg_start + hi
+            index += 1
+        return items
+
+    def __getitem__(self, key):
+        total = len(self)
+        if isinstance(key, slice):
+            start, stop, step = key.indices(total)
+            if step != 1:
+                return list(self)[key]
+            if start >= stop:
+                return []
+            items = []
+            if start < self.spilled_count:
+                items.extend(self._read_spilled(start, min(stop, self.spilled_count)))
+            if stop > self.spilled_count:
+                items.extend(self.hot[max(start - self.spilled_count, 0):stop - self.spilled_count])
+            return items
+
+        if key < 0:
+            key += total
+        if not 0 <= key < total:
+            raise IndexError("SpillableLog index out of range")
+        if key >= self.spilled_count:
+            return self.hot[key - self.spilled_count]
+        return self._read_spilled(key, key + 1)[0]
+
+    def __iter__(self) -> Iterator[Any]:
+        for _, _, name in list(self.segments):
+            for record in self._read_segment(name):
+                yield self.decode(record)
+        yield from list(self.hot)
+
+
+class SessionRetentionManager:
+    """
+    會話保留管理器
+    - hot_messages / hot_events: 每個會話在內存中保留的最近條數
+    - idle_ttl: 會話閒置多久後整體卸載（秒）
+    - max_memory_bytes: 所有會話熱數據的估算內存上限，超出時按最久未訪問順序卸載；
+      add_memory_source() 登記的常駐結構（如全文索引）不隨會話卸載釋放，只報告、不參與卸載判斷
+    """
+
+    def __init__(self, storage_dir: str, hot_messages: int = 500, hot_events: int = 1000,
+                 idle_ttl: float = 1800, max_memory_bytes: int = 512 * 1024 * 1024,
+                 sweep_interval: float = 30):
+        self.storage_dir = storage_dir
+        self.hot_messages = hot_messages
+        self.hot_events = hot_events
+        self.idle_ttl = idle_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.sweep_interval = sweep_interval
+
+        self._logs: Dict[str, Dict[str, SpillableLog]] = {}
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        # 已卸載會話的目錄: session_id -> (is_public, last_active)
+        self.catalog: Dict[str, Tuple[bool, str]] = {}
+        # 不隨會話卸載釋放的常駐結構，單獨報告
+        self._memory_sources: List[Callable[[], int]] = []
+        self._resident_warned = False
+
+    def session_dir(self, session_id: str) -> str:
+        return os.path.join(self.storage_dir, session_id)
+
+    def open_log(self, session_id: str, kind: str, encode, decode,
+                 estimate=None, state: Dict[str, Any] = None) -> SpillableLog:
+        """為會話創建（或從清單恢復）一個日誌"""
+        hot_limit = self.hot_messages if kind == "messages" else self.hot_events
+        log = SpillableLog(self.session_dir(session_id), kind, encode, decode,
+                           hot_limit=hot_limit, estimate=estimate, state=state)
+        self._logs.setdefault(session_id, {})[kind] = log
+        self.touch(session_id)
+        return log
+
+    def touch(self, session_id: str):
+        """記錄會話訪問時間"""
+        self._last_access[session_id] = time.monotonic()
+        self._last_access.move_to_end(session_id)
+
+    def add_memory_source(self, source: Callable[[], int]):
+        """登記一個常駐結構的內存估算函數（卸載會話無法釋放這部分內存，不計入 max_memory_bytes）"""
+        self._memory_sources.append(source)
+
+    def memory_usage(self) -> int:
+        """估算所有已加載會話熱數據佔用的內存"""
+        return sum(log.hot_bytes for logs in self._logs.values() for log in logs.values())
+
+    def resident_memory(self) -> int:
+        """估算常駐結構佔用的內存"""
+        return sum(source() for source in self._memory_sources)
+
+    def unload_candidates(self) -> List[str]:
+        """返回應卸載的會話：先是閒置超時的，再按最久未訪問補足到內存上限以內"""
+        now = time.monotonic()
+        candidates = [sid for sid, last in self._last_access.items() if now - last > self.idle_ttl]
+
+        resident = self.resident_memory()
+        if resident > self.max_memory_bytes and not self._resident_warned:
+            logger.warning(f"常駐結構佔用 {resident} bytes，已超過會話內存上限 {self.max_memory_bytes}；"
+                           f"卸載會話無法釋放這部分內存")
+        self._resident_warned = resident > self.max_memory_bytes
+
+        usage = self.memory_usage() - sum(self._session_bytes(sid) for sid in candidates)
+        if usage > self.max_memory_bytes:
+            for sid in self._last_access:
+                if usage <= self.max_memory_bytes:
+                    break
+                if sid in candidates:
+                    continue
+                candidates.append(sid)
+                usage -= self._session_bytes(sid)
+        return candidates
+
+    def _session_bytes(self, session_id: str) -> int:
+        return sum(log.hot_bytes for log in self._logs.get(session_id, {}).values())
+
+    def save_session(self, session_id: str, session_info: Dict[str, Any],
+                     extra: Dict[str, Any] = None, blobs: Dict[str, bytes] = None):
+        """
+        將會話全部數據寫入磁盤並從內存中釋放
+        extra 隨清單保存，blobs 保存為會話目錄下的二進制文件
+        """
+        logs = self._logs.pop(session_id, {})
+        self._last_access.pop(session_id, None)
+        for log in logs.values():
+            log.spill(0)
+
+        manifest = {
+            "session_info": session_info,
+            "logs": {kind: log.state() for kind, log in logs.items()},
+            "extra": extra or {},
+        }
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        for name, data in (blobs or {}).items():
+            self.write_blob(session_id, name, data)
+        tmp_path = os.path.join(directory, MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, MANIFEST_NAME))
+
+        self.catalog[session_id] = (session_info.get("is_public", False), session_info.get("last_active", ""))
+
+    def load_manifest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """讀取已卸載會話的清單"""
+        path = os.path.join(self.session_dir(session_id), MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def iter_log_records(self, session_id: str, kind: str,
+                         manifest: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """按順序讀取已卸載會話某個日誌的原始記錄（不加載會話、不解碼）"""
+        manifest = manifest if manifest is not None else self.load_manifest(session_id)
+        state = (manifest or {}).get("logs", {}).get(kind)
+        if not state:
+            return iter(())
+        return iter(SpillableLog(self.session_dir(session_id), kind, encode=None,
+                                 decode=lambda record: record, state=state))
+
+    def write_blob(self, session_id: str, name: str, data: bytes):
+        """原子寫入會話目錄下的二進制文件"""
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    def read_blob(self, session_id: str, name: str) -> bytes:
+        """讀取會話目錄下的二進制文件，不存在時返回空"""
+        path = os.path.join(self.session_dir(session_id), name)
+        if not os.path.exists(path):
+            return b""
+        with open(path, "rb") as f:
+            return f.read()
+
+    def mark_loaded(self, session_id: str):
+        self.catalog.pop(session_id, None)
+
+    def scan(self, include: Callable[[str], bool] = None):
+        """
+        啟動時掃描存儲目錄，重建已卸載會話目錄
+        include 過濾會話（多 worker 共用存儲目錄時只收錄本 worker 歸屬的會話）
+        """
+        if not os.path.isdir(self.storage_dir):
+            return
+        for entry in os.scandir(self.storage_dir):
+            if not entry.is_dir() or entry.name in self._logs:
+                continue
+            if include is not None and not include(entry.name):
+                continue
+            try:
+                manifest = self.load_manifest(entry.name)
+            except (OSError, ValueError) as e:
+                logger.warning(f"會話清單讀取失敗 {entry.name}: {e}")
+                continue
+            if manifest:
+                info = manifest["session_info"]
+                self.catalog[entry.name] = (info.get("is_public", False), info.get("last_active", ""))
+
+    def discard(self, session_id: str):
+        """刪除會話的全部磁盤數據"""
+        self._logs.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self.catalog.pop(session_id, None)
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+
+
+def estimate_object_size(content: str, metadata: Dict[str, Any] = None) -> int:
+    """粗略估算一條消息/事件在內存中的大小"""
+    return 400 + sys.getsizeof(content) + 96 * len(metadata or {})
+
+
+def create_retention_manager() -> SessionRetentionManager:
+    """
+    根據環境變量創建保留管理器
+    SESSION_STORAGE_DIR / SESSION_HOT_MESSAGES / SESSION_HOT_EVENTS /
+    SESSION_IDLE_TTL（秒）/ SESSION_MAX_MEMORY_MB
+    """
+    return SessionRetentionManager(
+        storage_dir=os.environ.get(
+            "SESSION_STORAGE_DIR",
+            os.path.join(tempfile.gettempdir(), "claudeditor-sessions")
+        ),
+        hot_messages=int(os.environ.get("SESSION_HOT_MESSAGES", "500")),
+        hot_events=int(os.environ.get("SESSION_HOT_EVENTS", "1000")),
+        idle_ttl=float(os.environ.get("SESSION_IDLE_TTL", "1800")),
+        max_memory_bytes=int(float(os.environ.get("SESSION_MAX_MEMORY_MB", "512")) * 1024 * 1024),
+    )
@@ -0,0 +1,232 @@
+"""
+會話消息全文檢索
+消息到達時增量建立倒排索引：字母文字（含重音和其他非 ASCII 字母）按單詞切分，中日韓文字按二元組（bigram）切分；
+索引按會話分片，每個分片的倒排列表是按消息序號遞增的緊湊數組，查詢時從最稀有的詞開始求交集，
+用 BM25 排序
+"""
+
+import re
+import math
+import unicodedata
+import time
+import heapq
+import bisect
+from array import array
+from collections import Counter
+from typing import Dict, List, Any, Set, Tuple
+
+# 中日韓文字（CJK 統一漢字、擴展 A、假名、韓文、兼容漢字）連續段，或其餘的 Unicode 單詞字符（\w 去掉 CJK）
+_CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK_CHARS}]+|[^\W{_CJK_CHARS}]+")
+_CJK_RE = re.compile(rf"[{_CJK_CHARS}]")
+
+_MAX_U16 = 65535
+# 內存估算：每個新詞的字典項和兩個數組對象的開銷、每條倒排記錄（序號 4 字節 + 詞頻 2 字節）
+_TERM_OVERHEAD = 240
+_POSTING_BYTES = 6
+
+
+def tokenize(text: str) -> List[str]:
+    """切分文本：NFKC 規範化後單詞小寫化（組合附加符號與預組字符一致），CJK 連續文字切成二元組（單字則保留單字）"""
+    tokens = []
+    for run in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class _SessionShard:
+    """單個會話的倒排索引分片"""
+    __slots__ = ("postings", "freqs", "lengths", "documents", "memory_bytes")
+
+    def __init__(self):
+        self.documents = 0
+        self.memory_bytes = 0
+        self.postings: Dict[str, array] = {}  # 詞 -> 消息序號（遞增）
+        self.freqs: Dict[str, array] = {}     # 詞 -> 詞頻，與 postings 對齊
+        self.lengths = array("H")             # 消息序號 -> 詞數
+
+
+class SessionSearchIndex:
+    """
+    會話消息倒排索引
+    - k1 / b: BM25 參數
+    - max_candidates: 單次查詢最多評分的匹配數，超出時只對最新的匹配評分
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_candidates: int = 10000):
+        self.k1 = k1
+        self.b = b
+        self.max_candidates = max_candidates
+
+        self._shards: Dict[str, _SessionShard] = {}
+        self._document_frequency: Counter = Counter()
+        self._token_sessions: Dict[str, Set[str]] = {}
+        self._total_documents = 0
+        self._total_length = 0
+        self._memory_bytes = 0
+
+    def indexed_count(self, session_id: str) -> int:
+        """會話已索引的消息數（即下一條待索引消息的序號）"""
+        shard = self._shards.get(session_id)
+        return len(shard.lengths) if shard else 0
+
+    def add(self, session_id: str, seq: int, text: str):
+        """索引一條消息；序號小於已索引數的消息會被忽略"""
+        shard = self._shards.get(session_id)
+        if shard is None:
+            shard = self._shards[session_id] = _SessionShard()
+        if seq < len(shard.lengths):
+            return
+        added = 2 * (seq + 1 - len(shard.lengths))
+        while len(shard.lengths) < seq:
+            shard.lengths.append(0)
+
+        tokens = tokenize(text)
+        shard.lengths.append(min(len(tokens), _MAX_U16))
+        shard.documents += 1
+        self._total_documents += 1
+        self._total_length += len(tokens)
+
+        for token, tf in Counter(tokens).items():
+            postings = shard.postings.get(token)
+            if postings is None:
+                postings = shard.postings[token] = array("I")
+                shard.freqs[token] = array("H")
+                self._token_sessions.setdefault(token, set()).add(session_id)
+                added += _TERM_OVERHEAD + len(token)
+            postings.append(seq)
+            shard.freqs[token].append(min(tf, _MAX_U16))
+            self._document_frequency[token] += 1
+            added += _POSTING_BYTES
+        shard.memory_bytes += added
+        self._memory_bytes += added
+
+    def remove_session(self, session_id: str):
+        """刪除會話的全部索引"""
+        shard = self._shards.pop(session_id, None)
+        if shard is None:
+            return
+        for token, postings in shard.postings.items():
+            self._document_frequency[token] -= len(postings)
+            if self._document_frequency[token] <= 0:
+                del self._document_frequency[token]
+            sessions = self._token_sessions.get(token)
+            if sessions:
+                sessions.discard(session_id)
+                if not sessions:
+                    del self._token_sessions[token]
+        self._total_documents -= shard.documents
+        self._total_length -= sum(shard.lengths)
+        self._memory_bytes -= shard.memory_bytes
+
+    def memory_bytes(self) -> int:
+        """索引佔用內存的估算值（已卸載會話的分片也常駐內存）"""
+        return self._memory_bytes
+
+    def search(self, query: str, session_id: str = None, limit: int = 20,
+               offset: int = 0) -> Dict[str, Any]:
+        """
+        檢索消息，所有查詢詞都必須出現（AND）
+        返回 {"hits": [(session_id, seq, score), ...], "total": 匹配數, "took_ms": 耗時}
+        """
+        started = time.perf_counter()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or any(term not in self._document_frequency for term in terms):
+            return {"hits": [], "total": 0, "took_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+        # 從最稀有的詞開始，候選集最小
+        terms.sort(key=lambda term: self._document_frequency[term])
+        if session_id is not None:
+            sessions = [session_id] if session_id in self._shards else []
+        else:
+            sessions = list(self._token_sessions.get(terms[0], ()))
+            for term in terms[1:]:
+                term_sessions = self._token_sessions.get(term, set())
+                sessions = [sid for sid in sessions if sid in term_sessions]
+
+        idf = {term: self._idf(term) for term in terms}
+        avg_length = self._total_length / self._total_documents if self._total_documents else 1.0
+
+        scored: List[Tuple[float, int, str]] = []
+        total = 0
+        budget = self.max_candidates
+        for sid in sessions:
+            if budget <= 0:
+                break
+            matches = self._intersect(self._shards[sid], terms, budget)
+            if not matches:
+                continue
+            total += len(matches)
+            budget -= len(matches)
+            scored.extend(self._score(self._shards[sid], sid, matches, terms, idf, avg_length))
+
+        top = heapq.nlargest(offset + limit, scored)[offset:]
+        return {
+            "hits": [(sid, seq, round(score, 4)) for score, seq, sid in top],
+            "total": total,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def _idf(self, term: str) -> float:
+        df = self._document_frequency[term]
+        return math.log(1 + (self._total_documents - df + 0.5) / (df + 0.5))
+
+    def _intersect(self, shard: _SessionShard, terms: List[str], budget: int) -> List[Tuple[int, List[int]]]:
+        """
+        在分片內求交集，從最新的消息往前掃描，最多返回 budget 條
+        返回 [(seq, [每個詞在倒排列表中的位置]), ...]
+        """
+        lists = [shard.postings.get(term) for term in terms]
+        if any(postings is None for postings in lists):
+            return []
+        if len(lists) == 1:
+            postings = lists[0]
+            stop = max(len(postings) - budget, 0) - 1
+            return [(postings[position], (position,)) for position in range(len(postings) - 1, stop, -1)]
+        order = sorted(range(len(terms)), key=lambda i: len(lists[i]))
+        base = lists[order[0]]
+
+        matches = []
+        for position in range(len(base) - 1, -1, -1):
+            seq = base[position]
+            positions = [0] * len(terms)
+            positions[order[0]] = position
+            for i in order[1:]:
+                postings = lists[i]
+                found = bisect.bisect_left(postings, seq)
+                if found == len(postings) or postings[found] != seq:
+                    break
+                positions[i] = found
+            else:
+                matches.append((seq, positions))
+                if len(matches) >= budget:
+                    break
+        return matches
+
+    def _score(self, shard: _SessionShard, session_id: str, matches, terms, idf, avg_length):
+        k1 = self.k1
+        base = k1 * (1 - self.b)
+        scale = k1 * self.b / avg_length
+        lengths = shard.lengths
+        columns = [(shard.freqs[term], idf[term] * (k1 + 1)) for term in terms]
+        for seq, positions in matches:
+            norm = base + scale * lengths[seq]
+            score = 0.0
+            for (freqs, weight), position in zip(columns, positions):
+                tf = freqs[position]
+                score += weight * tf / (tf + norm)
+            yield score, seq, session_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._shards),
+            "documents": self._total_documents,
+            "terms": len(self._document_frequency),
+            "memory_bytes": self._memory_bytes
+        }
@@ -0,0 +1,173 @@
+"""
+會話分享令牌存儲
+令牌 -> (會話, 權限, 過期時間) 的映射常駐內存，驗證只需一次字典查找；
+過期時間用最小堆索引，由後台任務定期清理；所有令牌寫入 SQLite，重啟後恢復
+"""
+
+import os
+import time
+import heapq
+import sqlite3
+import secrets
+import asyncio
+import tempfile
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERMISSIONS = ("view",)
+
+
+@dataclass(frozen=True)
+class ShareGrant:
+    """分享授權"""
+    token: str
+    session_id: str
+    permissions: Tuple[str, ...]
+    expires_at: float
+    created_at: float
+
+    def is_expired(self, now: float = None) -> bool:
+        return self.expires_at <= (now if now is not None else time.time())
+
+
+class ShareTokenStore:
+    """分享令牌存儲"""
+
+    def __init__(self, db_path: str, sweep_interval: float = 60):
+        self.db_path = db_path
+        self.sweep_interval = sweep_interval
+        self._grants: Dict[str, ShareGrant] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._db: Optional[sqlite3.Connection] = None
+
+    def load(self):
+        """打開數據庫並加載所有未過期令牌"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS share_tokens ("
+            " token TEXT PRIMARY KEY,"
+            " session_id TEXT NOT NULL,"
+            " permissions TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM share_tokens WHERE expires_at <= ?", (now,))
+        self._db.commit()
+
+        self._grants.clear()
+        for token, session_id, permissions, expires_at, created_at in self._db.execute(
+                "SELECT token, session_id, permissions, expires_at, created_at FROM share_tokens"):
+            self._grants[token] = ShareGrant(token, session_id, tuple(permissions.split(",")),
+                                             expires_at, created_at)
+        self._expiry_heap = [(grant.expires_at, grant.token) for grant in self._grants.values()]
+        heapq.heapify(self._expiry_heap)
+        logger.info(f"🔑 加載分享令牌: {len(self._grants)} 個")
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def issue(self, session_id: str, expire_seconds: float,
+              permissions: Iterable[str] = DEFAULT_PERMISSIONS) -> ShareGrant:
+        """生成新令牌"""
+        now = time.time()
+        grant = ShareGrant(
+            token=secrets.token_urlsafe(18),
+            session_id=session_id,
+            permissions=tuple(permissions) or DEFAULT_PERMISSIONS,
+            expires_at=now + expire_seconds,
+            created_at=now
+        )
+        if self._db:
+            self._db.execute(
+                "INSERT INTO share_tokens (token, session_id, permissions, expires_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (grant.token, grant.session_id, ",".join(grant.permissions), grant.expires_at, grant.created_at)
+            )
+            self._db.commit()
+        self._grants[grant.token] = grant
+        heapq.heappush(self._expiry_heap, (grant.expires_at, grant.token))
+        return grant
+
+    def validate(self, token: str) -> Optional[ShareGrant]:
+        """
+        驗證令牌，O(1)；過期令牌即使尚未被清理也視為無效
+        內存未命中時查詢 SQLite：多 worker 共用數據庫，令牌可能由其他 worker 簽發
+        """
+        grant = self._grants.get(token)
+        if grant is None:
+            grant = self._lookup(token)
+        if grant is None or grant.is_expired():
+            return None
+        return grant
+
+    def _lookup(self, token: str) -> Optional[ShareGrant]:
+        """從數據庫讀取令牌並加入內存索引"""
+        if not self._db:
+            return None
+        row = self._db.execute(
+            "SELECT session_id, permissions, expires_at, created_at FROM share_tokens WHERE token = ?", (token,)
+        ).fetchone()
+        if row is None:
+            return None
+        session_id, permissions, expires_at, created_at = row
+        grant = self._grants[token] = ShareGrant(token, session_id, tuple(permissions.split(",")),
+                                                 expires_at, created_at)
+        heapq.heappush(self._expiry_heap, (grant.expires_at, grant.token))
+        return grant
+
+    def revoke(self, token: str) -> bool:
+        """撤銷令牌（堆中的條目在清理時惰性丟棄）"""
+        grant = self._grants.pop(token, None)
+        if grant is None:
+            return False
+        if self._db:
+            self._db.execute("DELETE FROM share_tokens WHERE token = ?", (token,))
+            self._db.commit()
+        return True
+
+    def sweep(self, now: float = None) -> int:
+        """彈出堆頂所有已過期的令牌並刪除"""
+        now = now if now is not None else time.time()
+        expired = []
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._expiry_heap)
+            grant = self._grants.get(token)
+            if grant is not None and grant.expires_at == expires_at:
+                del self._grants[token]
+                expired.append((token,))
+
+        if expired and self._db:
+            self._db.executemany("DELETE FROM share_tokens WHERE token = ?", expired)
+            self._db.commit()
+        return len(expired)
+
+    async def run(self):
+        """後台清理任務"""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"🧹 清理過期分享令牌: {removed} 個")
+            except Exception as e:
+                logger.error(f"分享令牌清理失敗: {e}")
+
+    def __len__(self) -> int:
+        return len(self._grants)
+
+
+def create_share_token_store() -> ShareTokenStore:
+    """根據環境變量創建令牌存儲（SHARE_TOKEN_DB 指定 SQLite 文件）"""
+    return ShareTokenStore(os.environ.get(
+        "SHARE_TOKEN_DB",
+        os.path.join(tempfile.gettempdir(), "claudeditor-share-tokens.db")
+    ))
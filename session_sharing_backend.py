@@ -3,29 +3,114 @@
 提供比Manus更強大的團隊協作和會話管理能力
 """
 
+import os
+import sys
 import json
+import time
 import uuid
+import heapq
 import asyncio
+import functools
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, asdict, fields
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
+from session_broker import SessionBroker, LocalSessionBroker, create_session_broker
+from session_retention import SessionRetentionManager, create_retention_manager, estimate_object_size
+from session_share import ShareTokenStore, ShareGrant, create_share_token_store
+from session_search import SessionSearchIndex
+from session_stream import SessionStream
+from session_coalescer import EventCoalescer, CoalescedBurst, coalesce_windows_from_env
+from session_crdt import SessionDocumentStore, create_document_store
+from session_views import SessionInfoViews, CachedView, encode_json, make_etag, etag_matches, public_list_body
+from session_presence import PresenceTracker, summarize_participants
+import ws_codec
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+def _iso(ts: float) -> str:
+    """epoch 秒轉 ISO 時間字符串（僅在序列化時使用）"""
+    return datetime.fromtimestamp(ts).isoformat()
+
+def _remote_callable(method):
+    """標記可由其他 worker 經代理調用的方法（參數和返回值必須可 JSON 序列化）"""
+    method.remote_callable = True
+    return method
+
+def _routed(method):
+    """
+    會話級操作：在會話的歸屬 worker 上執行，其他 worker 經代理轉發調用
+    第一個參數必須是 session_id；參數和返回值必須可 JSON 序列化
+    """
+    @functools.wraps(method)
+    async def call(self, session_id: str, *args, **kwargs):
+        if self.broker.owns(session_id):
+            return await method(self, session_id, *args, **kwargs)
+        return await self.broker.call(session_id, method.__name__, [session_id, *args], kwargs)
+    return _remote_callable(call)
+
 class SessionMessage:
-    """會話消息結構"""
-    id: str
-    session_id: str
-    user_id: str
-    user_name: str
-    message_type: str  # 'user', 'assistant', 'system', 'task_plan', 'progress'
-    content: str
-    timestamp: str
-    metadata: Dict[str, Any]
+    """
+    會話消息結構
+    使用 __slots__、epoch 時間戳、會話內整數序號，重複出現的字符串做 intern，
+    序號即消息在會話日誌中的下標
+    """
+    __slots__ = ("seq", "session_id", "user_id", "user_name", "message_type",
+                 "content", "created_at", "metadata")
+    
+    def __init__(self, seq: int, session_id: str, user_id: str, user_name: str,
+                 message_type: str, content: str, created_at: float,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self.seq = seq
+        self.session_id = sys.intern(session_id)
+        self.user_id = sys.intern(user_id)
+        self.user_name = sys.intern(user_name)
+        self.message_type = sys.intern(message_type)  # 'user', 'assistant', 'system', 'task_plan', 'progress'
+        self.content = content
+        self.created_at = created_at
+        self.metadata = metadata or None
+    
+    @property
+    def id(self) -> int:
+        return self.seq
+    
+    @property
+    def timestamp(self) -> str:
+        return _iso(self.created_at)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """API / WebSocket 使用的字典格式"""
+        return {
+            "id": self.seq,
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "user_name": self.user_name,
+            "message_type": self.message_type,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "metadata": self.metadata or {}
+        }
+    
+    def to_record(self) -> Dict[str, Any]:
+        """落盤格式"""
+        return {
+            "seq": self.seq,
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "user_name": self.user_name,
+            "message_type": self.message_type,
+            "content": self.content,
+            "created_at": self.created_at,
+            "metadata": self.metadata
+        }
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "SessionMessage":
+        return cls(**record)
 
 @dataclass
 class SessionInfo:
@@ -42,15 +127,50 @@ class SessionInfo:
     tags: List[str]
     project_context: Optional[Dict[str, Any]]
 
-@dataclass
 class ReplayEvent:
-    """回放事件結構"""
-    event_id: str
-    session_id: str
-    event_type: str  # 'message', 'task_start', 'task_progress', 'task_complete', 'user_join', 'user_leave'
-    timestamp: str
-    data: Dict[str, Any]
-    duration: float  # 事件持續時間（秒）
+    """
+    回放事件結構
+    消息事件只引用對應的 SessionMessage，不再複製一份消息內容
+    """
+    __slots__ = ("seq", "session_id", "event_type", "created_at", "data", "duration", "message")
+    
+    def __init__(self, seq: int, session_id: str, event_type: str, created_at: float,
+                 data: Optional[Dict[str, Any]] = None, duration: float = 0.1,
+                 message: Optional[SessionMessage] = None):
+        self.seq = seq
+        self.session_id = sys.intern(session_id)
+        self.event_type = sys.intern(event_type)  # 'message', 'task_start', 'task_progress', 'task_complete', 'user_join', 'user_leave'
+        self.created_at = created_at
+        self.data = data
+        self.duration = duration  # 事件持續時間（秒）
+        self.message = message
+    
+    @property
+    def timestamp(self) -> str:
+        return _iso(self.created_at)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "event_id": self.seq,
+            "session_id": self.session_id,
+            "event_type": self.event_type,
+            "timestamp": self.timestamp,
+            "data": self.message.to_dict() if self.message is not None else (self.data or {}),
+            "duration": self.duration
+        }
+    
+    def to_record(self) -> Dict[str, Any]:
+        record = {
+            "seq": self.seq,
+            "event_type": self.event_type,
+            "created_at": self.created_at,
+            "duration": self.duration
+        }
+        if self.message is not None:
+            record["message_seq"] = self.message.seq
+        else:
+            record["data"] = self.data
+        return record
 
 class SessionManager:
     """
@@ -58,16 +178,227 @@ class SessionManager:
     提供超越Manus的協作能力
     """
     
-    def __init__(self):
+    def __init__(self, broker: SessionBroker = None, retention: SessionRetentionManager = None,
+                 share_tokens: ShareTokenStore = None, search_index: SessionSearchIndex = None,
+                 documents: SessionDocumentStore = None):
         self.active_sessions: Dict[str, Dict[str, Any]] = {}
         self.session_messages: Dict[str, List[SessionMessage]] = {}
         self.session_info: Dict[str, SessionInfo] = {}
         self.replay_events: Dict[str, List[ReplayEvent]] = {}
         self.websocket_connections: Dict[str, List[WebSocket]] = {}
         
+        # 事件代理：多 worker 部署時負責跨進程廣播，並把會話請求轉發給會話的歸屬 worker
+        self.broker = broker or LocalSessionBroker()
+        self.broker.set_handler(self._deliver_to_local_connections)
+        self.broker.set_stamper(self._stamp_frame)
+        self.broker.set_request_handler(self._serve_remote_call)
+        
+        # 保留管理：熱數據留在內存，舊數據和閒置會話落盤
+        self.retention = retention or create_retention_manager()
+        
+        # 分享令牌：內存索引 + SQLite 持久化
+        self.share_tokens = share_tokens or create_share_token_store()
+        self.share_base_url = os.environ.get("SHARE_BASE_URL", "http://localhost:8080")
+        
+        # 全文檢索：消息到達時增量索引；啟動時從磁盤分段為已卸載會話重建
+        # 索引覆蓋已卸載的會話、不隨卸載釋放，其內存單獨報告，不參與會話卸載判斷
+        self.search_index = search_index or SessionSearchIndex()
+        self.retention.add_memory_source(self.search_index.memory_bytes)
+        self._index_rebuild: Optional[asyncio.Task] = None
+        
+        # 廣播流：每個會話的幀序號和環形緩衝區，用於重連增量同步
+        self.streams: Dict[str, SessionStream] = {}
+        self.stream_ring_size = int(os.environ.get("SESSION_RING_SIZE", "1024"))
+        self._resuming: Dict[WebSocket, List[Dict[str, Any]]] = {}
+        
+        # 高頻事件合併：progress 消息和 typing/presence 狀態按窗口只發送最新狀態
+        self.coalescer = EventCoalescer(coalesce_windows_from_env(), self._flush_coalesced)
+        
+        # 協作文檔：RGA CRDT，只廣播增量，定期壓縮墓碑並寫快照
+        self.documents = documents or create_document_store(self.retention)
+        
+        # 會話信息視圖：預序列化 JSON + ETag，只在會話信息變化時失效
+        self.info_views = SessionInfoViews()
+        
+        # 參與者索引：session_id -> user_id -> 參與者記錄（與 SessionInfo.participants 中的對象相同）
+        self.participant_index: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.participant_limit = int(os.environ.get("SESSION_PARTICIPANT_LIMIT", "50"))
+        # 在線狀態：由 WebSocket 連接和心跳決定
+        self.presence = PresenceTracker(ttl=float(os.environ.get("SESSION_PRESENCE_TTL", "90")))
+        
+        self._background_tasks: List[asyncio.Task] = []
+        
+    async def start(self):
+        """啟動事件代理和後台任務"""
+        await self.broker.start()
+        # 多 worker 共用存儲目錄：每個 worker 只收錄和索引自己歸屬的會話
+        self.retention.scan(self.broker.owns)
+        self.share_tokens.load()
+        self._index_rebuild = asyncio.create_task(self._rebuild_search_index())
+        self._background_tasks = [
+            self._index_rebuild,
+            asyncio.create_task(self._retention_loop()),
+            asyncio.create_task(self.share_tokens.run()),
+            asyncio.create_task(self.documents.run()),
+            asyncio.create_task(self._presence_loop())
+        ]
+    
+    async def close(self):
+        """停止後台任務，把所有會話寫入磁盤"""
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        await self.coalescer.flush_all()
+        self.documents.flush()
+        for session_id in list(self.session_info):
+            self.unload_session(session_id)
+        self.share_tokens.close()
+        await self.broker.close()
+    
+    async def _serve_remote_call(self, method: str, args: List[Any], kwargs: Dict[str, Any]) -> Any:
+        """執行其他 worker 轉發的調用：只允許標記過的方法，直接在本 worker 上執行"""
+        function = getattr(type(self), method, None)
+        if not getattr(function, "remote_callable", False):
+            raise ValueError(f"不支持的調用: {method}")
+        function = getattr(function, "__wrapped__", function)
+        return await function(self, *args, **kwargs)
+    
+    async def _rebuild_search_index(self):
+        """為磁盤上的已卸載會話重建全文索引（逐個會話讓出事件循環，不加載會話）"""
+        started = time.perf_counter()
+        rebuilt = 0
+        for session_id in list(self.retention.catalog):
+            try:
+                indexed = self.search_index.indexed_count(session_id)
+                for position, record in enumerate(self.retention.iter_log_records(session_id, "messages")):
+                    if position >= indexed:
+                        self.search_index.add(session_id, record["seq"], record["content"])
+                rebuilt += 1
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"會話索引重建失敗 {session_id}: {e}")
+            await asyncio.sleep(0)
+        logger.info(f"🔎 全文索引重建完成: {rebuilt} 個會話, "
+                    f"{time.perf_counter() - started:.2f}s, {self.search_index.memory_bytes()} bytes")
+    
+    async def _retention_loop(self):
+        """定期卸載閒置會話，並把內存佔用控制在上限以內"""
+        while True:
+            await asyncio.sleep(self.retention.sweep_interval)
+            try:
+                self.sweep_sessions()
+            except Exception as e:
+                logger.error(f"會話保留任務失敗: {e}")
+    
+    def sweep_sessions(self) -> List[str]:
+        """卸載閒置超時和超出內存上限的會話，返回被卸載的會話"""
+        candidates = self.retention.unload_candidates()
+        for session_id in candidates:
+            self.unload_session(session_id)
+        return candidates
+    
+    async def _presence_loop(self):
+        """定期把心跳超時的用戶標記為離線"""
+        while True:
+            await asyncio.sleep(max(self.presence.ttl / 3, 1))
+            try:
+                for session_id, user_id in self.presence.expire():
+                    await self._presence_changed(session_id, user_id, False)
+            except Exception as e:
+                logger.error(f"在線狀態任務失敗: {e}")
+    
+    def _open_session_logs(self, session_id: str, log_states: Dict[str, Any] = None):
+        """為會話創建消息和回放事件日誌"""
+        log_states = log_states or {}
+        messages = self.retention.open_log(
+            session_id, "messages",
+            encode=SessionMessage.to_record,
+            decode=SessionMessage.from_record,
+            estimate=lambda msg: estimate_object_size(msg.content, msg.metadata),
+            state=log_states.get("messages")
+        )
+        
+        def decode_event(record: Dict[str, Any]) -> ReplayEvent:
+            message_seq = record.get("message_seq")
+            return ReplayEvent(
+                seq=record["seq"],
+                session_id=session_id,
+                event_type=record["event_type"],
+                created_at=record["created_at"],
+                data=record.get("data"),
+                duration=record["duration"],
+                message=messages[message_seq] if message_seq is not None else None
+            )
+        
+        self.session_messages[session_id] = messages
+        self.replay_events[session_id] = self.retention.open_log(
+            session_id, "events",
+            encode=ReplayEvent.to_record,
+            decode=decode_event,
+            estimate=lambda event: estimate_object_size("", event.data),
+            state=log_states.get("events")
+        )
+    
+    def _ensure_loaded(self, session_id: str) -> bool:
+        """確保會話已加載到內存，已卸載的會話從磁盤恢復"""
+        if session_id in self.session_info:
+            self.retention.touch(session_id)
+            return True
+        
+        manifest = self.retention.load_manifest(session_id)
+        if manifest is None:
+            return False
+        
+        self.session_info[session_id] = SessionInfo(**manifest["session_info"])
+        self._index_participants(session_id)
+        self._open_session_logs(session_id, manifest.get("logs"))
+        stream_state = manifest.get("extra", {}).get("stream", {})
+        self.streams[session_id] = SessionStream(
+            self.stream_ring_size,
+            next_seq=stream_state.get("next_seq", 0),
+            message_index=self.retention.read_blob(session_id, "stream.idx")
+        )
+        self.websocket_connections.setdefault(session_id, [])
+        self.retention.mark_loaded(session_id)
+        
+        # 重啟後首次加載的會話補建索引
+        messages = self.session_messages[session_id]
+        indexed = self.search_index.indexed_count(session_id)
+        if indexed < len(messages):
+            for message in messages[indexed:]:
+                self.search_index.add(session_id, message.seq, message.content)
+        logger.info(f"📂 從磁盤加載會話: {session_id}")
+        return True
+    
+    def unload_session(self, session_id: str):
+        """將會話整體寫入磁盤並釋放內存（WebSocket 連接保留）"""
+        if session_id not in self.session_info:
+            return
+        
+        self.documents.unload(session_id)
+        if not self.session_info[session_id].is_public:
+            self.info_views.forget(session_id)
+        stream = self.streams.pop(session_id, None) or SessionStream(self.stream_ring_size)
+        self.retention.save_session(
+            session_id, asdict(self.session_info[session_id]),
+            extra={"stream": stream.state()},
+            blobs={"stream.idx": stream.message_index()}
+        )
+        del self.session_info[session_id]
+        self.participant_index.pop(session_id, None)
+        self.session_messages.pop(session_id, None)
+        self.replay_events.pop(session_id, None)
+        logger.info(f"💤 卸載閒置會話: {session_id}")
+        
     async def create_session(self, creator_id: str, creator_name: str, title: str = None, is_public: bool = False) -> str:
-        """創建新的協作會話"""
+        """創建新的協作會話（會話 ID 決定歸屬 worker，由歸屬 worker 創建）"""
         session_id = str(uuid.uuid4())
+        await self._create_session(session_id, creator_id, creator_name, title, is_public)
+        return session_id
+    
+    @_routed
+    async def _create_session(self, session_id: str, creator_id: str, creator_name: str,
+                              title: str = None, is_public: bool = False):
         current_time = datetime.now().isoformat()
         
         if not title:
@@ -88,9 +419,10 @@ class SessionManager:
         )
         
         self.session_info[session_id] = session_info
-        self.session_messages[session_id] = []
-        self.replay_events[session_id] = []
+        self._index_participants(session_id)
+        self._open_session_logs(session_id)
         self.websocket_connections[session_id] = []
+        self._info_changed(session_id)
         
         # 添加會話創建事件
         await self._add_replay_event(session_id, 'session_created', {
@@ -100,148 +432,376 @@ class SessionManager:
         })
         
         logger.info(f"🎬 創建協作會話: {session_id} by {creator_name}")
-        return session_id
     
     async def join_session(self, session_id: str, user_id: str, user_name: str, websocket: WebSocket = None) -> bool:
-        """加入協作會話"""
-        if session_id not in self.session_info:
+        """加入協作會話（websocket 連接留在本 worker）"""
+        if not await self._join_session(session_id, user_id, user_name):
+            return False
+        
+        # 添加WebSocket連接
+        if websocket:
+            self.websocket_connections.setdefault(session_id, []).append(websocket)
+        return True
+    
+    @_routed
+    async def _join_session(self, session_id: str, user_id: str, user_name: str) -> bool:
+        if not self._ensure_loaded(session_id):
             return False
         
         session = self.session_info[session_id]
         current_time = datetime.now().isoformat()
         
         # 檢查用戶是否已經在會話中
-        existing_participant = next((p for p in session.participants if p["user_id"] == user_id), None)
+        participants = self.participant_index[session_id]
         
-        if not existing_participant:
+        if user_id not in participants:
             # 添加新參與者
-            session.participants.append({
+            participant = {
                 "user_id": user_id,
                 "user_name": user_name,
                 "joined_at": current_time
-            })
+            }
+            session.participants.append(participant)
+            participants[user_id] = participant
             
             # 添加系統消息
-            join_message = SessionMessage(
-                id=str(uuid.uuid4()),
+            await self._add_message(
                 session_id=session_id,
                 user_id="system",
                 user_name="系統",
                 message_type="system",
                 content=f"🎉 {user_name} 加入了會話",
-                timestamp=current_time,
                 metadata={"event_type": "user_join"}
             )
             
-            await self._add_message(join_message)
-            
             # 添加回放事件
             await self._add_replay_event(session_id, 'user_join', {
                 'user_name': user_name,
                 'user_id': user_id
             })
         
-        # 添加WebSocket連接
-        if websocket and session_id in self.websocket_connections:
-            self.websocket_connections[session_id].append(websocket)
-        
         session.last_active = current_time
+        self._info_changed(session_id)
         logger.info(f"👥 用戶 {user_name} 加入會話: {session_id}")
         return True
     
+    @_routed
     async def add_message(self, session_id: str, user_id: str, user_name: str, 
-                         message_type: str, content: str, metadata: Dict[str, Any] = None) -> str:
-        """添加消息到會話"""
-        if session_id not in self.session_info:
+                         message_type: str, content: str, metadata: Dict[str, Any] = None) -> int:
+        """添加消息到會話，返回消息 ID（會話內的整數序號，與消息字典和 WebSocket 幀中的 id 相同）"""
+        if not self._ensure_loaded(session_id):
             raise ValueError(f"會話不存在: {session_id}")
         
-        message_id = str(uuid.uuid4())
-        current_time = datetime.now().isoformat()
-        
-        message = SessionMessage(
-            id=message_id,
+        message = await self._add_message(
             session_id=session_id,
             user_id=user_id,
             user_name=user_name,
             message_type=message_type,
             content=content,
-            timestamp=current_time,
-            metadata=metadata or {}
+            metadata=metadata
         )
         
-        await self._add_message(message)
-        
         # 更新會話活躍時間
-        self.session_info[session_id].last_active = current_time
+        self.session_info[session_id].last_active = message.timestamp
+        self._info_changed(session_id)
         
-        # 廣播消息給所有連接的客戶端
-        await self._broadcast_to_session(session_id, {
+        frame = {
             "type": "new_message",
-            "message": asdict(message)
-        })
+            "message": message.to_dict()
+        }
+        
+        # 任務進度消息按任務合併，窗口結束時只廣播最新進度
+        if message_type == "progress" and self.coalescer.handles("progress"):
+            key = str((metadata or {}).get("task_id") or user_id)
+            self.coalescer.submit(session_id, "progress", key, frame)
+            return message.id
+        
+        # 廣播消息給所有連接的客戶端
+        await self._broadcast_to_session(session_id, frame)
         
-        # 添加回放事件
-        await self._add_replay_event(session_id, 'message', asdict(message))
+        # 添加回放事件（引用消息本身）
+        await self._add_replay_event(session_id, 'message', message=message)
         
-        return message_id
+        return message.id
     
-    async def _add_message(self, message: SessionMessage):
-        """內部方法：添加消息"""
-        if message.session_id not in self.session_messages:
-            self.session_messages[message.session_id] = []
+    @_routed
+    async def update_presence(self, session_id: str, frame: Dict[str, Any]):
+        """
+        typing / presence / participant_presence 狀態更新，按 (幀類型, 用戶) 合併：
+        同一用戶的輸入狀態不會覆蓋上下線變化
+        """
+        if not self.coalescer.handles("presence"):
+            await self._broadcast_to_session(session_id, frame)
+            return
+        key = (frame.get("type"), str(frame.get("user_id", "anonymous")))
+        self.coalescer.submit(session_id, "presence", key, frame)
+    
+    async def _flush_coalesced(self, burst: CoalescedBurst):
+        """發送一個合併窗口：每個 key 的最新幀各廣播一次（coalesced 為該 key 合併的事件數），整段突發記為一條回放事件"""
+        for frame, count in zip(burst.updates, burst.counts):
+            if count > 1:
+                frame["coalesced"] = count
+            await self._broadcast_to_session(burst.session_id, frame)
         
-        self.session_messages[message.session_id].append(message)
-        self.session_info[message.session_id].message_count += 1
+        if self._ensure_loaded(burst.session_id):
+            await self._add_replay_event(
+                burst.session_id,
+                'task_progress' if burst.kind == "progress" else 'presence',
+                {
+                    "updates": [frame.get("message", frame) for frame in burst.updates],
+                    "count": burst.count
+                },
+                duration=burst.duration
+            )
     
+    async def _add_message(self, session_id: str, user_id: str, user_name: str, message_type: str,
+                           content: str, metadata: Dict[str, Any] = None) -> SessionMessage:
+        """內部方法：添加消息，序號為消息在會話日誌中的下標"""
+        messages = self.session_messages[session_id]
+        message = SessionMessage(
+            seq=len(messages),
+            session_id=session_id,
+            user_id=user_id,
+            user_name=user_name,
+            message_type=message_type,
+            content=content,
+            created_at=time.time(),
+            metadata=metadata
+        )
+        messages.append(message)
+        self.session_info[session_id].message_count += 1
+        self._info_changed(session_id)
+        self.search_index.add(session_id, message.seq, content)
+        return message
+    
+    @_routed
     async def get_session_messages(self, session_id: str, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """獲取會話消息"""
-        if session_id not in self.session_messages:
+        """獲取會話消息（超出熱數據的部分從磁盤分段讀取）"""
+        if not self._ensure_loaded(session_id):
             return []
         
         messages = self.session_messages[session_id]
         start_idx = max(0, len(messages) - offset - limit)
         end_idx = len(messages) - offset if offset > 0 else len(messages)
         
-        return [asdict(msg) for msg in messages[start_idx:end_idx]]
+        return [msg.to_dict() for msg in messages[start_idx:end_idx]]
     
+    @_routed
     async def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """獲取會話信息"""
-        if session_id not in self.session_info:
+        if not self._ensure_loaded(session_id):
             return None
         
-        return asdict(self.session_info[session_id])
+        return self._info_payload(session_id)
     
-    async def get_public_sessions(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """獲取公開會話列表"""
-        public_sessions = [
-            asdict(session) for session in self.session_info.values()
-            if session.is_public
-        ]
+    def _info_changed(self, session_id: str):
+        """會話信息（參與者、在線數、標題、計數、活躍時間）變化後使緩存視圖失效"""
+        info = self.session_info.get(session_id)
+        if info is not None:
+            is_public = info.is_public
+        else:
+            is_public = self.retention.catalog.get(session_id, (False, ""))[0]
+        self.info_views.invalidate(session_id, is_public)
+    
+    def _index_participants(self, session_id: str):
+        self.participant_index[session_id] = {
+            participant["user_id"]: participant for participant in self.session_info[session_id].participants
+        }
+    
+    def _info_payload(self, session_id: str) -> Dict[str, Any]:
+        """會話信息的響應形式（淺拷貝，參與者列表按上限截斷）"""
+        info = self.session_info[session_id]
+        return summarize_participants(
+            {field.name: getattr(info, field.name) for field in fields(info)},
+            self.participant_limit, self.presence.online_count(session_id)
+        )
+    
+    def session_info_view(self, session_id: str) -> Optional[CachedView]:
+        """
+        會話信息的緩存視圖；已卸載會話的視圖仍有效，命中時無需加載會話
+        未命中的已卸載會話只讀取清單（公開會話的視圖同時緩存，私有會話卸載後不保留視圖）
+        """
+        view = self.info_views.peek(session_id)
+        if view is not None:
+            return view
+        if session_id in self.session_info:
+            self.retention.touch(session_id)
+            return self.info_views.get(session_id, lambda: self._info_payload(session_id))
+        manifest = self.retention.load_manifest(session_id)
+        if manifest is None:
+            return None
+        payload = summarize_participants(
+            manifest["session_info"], self.participant_limit, self.presence.online_count(session_id)
+        )
+        if manifest["session_info"].get("is_public"):
+            return self.info_views.put(session_id, payload)
+        return CachedView(encode_json(payload))
+    
+    async def get_session_info_view(self, session_id: str) -> Optional[CachedView]:
+        """
+        會話信息視圖；會話歸屬其他 worker 時向歸屬 worker 獲取
+        （視圖只在歸屬 worker 上隨會話變化失效，因此不在本 worker 緩存）
+        """
+        if self.broker.owns(session_id):
+            return self.session_info_view(session_id)
+        body = await self._session_info_body(session_id)
+        return CachedView(body.encode("utf-8")) if body is not None else None
+    
+    @_routed
+    async def _session_info_body(self, session_id: str) -> Optional[str]:
+        view = self.session_info_view(session_id)
+        return view.body.decode("utf-8") if view is not None else None
+    
+    def public_sessions_view(self, limit: int = 20) -> CachedView:
+        """公開會話列表的緩存視圖（已加載和已卸載的公開會話按最後活躍時間合併）"""
+        return self.info_views.public_list(limit, lambda: [body for _, body in self._public_session_views(limit)])
+    
+    async def get_public_sessions_view(self, limit: int = 20) -> CachedView:
+        """公開會話列表視圖；多 worker 時合併各 worker 歸屬的公開會話（ETag 按合併後的內容計算）"""
+        if self.broker.workers == 1:
+            return self.public_sessions_view(limit)
+        entries = heapq.nlargest(limit, (
+            tuple(entry) for entries in await self.broker.call_all("_public_session_entries", [limit])
+            for entry in entries
+        ))
+        return CachedView(public_list_body([body.encode("utf-8") for _, body in entries]))
+    
+    @_remote_callable
+    async def _public_session_entries(self, limit: int) -> List[List[str]]:
+        """本 worker 歸屬的公開會話：[最後活躍時間, 視圖 JSON]"""
+        return [[last_active, body.decode("utf-8")] for last_active, body in self._public_session_views(limit)]
+    
+    def _public_session_views(self, limit: int) -> List[Tuple[str, bytes]]:
+        """按最後活躍時間降序的公開會話：(最後活躍時間, 視圖 JSON)"""
+        candidates = [(info.last_active, sid) for sid, info in self.session_info.items() if info.is_public]
+        candidates.extend(
+            (last_active, sid) for sid, (is_public, last_active) in self.retention.catalog.items() if is_public
+        )
+        bodies = []
+        for last_active, sid in heapq.nlargest(limit, candidates):
+            view = self.info_views.peek(sid)
+            if view is None:
+                if sid in self.session_info:
+                    view = self.info_views.get(sid, lambda: self._info_payload(sid))
+                else:
+                    # 已卸載的公開會話只讀取清單，不加載消息
+                    manifest = self.retention.load_manifest(sid)
+                    if not manifest:
+                        continue
+                    view = self.info_views.put(sid, summarize_participants(
+                        manifest["session_info"], self.participant_limit, self.presence.online_count(sid)
+                    ))
+            bodies.append((last_active, view.body))
+        return bodies
+    
+    async def search_messages(self, query: str, session_id: str = None,
+                              limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        全文檢索消息；指定 session_id 時只在該會話內檢索（由會話的歸屬 worker 執行）
+        多 worker 的全局檢索在每個 worker 上取前 offset + limit 條，按分數合併後分頁
+        """
+        if session_id is not None:
+            return await self._search_session(session_id, query, limit, offset)
+        if self.broker.workers == 1:
+            return await self._search_local(query, None, limit, offset)
+        results = await self.broker.call_all("_search_local", [query, None, limit + offset, 0])
+        hits = heapq.nlargest(limit + offset, (hit for result in results for hit in result["results"]),
+                              key=lambda hit: hit["score"])
+        return {
+            "results": hits[offset:],
+            "total": sum(result["total"] for result in results),
+            "took_ms": max(result["took_ms"] for result in results)
+        }
+    
+    @_routed
+    async def _search_session(self, session_id: str, query: str, limit: int, offset: int) -> Dict[str, Any]:
+        return await self._search_local(query, session_id, limit, offset)
+    
+    @_remote_callable
+    async def _search_local(self, query: str, session_id: Optional[str], limit: int, offset: int) -> Dict[str, Any]:
+        """在本 worker 的索引中檢索（只包含本 worker 歸屬的會話）"""
+        if self._index_rebuild is not None and not self._index_rebuild.done():
+            # 啟動後的索引重建完成前，已卸載會話的結果不完整
+            await asyncio.shield(self._index_rebuild)
+        if session_id is not None and not self._ensure_loaded(session_id):
+            return {"results": [], "total": 0, "took_ms": 0.0}
+        result = self.search_index.search(query, session_id=session_id, limit=limit, offset=offset)
         
-        # 按最後活躍時間排序
-        public_sessions.sort(key=lambda x: x['last_active'], reverse=True)
+        hits = []
+        for sid, seq, score in result["hits"]:
+            if not self._ensure_loaded(sid):
+                continue
+            hits.append({
+                "session_id": sid,
+                "score": score,
+                "message": self.session_messages[sid][seq].to_dict()
+            })
         
-        return public_sessions[:limit]
+        return {"results": hits, "total": result["total"], "took_ms": result["took_ms"]}
     
-    async def generate_share_link(self, session_id: str, expire_days: int = 7) -> str:
+    @_routed
+    async def generate_share_link(self, session_id: str, expire_days: int = 7,
+                                  permissions: List[str] = None) -> str:
         """生成會話分享鏈接"""
-        if session_id not in self.session_info:
+        if not self._ensure_loaded(session_id):
             raise ValueError(f"會話不存在: {session_id}")
         
-        # 生成分享令牌
-        share_token = str(uuid.uuid4())
-        expire_time = datetime.now() + timedelta(days=expire_days)
-        
-        # 這裡應該存儲分享令牌到數據庫
-        # 暫時返回模擬鏈接
-        share_link = f"http://localhost:8080/share/{share_token}"
+        # 生成並存儲分享令牌
+        grant = self.share_tokens.issue(
+            session_id,
+            expire_seconds=timedelta(days=expire_days).total_seconds(),
+            permissions=permissions or ["view"]
+        )
+        share_link = f"{self.share_base_url}/share/{grant.token}"
         
         logger.info(f"🔗 生成分享鏈接: {session_id} -> {share_link}")
         return share_link
     
+    def resolve_share_token(self, token: str) -> Optional[ShareGrant]:
+        """解析分享令牌，無效或過期時返回 None"""
+        return self.share_tokens.validate(token)
+    
+    @_routed
+    async def apply_document_ops(self, session_id: str, doc_id: str, user_id: str,
+                                 ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """應用協作文檔操作，只把解析後的增量廣播給會話；rejected > 0 時客戶端需重新同步"""
+        if not self._ensure_loaded(session_id):
+            raise ValueError(f"會話不存在: {session_id}")
+        if not isinstance(ops, list):
+            raise ValueError("ops 必須是列表")
+        
+        document, deltas, rejected = self.documents.apply(session_id, doc_id, user_id, ops)
+        if deltas:
+            await self._broadcast_to_session(session_id, {
+                "type": "crdt_delta",
+                "doc_id": doc_id,
+                "user_id": user_id,
+                "version": document.version,
+                "ops": deltas
+            })
+        return {"doc_id": doc_id, "version": document.version, "applied": len(deltas), "rejected": rejected}
+    
+    @_routed
+    async def get_document(self, session_id: str, doc_id: str, include_runs: bool = False) -> Optional[Dict[str, Any]]:
+        """獲取協作文檔當前內容"""
+        if not self._ensure_loaded(session_id):
+            return None
+        
+        document = self.documents.get(session_id, doc_id)
+        result = {
+            "doc_id": doc_id,
+            "version": document.version,
+            "length": document.length,
+            "text": document.text()
+        }
+        if include_runs:
+            result["runs"] = document.visible_runs()
+        return result
+    
+    @_routed
     async def start_session_replay(self, session_id: str, speed: float = 1.0) -> Dict[str, Any]:
         """開始會話回放"""
-        if session_id not in self.replay_events:
+        if not self._ensure_loaded(session_id):
             raise ValueError(f"會話回放數據不存在: {session_id}")
         
         events = self.replay_events[session_id]
@@ -254,62 +814,185 @@ class SessionManager:
             "total_duration": sum(event.duration for event in events),
             "replay_speed": speed,
             "created_at": session_info.created_at,
-            "participants": session_info.participants
+            "participants": session_info.participants[:self.participant_limit],
+            "participant_count": len(session_info.participants)
         }
         
         logger.info(f"▶️ 開始會話回放: {session_id} (速度: {speed}x)")
         return replay_info
     
+    @_routed
     async def get_replay_events(self, session_id: str, start_time: str = None, end_time: str = None) -> List[Dict[str, Any]]:
         """獲取回放事件"""
-        if session_id not in self.replay_events:
+        if not self._ensure_loaded(session_id):
             return []
         
         events = self.replay_events[session_id]
         
-        # 時間過濾（如果提供）
+        # 時間過濾（如果提供），邊界先轉成 epoch 秒再比較
         if start_time or end_time:
-            filtered_events = []
-            for event in events:
-                event_time = datetime.fromisoformat(event.timestamp)
-                
-                if start_time and event_time < datetime.fromisoformat(start_time):
-                    continue
-                if end_time and event_time > datetime.fromisoformat(end_time):
-                    continue
-                
-                filtered_events.append(event)
-            
-            events = filtered_events
+            start_ts = datetime.fromisoformat(start_time).timestamp() if start_time else None
+            end_ts = datetime.fromisoformat(end_time).timestamp() if end_time else None
+            events = [
+                event for event in events
+                if (start_ts is None or event.created_at >= start_ts)
+                and (end_ts is None or event.created_at <= end_ts)
+            ]
         
-        return [asdict(event) for event in events]
+        return [event.to_dict() for event in events]
     
-    async def _add_replay_event(self, session_id: str, event_type: str, data: Dict[str, Any], duration: float = 0.1):
+    async def _add_replay_event(self, session_id: str, event_type: str, data: Dict[str, Any] = None,
+                                duration: float = 0.1, message: SessionMessage = None):
         """添加回放事件"""
-        if session_id not in self.replay_events:
-            self.replay_events[session_id] = []
-        
+        events = self.replay_events[session_id]
         event = ReplayEvent(
-            event_id=str(uuid.uuid4()),
+            seq=len(events),
             session_id=session_id,
             event_type=event_type,
-            timestamp=datetime.now().isoformat(),
+            created_at=time.time(),
             data=data,
-            duration=duration
+            duration=duration,
+            message=message
         )
         
-        self.replay_events[session_id].append(event)
+        events.append(event)
+    
+    @_routed
+    async def participant_connected(self, session_id: str, user_id: str, user_name: str):
+        """WebSocket 連接建立：記錄在線狀態"""
+        if self.presence.connect(session_id, user_id, user_name):
+            await self._presence_changed(session_id, user_id, True, user_name)
+    
+    @_routed
+    async def participant_disconnected(self, session_id: str, user_id: str):
+        """WebSocket 連接關閉：最後一個連接關閉時離線"""
+        if self.presence.disconnect(session_id, user_id):
+            await self._presence_changed(session_id, user_id, False)
+    
+    @_routed
+    async def participant_heartbeat(self, session_id: str, user_id: str, user_name: str):
+        """心跳（ping / typing / presence 幀）"""
+        if self.presence.heartbeat(session_id, user_id, user_name):
+            await self._presence_changed(session_id, user_id, True, user_name)
+    
+    async def _presence_changed(self, session_id: str, user_id: str, online: bool, user_name: str = None):
+        self._info_changed(session_id)
+        await self.update_presence(session_id, {
+            "type": "participant_presence",
+            "user_id": user_id,
+            "user_name": user_name,
+            "online": online
+        })
+    
+    @_routed
+    async def get_online_participants(self, session_id: str, limit: int = 100, offset: int = 0) -> Dict[str, Any]:
+        """在線用戶（最近活動的在前），不需要加載會話"""
+        return {
+            "online": self.presence.online(session_id, limit, offset),
+            "total": self.presence.online_count(session_id)
+        }
+    
+    def _stream(self, session_id: str) -> SessionStream:
+        """獲取會話廣播流（已卸載的會話先從磁盤恢復）"""
+        stream = self.streams.get(session_id)
+        if stream is None:
+            if self._ensure_loaded(session_id) and session_id in self.streams:
+                return self.streams[session_id]
+            stream = self.streams[session_id] = SessionStream(self.stream_ring_size)
+        return stream
+    
+    def _stamp_frame(self, session_id: str, frame: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        在歸屬 worker 上為廣播幀編號；攜帶消息的幀同時記錄幀序號 -> 消息序號，
+        只有真正廣播過的消息才能從日誌補發，且補發時使用原幀的序號
+        """
+        stream = self._stream(session_id)
+        stream.stamp(frame)
+        message = frame.get("message")
+        if frame.get("type") == "new_message" and isinstance(message, dict) and "id" in message:
+            stream.note_message(frame["seq"], message["id"])
+        return frame
     
     async def _broadcast_to_session(self, session_id: str, message: Dict[str, Any]):
-        """向會話中的所有連接廣播消息"""
+        """向會話中的所有連接廣播消息（由會話的歸屬 worker 分配幀序號後經代理分發到所有 worker）"""
+        await self.broker.broadcast(session_id, message)
+    
+    async def resume_connection(self, session_id: str, websocket: WebSocket, last_seq: int):
+        """
+        重連增量同步：補發 last_seq 之後的幀，然後無縫切換到實時廣播
+        補發期間到達的實時幀先緩存，補發完成後按序號去重發送
+        """
+        buffer = self._resuming[websocket] = []
+        connections = self.websocket_connections.setdefault(session_id, [])
+        if websocket not in connections:
+            connections.append(websocket)
+        
+        try:
+            replayed = 0
+            last_sent = last_seq
+            missing = await self._missing_frames(session_id, last_seq)
+            for frame in missing["frames"]:
+                await ws_codec.send(websocket, frame)
+                last_sent = frame["seq"]
+                replayed += 1
+            
+            await ws_codec.send(websocket, {
+                "type": "resume_complete",
+                "seq": last_sent,
+                "replayed": replayed,
+                "gap": missing["gap"]
+            })
+            
+            while buffer:
+                frame = buffer.pop(0)
+                if frame.get("seq", last_sent + 1) > last_sent:
+                    await ws_codec.send(websocket, frame)
+                    last_sent = frame.get("seq", last_sent)
+        finally:
+            self._resuming.pop(websocket, None)
+    
+    @_routed
+    async def _missing_frames(self, session_id: str, last_seq: int) -> Dict[str, Any]:
+        """last_seq 之後的幀，由歸屬 worker 的廣播流提供"""
+        stream = self._stream(session_id)
+        gap = stream.has_gap(last_seq)
+        frames = []
+        
+        # 缺口超出環形緩衝區：按編號時記錄的幀序號從持久化消息日誌補發
+        if gap and session_id in self.session_messages:
+            messages = self.session_messages[session_id]
+            for position, message_seq in stream.messages_between(last_seq, stream.oldest_seq):
+                frames.append({
+                    "type": "new_message",
+                    "seq": position,
+                    "message": messages[message_seq].to_dict(),
+                    "replayed": True
+                })
+        
+        frames.extend(stream.frames_after(last_seq))
+        return {"frames": frames, "gap": gap}
+    
+    async def _deliver_to_local_connections(self, session_id: str, message: Dict[str, Any]):
+        """向本 worker 上的會話連接投遞消息（保留歸屬 worker 分配的 seq；廣播流只由歸屬 worker 記錄）"""
+        if self.broker.owns(session_id):
+            self._stream(session_id).record(message)
         if session_id not in self.websocket_connections:
             return
         
+        # 每種編碼只序列化一次
+        frame = ws_codec.EncodedFrame(message)
+        
         # 清理無效連接
         active_connections = []
         for websocket in self.websocket_connections[session_id]:
+            pending = self._resuming.get(websocket)
+            if pending is not None:
+                # 正在補發，稍後按序發送
+                pending.append(message)
+                active_connections.append(websocket)
+                continue
             try:
-                await websocket.send_json(message)
+                await frame.send(websocket)
                 active_connections.append(websocket)
             except:
                 # 連接已斷開，忽略
@@ -317,15 +1000,16 @@ class SessionManager:
         
         self.websocket_connections[session_id] = active_connections
     
+    @_routed
     async def export_session(self, session_id: str, format: str = 'json') -> Dict[str, Any]:
         """導出會話數據"""
-        if session_id not in self.session_info:
+        if not self._ensure_loaded(session_id):
             raise ValueError(f"會話不存在: {session_id}")
         
         session_data = {
             "session_info": asdict(self.session_info[session_id]),
-            "messages": [asdict(msg) for msg in self.session_messages.get(session_id, [])],
-            "replay_events": [asdict(event) for event in self.replay_events.get(session_id, [])],
+            "messages": [msg.to_dict() for msg in self.session_messages.get(session_id, [])],
+            "replay_events": [event.to_dict() for event in self.replay_events.get(session_id, [])],
             "export_timestamp": datetime.now().isoformat(),
             "format_version": "1.0"
         }
@@ -334,10 +1018,19 @@ class SessionManager:
         return session_data
 
 # 創建全局會話管理器實例
-session_manager = SessionManager()
+session_manager = SessionManager(broker=create_session_broker())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用生命週期：啟動和關閉會話管理器後台服務"""
+    await session_manager.start()
+    try:
+        yield
+    finally:
+        await session_manager.close()
 
 # FastAPI應用集成
-app = FastAPI(title="ClaudEditor Session Sharing API", version="4.5.0")
+app = FastAPI(title="ClaudEditor Session Sharing API", version="4.5.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -385,7 +1078,7 @@ async def join_session_api(session_id: str, request: Dict[str, Any]):
 
 @app.post("/api/sessions/{session_id}/messages")
 async def add_message_api(session_id: str, request: Dict[str, Any]):
-    """添加消息API"""
+    """添加消息API（message_id 為會話內的整數序號）"""
     try:
         message_id = await session_manager.add_message(
             session_id=session_id,
@@ -416,11 +1109,27 @@ async def get_messages_api(session_id: str, limit: int = 100, offset: int = 0):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/search")
+async def search_messages_api(q: str, session_id: str = None, limit: int = 20, offset: int = 0):
+    """全文檢索API（不指定 session_id 時全局檢索）"""
+    try:
+        result = await session_manager.search_messages(q, session_id, limit, offset)
+        return {
+            "status": "success",
+            "query": q,
+            **result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/sessions/{session_id}/share")
-async def generate_share_link_api(session_id: str, expire_days: int = 7):
-    """生成分享鏈接API"""
+async def generate_share_link_api(session_id: str, expire_days: int = 7, permissions: str = "view"):
+    """生成分享鏈接API（permissions 以逗號分隔，如 view,comment）"""
     try:
-        share_link = await session_manager.generate_share_link(session_id, expire_days)
+        share_link = await session_manager.generate_share_link(
+            session_id, expire_days,
+            permissions=[p.strip() for p in permissions.split(",") if p.strip()]
+        )
         return {
             "status": "success",
             "share_link": share_link,
@@ -429,6 +1138,40 @@ async def generate_share_link_api(session_id: str, expire_days: int = 7):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/share/{token}")
+async def resolve_share_link_api(request: Request, token: str):
+    """解析分享鏈接API（會話信息來自緩存視圖，不加載會話；支持 ETag / If-None-Match）"""
+    grant = session_manager.resolve_share_token(token)
+    if grant is None:
+        raise HTTPException(status_code=404, detail="分享鏈接無效或已過期")
+    
+    view = await session_manager.get_session_info_view(grant.session_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail="會話不存在")
+    
+    head = encode_json({
+        "status": "success",
+        "session_id": grant.session_id,
+        "permissions": list(grant.permissions),
+        "expires_at": datetime.fromtimestamp(grant.expires_at).isoformat()
+    })
+    body = head[:-1] + b',"session_info":' + view.body + b"}"
+    return _cached_json_response(request, body, make_etag(body))
+
+@app.get("/api/sessions/{session_id}/documents/{doc_id}")
+async def get_document_api(session_id: str, doc_id: str, runs: bool = False):
+    """獲取協作文檔API（runs=true 時附帶可見字符的 ID 段，供客戶端生成按 ID 的操作）"""
+    try:
+        document = await session_manager.get_document(session_id, doc_id, include_runs=runs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if document is None:
+        raise HTTPException(status_code=404, detail="會話不存在")
+    return {
+        "status": "success",
+        "document": document
+    }
+
 @app.get("/api/sessions/{session_id}/replay")
 async def get_replay_info_api(session_id: str, speed: float = 1.0):
     """獲取會話回放信息API"""
@@ -454,38 +1197,92 @@ async def get_replay_events_api(session_id: str, start_time: str = None, end_tim
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    """帶 ETag 的預序列化 JSON 響應；If-None-Match 命中時返回 304"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/api/sessions/public")
-async def get_public_sessions_api(limit: int = 20):
-    """獲取公開會話列表API"""
+async def get_public_sessions_api(request: Request, limit: int = 20):
+    """獲取公開會話列表API（支持 ETag / If-None-Match）"""
     try:
-        sessions = await session_manager.get_public_sessions(limit)
-        return {
-            "status": "success",
-            "sessions": sessions,
-            "total": len(sessions)
-        }
+        view = await session_manager.get_public_sessions_view(max(1, min(limit, 100)))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _cached_json_response(request, view.body, view.etag)
+
+@app.get("/api/sessions/{session_id}/online")
+async def get_online_participants_api(session_id: str, limit: int = 100, offset: int = 0):
+    """獲取在線參與者API（分頁，最近活動的在前）"""
+    result = await session_manager.get_online_participants(session_id, max(1, min(limit, 1000)), max(offset, 0))
+    return {
+        "status": "success",
+        "session_id": session_id,
+        **result
+    }
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_info_api(request: Request, session_id: str):
+    """獲取會話信息API（支持 ETag / If-None-Match）"""
+    view = await session_manager.get_session_info_view(session_id)
+    if view is None:
+        raise HTTPException(status_code=404, detail="會話不存在")
+    return _cached_json_response(
+        request, b'{"status":"success","session_info":' + view.body + b"}", view.etag
+    )
 
 @app.websocket("/ws/sessions/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    """WebSocket連接端點"""
-    await websocket.accept()
-    
-    # 將連接添加到會話
-    if session_id not in session_manager.websocket_connections:
-        session_manager.websocket_connections[session_id] = []
+async def websocket_endpoint(websocket: WebSocket, session_id: str, last_seq: Optional[int] = None,
+                             user_id: Optional[str] = None, user_name: Optional[str] = None):
+    """
+    WebSocket連接端點
+    重連時帶上 ?last_seq=<最後收到的幀序號>，服務端補發缺失的幀後再切換到實時廣播
+    子協議 claudeditor.msgpack 使用 MessagePack 二進制幀，否則使用 JSON 文本幀
+    帶上 ?user_id=&user_name= 時連接計入在線狀態，ping / typing / presence 幀作為心跳
+    """
+    codec = await ws_codec.accept(websocket)
+    if user_id:
+        user_name = user_name or user_id
+        await session_manager.participant_connected(session_id, user_id, user_name)
     
-    session_manager.websocket_connections[session_id].append(websocket)
+    if last_seq is not None:
+        await session_manager.resume_connection(session_id, websocket, last_seq)
+    else:
+        # 將連接添加到會話
+        if session_id not in session_manager.websocket_connections:
+            session_manager.websocket_connections[session_id] = []
+        
+        session_manager.websocket_connections[session_id].append(websocket)
     
     try:
         while True:
             # 接收客戶端消息
-            data = await websocket.receive_json()
+            data = await codec.receive(websocket)
             
             # 處理不同類型的消息
+            if user_id and data.get("type") in ("ping", "typing", "presence"):
+                await session_manager.participant_heartbeat(session_id, user_id, user_name)
+            
             if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+                await codec.send(websocket, {"type": "pong"})
+            elif data.get("type") in ("typing", "presence"):
+                await session_manager.update_presence(session_id, data)
+            elif data.get("type") == "resume":
+                await session_manager.resume_connection(session_id, websocket, int(data.get("last_seq", -1)))
+            elif data.get("type") == "crdt_op":
+                doc_id = str(data.get("doc_id", "main"))
+                try:
+                    result = await session_manager.apply_document_ops(
+                        session_id, doc_id, str(data.get("user_id") or user_id or "anonymous"), data.get("ops", [])
+                    )
+                    await codec.send(websocket, {"type": "crdt_ack", **result})
+                    if result["rejected"]:
+                        # 錨點已被壓縮清除或尚未同步，客戶端需重新拉取文檔
+                        await codec.send(websocket, {"type": "crdt_resync", "doc_id": doc_id})
+                except ValueError as e:
+                    await codec.send(websocket, {"type": "error", "message": str(e)})
             elif data.get("type") == "message":
                 # 廣播消息給其他用戶
                 await session_manager._broadcast_to_session(session_id, data)
@@ -494,7 +1291,21 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         # 移除斷開的連接
         if websocket in session_manager.websocket_connections[session_id]:
             session_manager.websocket_connections[session_id].remove(websocket)
+    finally:
+        if user_id:
+            await session_manager.participant_disconnected(session_id, user_id)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8083, log_level="info")
\ No newline at end of file
+    workers = int(os.environ.get("SESSION_WORKERS", "1"))
+    if workers > 1:
+        # 每個會話歸一個 worker 所有：worker 之間經 Unix socket 代理轉發請求和廣播（worker 進程繼承環境變量）
+        os.environ["SESSION_BROKER"] = "unix"
+    uvicorn.run(
+        "session_sharing_backend:app",
+        host="0.0.0.0",
+        port=8083,
+        log_level="info",
+        workers=workers,
+        ws_per_message_deflate=ws_codec.per_message_deflate_enabled()
+    )
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+會話廣播流 - WebSocket 斷線重連的增量同步
+每個廣播幀帶有會話內遞增的 seq，最近的幀保存在環形緩衝區中；
+客戶端重連時提交最後看到的 seq，服務端只補發缺失的幀，超出緩衝區的部分從持久化消息日誌補齊
+"""
+
+import bisect
+from array import array
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple
+
+
+class SessionStream:
+    """
+    單個會話的廣播流
+    - next_seq: 下一個廣播幀的序號
+    - ring: 最近廣播幀 (seq, frame) 的環形緩衝區
+    - frame_seqs / message_seqs: 攜帶消息的廣播幀序號（遞增）和對應的消息序號，編號時記錄，
+      用於超出緩衝區時從消息日誌補發；沒有廣播過的消息（系統消息、被合併掉的進度）沒有幀序號，不補發
+    """
+    __slots__ = ("next_seq", "ring", "frame_seqs", "message_seqs")
+
+    def __init__(self, ring_size: int = 1024, next_seq: int = 0, message_index: bytes = b""):
+        self.next_seq = next_seq
+        self.ring: deque = deque(maxlen=ring_size)
+        self.frame_seqs = array("I")
+        self.message_seqs = array("I")
+        if message_index:
+            # 持久化格式：(幀序號, 消息序號) 交替排列
+            pairs = array("I")
+            pairs.frombytes(message_index)
+            self.frame_seqs = pairs[0::2]
+            self.message_seqs = pairs[1::2]
+
+    def stamp(self, frame: Dict[str, Any]) -> Dict[str, Any]:
+        """為廣播幀分配序號"""
+        frame["seq"] = self.next_seq
+        self.next_seq += 1
+        return frame
+
+    def record(self, frame: Dict[str, Any]):
+        """
+        記錄已投遞的幀，保留幀上的 seq（next_seq 不會落後於已記錄的幀）；
+        重複或過期的幀（seq 不大於緩衝區中最新的 seq）不再記錄
+        """
+        seq = frame.get("seq")
+        if seq is None:
+            return
+        if self.ring and seq <= self.ring[-1][0]:
+            return
+        self.ring.append((seq, frame))
+        if seq >= self.next_seq:
+            self.next_seq = seq + 1
+
+    def note_message(self, seq: int, message_seq: int):
+        """記錄編號為 seq 的廣播幀攜帶的消息"""
+        self.frame_seqs.append(seq)
+        self.message_seqs.append(message_seq)
+
+    @property
+    def oldest_seq(self) -> int:
+        return self.ring[0][0] if self.ring else self.next_seq
+
+    def frames_after(self, last_seq: int) -> List[Dict[str, Any]]:
+        """緩衝區中 seq 大於 last_seq 的幀"""
+        return [frame for seq, frame in self.ring if seq > last_seq]
+
+    def has_gap(self, last_seq: int) -> bool:
+        """客戶端缺失的幀是否已經被擠出緩衝區"""
+        return last_seq + 1 < self.oldest_seq
+
+    def messages_between(self, last_seq: int, before: int) -> List[Tuple[int, int]]:
+        """幀序號在 (last_seq, before) 之間的消息幀：[(幀序號, 消息序號)]"""
+        start = bisect.bisect_right(self.frame_seqs, last_seq)
+        stop = bisect.bisect_left(self.frame_seqs, before, start)
+        return list(zip(self.frame_seqs[start:stop], self.message_seqs[start:stop]))
+
+    def message_index(self) -> bytes:
+        pairs = array("I", bytes(8 * len(self.frame_seqs)))
+        pairs[0::2] = self.frame_seqs
+        pairs[1::2] = self.message_seqs
+        return pairs.tobytes()
+
+    def state(self) -> Dict[str, Any]:
+        return {"next_seq": self.next_seq}
@@ -0,0 +1,90 @@
+"""
+會話信息視圖緩存
+儀表盤持續輪詢會話信息和公開會話列表；每個會話保存一份預序列化的 JSON 和 ETag，
+只在參與者、標題或計數變化時失效，未變化的輪詢只需比較 ETag 並返回 304
+"""
+
+import json
+import hashlib
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+
+def encode_json(data: Any) -> bytes:
+    """與 Starlette JSONResponse 相同的編碼方式"""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否包含當前 ETag（忽略弱校驗前綴 W/）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def public_list_body(items: List[bytes]) -> bytes:
+    """公開會話列表的響應：按順序拼接會話視圖 JSON"""
+    return b'{"status":"success","sessions":[' + b",".join(items) + b'],"total":%d}' % len(items)
+
+
+class CachedView:
+    """一份預序列化的 JSON 及其 ETag"""
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = make_etag(body)
+
+
+class SessionInfoViews:
+    """
+    會話信息視圖緩存
+    - get(): 返回會話的緩存視圖，失效後調用 build 重新序列化
+    - invalidate(): 會話信息變化時調用；公開會話變化時同時使公開列表失效
+    - public_list(): 公開會話列表視圖，按 limit 緩存到下一次公開會話變化
+    """
+
+    def __init__(self):
+        self._views: Dict[str, CachedView] = {}
+        self._public_generation = 0
+        self._public_lists: Dict[int, Tuple[int, CachedView]] = {}
+
+    def peek(self, session_id: str) -> Optional[CachedView]:
+        return self._views.get(session_id)
+
+    def get(self, session_id: str, build: Callable[[], Dict[str, Any]]) -> CachedView:
+        view = self._views.get(session_id)
+        if view is None:
+            view = self._views[session_id] = CachedView(encode_json(build()))
+        return view
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> CachedView:
+        view = self._views[session_id] = CachedView(encode_json(data))
+        return view
+
+    def invalidate(self, session_id: str, public: bool):
+        self._views.pop(session_id, None)
+        if public:
+            self._public_generation += 1
+
+    def forget(self, session_id: str):
+        """釋放會話視圖（不影響內容，例如私有會話被卸載）"""
+        self._views.pop(session_id, None)
+
+    def public_list(self, limit: int, build: Callable[[], List[bytes]]) -> CachedView:
+        """build 返回按最後活躍時間排序的會話視圖 JSON 列表"""
+        cached = self._public_lists.get(limit)
+        if cached is not None and cached[0] == self._public_generation:
+            return cached[1]
+        view = CachedView(public_list_body(build()))
+        if len(self._public_lists) >= 32:
+            self._public_lists.clear()
+        self._public_lists[limit] = (self._public_generation, view)
+        return view
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 根目錄的 session_* 模塊和 api/ 下的模塊都按扁平方式導入
+for path in (ROOT, os.path.join(ROOT, "api")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Flask 應用（api/src）的模塊同樣按扁平方式導入（main、routes、smartui_cache 等）
+if os.path.join(ROOT, "api", "src") not in sys.path:
+    sys.path.append(os.path.join(ROOT, "api", "src"))
+
+
+@pytest.fixture
+def make_manager(tmp_path):
+    """
+    創建使用臨時目錄的 SessionManager；可多次調用，同一測試內的管理器共用存儲目錄（模擬重啟）
+    關鍵字參數傳給 SessionRetentionManager，broker 參數傳給 SessionManager
+    """
+    from session_retention import SessionRetentionManager
+    from session_share import ShareTokenStore
+    from session_sharing_backend import SessionManager
+
+    def make(broker=None, **retention_options):
+        return SessionManager(
+            broker=broker,
+            retention=SessionRetentionManager(str(tmp_path / "sessions"), **retention_options),
+            share_tokens=ShareTokenStore(str(tmp_path / "tokens.db"))
+        )
+
+    return make
+
+
+class FakeWebSocket:
+    """只記錄發送的 JSON 文本幀"""
+
+    def __init__(self):
+        self.state = SimpleNamespace()
+        self.frames = []
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+
+@pytest.fixture
+def make_websocket():
+    """創建記錄發送幀的假 WebSocket"""
+    return FakeWebSocket
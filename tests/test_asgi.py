@@ -0,0 +1,139 @@
+"""
+ASGI 入口测试：调用模型的路由由 FastAPI 原生处理（不经过后台事件循环），响应与 Flask 蓝图一致；
+其余路由经 WSGI 适配器转发给 Flask 应用，路径和响应不变
+"""
+
+import dataclasses
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from flask import Flask
+
+import smartui_cache
+from asgi import create_asgi_app
+from routes import ai_assistant, smartui
+from routes.ai_assistant import ai_assistant_bp
+from routes.smartui import smartui_bp
+from smartui_cache import SmartUIPrecomputed
+
+
+@dataclasses.dataclass
+class Config:
+    device_type: SimpleNamespace
+    breakpoint: SimpleNamespace
+    viewport_width: int
+    viewport_height: int
+    layout_columns: int = 2
+    sidebar_width: int = 240
+    header_height: int = 56
+    touch_optimized: bool = False
+    font_scale: float = 1.0
+    spacing_scale: float = 1.0
+
+
+class StubManager:
+    """宽度小于 600 为手机，其余为桌面的 SmartUI 管理器"""
+
+    async def detect_device_and_configure(self, width, height, user_agent):
+        device = "mobile" if width < 600 else "desktop"
+        return Config(SimpleNamespace(value=device), SimpleNamespace(value="sm" if width < 600 else "lg"),
+                      width, height, layout_columns=1 if width < 600 else 3)
+
+    async def generate_responsive_css(self, config):
+        return f".root{{--device:{config.device_type.value}}}"
+
+    def get_current_config(self):
+        return None
+
+    def get_device_configs(self):
+        return {}
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """(ASGI 客户端, Flask 客户端)，共用同一个 Flask 应用和断点表"""
+    monkeypatch.setattr(smartui_cache, "PRECOMPUTE_ENABLED", False)
+    precomputed = SmartUIPrecomputed()
+    monkeypatch.setattr(smartui, "get_precomputed", lambda: precomputed)
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(ai_assistant_bp)
+    flask_app.register_blueprint(smartui_bp)
+    return TestClient(create_asgi_app(flask_app)), flask_app.test_client()
+
+
+def _no_background_loop(monkeypatch):
+    """原生路由不应经过 Flask 蓝图的后台事件循环"""
+    def fail(coro, timeout=None):
+        coro.close()
+        raise AssertionError("ASGI 路由经过了后台事件循环")
+
+    monkeypatch.setattr(smartui, "run_async", fail)
+    monkeypatch.setattr(ai_assistant, "run_async", fail)
+
+
+@pytest.mark.parametrize("body", [
+    None,
+    {"prompt": "hi"},
+    {"task_type": "code_generation", "prompt": "hi"},
+])
+def test_process_matches_flask(clients, body):
+    asgi, flask = clients
+    expected = flask.post("/api/ai-assistant/process", json=body) if body is not None else \
+        flask.post("/api/ai-assistant/process", data="not json", content_type="application/json")
+    response = asgi.post("/api/ai-assistant/process", json=body) if body is not None else \
+        asgi.post("/api/ai-assistant/process", content="not json", headers={"Content-Type": "application/json"})
+    assert (response.status_code, response.json()) == (expected.status_code, expected.get_json())
+    assert response.status_code in (400, 500)
+
+
+def test_configure_is_native_and_honours_etag(clients, monkeypatch):
+    asgi, flask = clients
+    monkeypatch.setattr(smartui, "get_smartui_manager", lambda: StubManager())
+    expected = flask.post("/api/smartui/configure", json={"viewport_width": 390, "viewport_height": 844})
+
+    _no_background_loop(monkeypatch)
+    response = asgi.post("/api/smartui/configure", json={"viewport_width": 390, "viewport_height": 844})
+    assert response.status_code == 200
+    assert response.json() == expected.get_json()
+    assert response.headers["etag"] == expected.headers["ETag"]
+
+    # 同一断点内的视口变化：If-None-Match 命中返回不带正文的 304
+    unchanged = asgi.post("/api/smartui/reconfigure", json={"viewport_width": 400, "viewport_height": 800},
+                          headers={"If-None-Match": response.headers["etag"]})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["etag"] == response.headers["etag"]
+    changed = asgi.post("/api/smartui/reconfigure", json={"viewport_width": 1400, "viewport_height": 900},
+                        headers={"If-None-Match": response.headers["etag"]})
+    assert changed.status_code == 200 and changed.json()["device_type"] == "desktop"
+
+    # CSS 资源由 Flask 路由提供，与原生路由共用断点表
+    css = asgi.get(response.json()["css_url"])
+    assert css.status_code == 200 and css.text == ".root{--device:mobile}"
+    assert css.headers["content-type"].startswith("text/css")
+
+
+def test_fallback_responses_match_flask(clients, monkeypatch):
+    asgi, flask = clients
+    monkeypatch.setattr(smartui, "get_smartui_manager", lambda: None)
+    expected = {path: flask.post(path, json={}).get_json()
+                for path in ("/api/smartui/configure", "/api/smartui/reconfigure", "/api/smartui/ag-ui-guidance")}
+    expected["/api/smartui/test"] = flask.get("/api/smartui/test").get_json()
+
+    _no_background_loop(monkeypatch)
+    for path, body in expected.items():
+        response = asgi.get(path) if path.endswith("/test") else asgi.post(path, json={})
+        assert (response.status_code, response.json()) == (200, body)
+
+
+def test_other_routes_pass_through_to_flask(clients, monkeypatch):
+    asgi, flask = clients
+    monkeypatch.setattr(smartui, "get_smartui_manager", lambda: None)
+    for path in ("/api/smartui/status", "/api/ai-assistant/task-types", "/api/smartui/css/missing.css"):
+        expected = flask.get(path)
+        response = asgi.get(path)
+        assert (response.status_code, response.json()) == (expected.status_code, expected.get_json())
+    assert asgi.get("/api/smartui/status").json()["status"]["smartui_available"] is False
+    assert asgi.get("/api/smartui/css/missing.css").status_code == 404
+    # 原生路由只注册了 POST：其他方法仍由 Flask 按原来的方式拒绝
+    assert asgi.get("/api/smartui/configure").status_code == flask.get("/api/smartui/configure").status_code == 405
@@ -0,0 +1,100 @@
+"""
+后台事件循环测试：多次调用复用同一个循环，超时取消协程，fork 后的子进程重新启动循环，停止时取消未完成的任务
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from background_loop import BackgroundLoop
+
+
+@pytest.fixture
+def background():
+    loop = BackgroundLoop(name="test-background-loop")
+    yield loop
+    loop.stop()
+
+
+async def _where():
+    return id(asyncio.get_running_loop()), threading.current_thread().name
+
+
+def test_runs_share_one_loop_and_its_objects(background):
+    first = background.run(_where(), timeout=5)
+    queue = background.run(_make_queue(), timeout=5)
+    background.run(queue.put("from the first request"), timeout=5)
+    # 绑定在循环上的对象可以跨调用使用
+    assert background.run(queue.get(), timeout=5) == "from the first request"
+    assert background.run(_where(), timeout=5) == first
+    assert first[1] == "test-background-loop" and background.running
+
+
+async def _make_queue():
+    return asyncio.Queue()
+
+
+def test_timeout_cancels_coroutine(background):
+    cancelled = threading.Event()
+
+    async def hang():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        background.run(hang(), timeout=0.1)
+    assert time.monotonic() - started < 5
+    assert cancelled.wait(5)
+    # 超时不影响之后的调用
+    assert background.run(_where(), timeout=5)[1] == "test-background-loop"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_forked_child_starts_its_own_loop(background):
+    parent = background.run(_where(), timeout=5)
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # 子进程没有父进程的循环线程：首次使用时在子进程中重新启动
+            result = {"running_before": background.running, "where": background.run(_where(), timeout=5),
+                      "pid": os.getpid()}
+            os.write(write_end, json.dumps(result).encode())
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        child = json.loads(pipe.read())
+    os.waitpid(pid, 0)
+
+    assert child["running_before"] is False
+    assert child["where"][1] == "test-background-loop" and child["pid"] == pid
+    # 父进程的循环不受影响
+    assert background.run(_where(), timeout=5) == parent
+
+
+def test_stop_cancels_pending_tasks_and_restarts_on_demand(background):
+    cancelled = threading.Event()
+
+    async def pending():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = background.start()
+    future = background.submit(pending())
+    background.stop()
+    assert cancelled.is_set() and future.cancelled()
+    assert not background.running
+    # 停止后再次使用时启动新的循环
+    assert background.start() is not first and background.running
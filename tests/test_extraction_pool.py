@@ -0,0 +1,72 @@
+"""
+提取進程池測試：超時的任務連同工作進程一起被終止，之後的提取使用新的進程池
+"""
+
+import asyncio
+import time
+
+import pytest
+
+import extraction_pool
+from extraction_pool import ExtractionPool, ExtractionTimeout
+from html_extractor import extract_bytes
+
+PAGE = b"<html><head><title>Small</title></head><body><article><p>Hello pool</p></article></body></html>"
+
+
+def _extract_or_hang(data, charset=None, max_text_chars=0):
+    """在工作進程中運行：正文為 b"hang" 時模擬卡住的頁面"""
+    if data == b"hang":
+        time.sleep(60)
+    return extract_bytes(data, charset, max_text_chars)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(extraction_pool, "extract_bytes", _extract_or_hang)
+    pool = ExtractionPool(workers=1, timeout=1.0, inline_threshold=0)
+    pool.warm_up()
+    yield pool
+    pool.shutdown()
+
+
+def test_timeout_terminates_hung_worker(pool):
+    workers = list(pool._executor._processes.values())
+
+    async def run():
+        with pytest.raises(ExtractionTimeout):
+            await pool.extract(b"hang")
+        return await pool.extract(PAGE)
+
+    started = time.monotonic()
+    extracted = asyncio.run(run())
+    assert time.monotonic() - started < 30
+    assert extracted.title == "Small"
+    assert pool.recycled == 1
+
+    for process in workers:
+        process.join(5)
+        assert not process.is_alive()
+    assert not set(pool._executor._processes) & {process.pid for process in workers}
+
+
+def test_tasks_on_recycled_pool_are_retried(monkeypatch):
+    monkeypatch.setattr(extraction_pool, "extract_bytes", _extract_or_hang)
+    pool = ExtractionPool(workers=2, timeout=1.0, inline_threshold=0)
+    pool.warm_up()
+
+    async def run():
+        hung = asyncio.ensure_future(pool.extract(b"hang"))
+        await asyncio.sleep(0)
+        executor = pool._executor
+        # 模擬另一個任務仍在被回收的進程池中：回收後重新提交到新進程池
+        pool._recycle(executor)
+        result = await pool.extract(PAGE)
+        with pytest.raises(ExtractionTimeout):
+            await hung
+        return result
+
+    try:
+        assert asyncio.run(run()).title == "Small"
+    finally:
+        pool.shutdown()
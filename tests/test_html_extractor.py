@@ -0,0 +1,76 @@
+"""
+html_extractor 增量分詞器測試：分塊輸入與一次輸入結果一致，病態輸入保持線性
+"""
+
+import time
+
+from html_extractor import MAX_TAG_LENGTH, HTMLContentExtractor, extract_html
+
+PAGE = (
+    "<!DOCTYPE html><html><head><title>Fixture</title>"
+    '<meta name="description" content="desc &amp; more"></head><body>'
+    "<!-- comment > with gt --><nav>Home | About</nav>"
+    '<article><h1>Heading</h1><p title="a>b">' + "A paragraph long enough to keep. " * 20 + "</p>"
+    '<a href="/next?a=1&amp;b=2">next</a><p>3 &lt; 4 and 5 < 6 in running text here</p>'
+    '<script>if (a<b) { x = "</div>"; }</script></article></body></html>'
+)
+
+
+def _feed(document, size):
+    extractor = HTMLContentExtractor()
+    for start in range(0, len(document), size):
+        extractor.feed(document[start:start + size])
+    return extractor
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - started
+
+
+def test_chunked_feed_matches_single_feed():
+    expected = extract_html(PAGE)
+    assert expected.title == "Fixture"
+    assert expected.main_candidate == "article"
+    assert expected.links == ["/next?a=1&b=2"]
+    assert "5 < 6" in expected.text
+    for size in (1, 2, 3, 7, 64, 1000):
+        result = _feed(PAGE, size).result()
+        assert (result.title, result.text, result.links, result.main_candidate) == (
+            expected.title, expected.text, expected.links, expected.main_candidate), size
+
+
+def test_unclosed_tag_starts_are_linear():
+    # 大量 "<字母" 且後面沒有 >：純文本或被截斷的正文
+    def document(n):
+        return "<html><body><p>" + "a <b " * n
+
+    small, large = document(20000), document(80000)
+    small_seconds = _timed(extract_html, small)
+    large_seconds = _timed(lambda: _feed(large, 65536).result())
+    # 原實現 40 KB 需要數十秒；線性實現 400 KB 遠低於 1 秒
+    assert large_seconds < 2.0
+    assert large_seconds < max(small_seconds, 0.005) * 12
+    assert extract_html(small).text.startswith("a <b a <b")
+
+
+def test_pending_tail_is_bounded():
+    extractor = HTMLContentExtractor()
+    for _ in range(20):
+        extractor.feed("a <b " * 10000)
+        assert len(extractor._pending) <= MAX_TAG_LENGTH
+
+
+def test_unbalanced_quotes_are_linear():
+    for document in ('<html><body><p>a "<b "' * 20000 + ">", '<a x="' * 40000 + ">", "<!-- >" * 40000):
+        assert _timed(extract_html, document) < 2.0
+
+
+def test_tag_split_across_chunks():
+    extractor = HTMLContentExtractor()
+    for part in ("<html><body><art", 'icle class="x"><p>', "Text that is long enough", "</p></arti", "cle></body>"):
+        extractor.feed(part)
+    result = extractor.result()
+    assert result.main_candidate == "article"
+    assert result.text == "Text that is long enough"
@@ -0,0 +1,43 @@
+"""
+共享 HTTP 客戶端測試：同一事件循環內復用會話，事件循環關閉時連接池隨之關閉
+"""
+
+import asyncio
+
+from background_loop import BackgroundLoop
+from http_pool import SharedHTTPClient
+
+
+def test_session_reused_and_closed_with_asyncio_run():
+    client = SharedHTTPClient()
+
+    async def run():
+        first = await client.session()
+        assert await client.session() is first
+        return first
+
+    session = asyncio.run(run())
+    assert session.closed
+
+
+def test_session_closed_when_background_loop_stops():
+    client = SharedHTTPClient()
+    loop = BackgroundLoop(name="test-http-pool")
+    session = loop.run(client.session(), timeout=5)
+    assert not session.closed
+    loop.stop()
+    assert session.closed
+
+
+def test_explicit_close_and_reopen():
+    client = SharedHTTPClient()
+
+    async def run():
+        first = await client.session()
+        await client.close()
+        second = await client.session()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.closed and second.closed
+    assert first is not second
@@ -0,0 +1,43 @@
+"""
+near_duplicate 測試：指紋與進程無關，近似的正文指紋相近，分段索引找到距離內最近的指紋
+"""
+
+import os
+import subprocess
+import sys
+
+from near_duplicate import SimHashIndex, hamming_distance, simhash
+
+WORDS = [f"word{i}" for i in range(400)]
+TEXT = " ".join(WORDS)
+
+
+def test_fingerprint_is_stable_across_processes():
+    code = "import sys; sys.path.insert(0, sys.argv[1]); from near_duplicate import simhash; print(simhash(sys.argv[2]))"
+    api = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api")
+    outputs = {
+        subprocess.run([sys.executable, "-c", code, api, TEXT], capture_output=True, text=True, check=True,
+                       env=dict(os.environ, PYTHONHASHSEED=seed)).stdout.strip()
+        for seed in ("1", "2")
+    }
+    assert outputs == {str(simhash(TEXT))}
+
+
+def test_similar_texts_have_close_fingerprints():
+    edited = " ".join(WORDS[:200] + ["changed"] + WORDS[201:])
+    unrelated = " ".join(f"other{i}" for i in range(400))
+    assert hamming_distance(simhash(TEXT), simhash(edited)) <= 3
+    assert hamming_distance(simhash(TEXT), simhash(unrelated)) > 10
+    assert simhash("too short", min_tokens=50) is None
+
+
+def test_index_finds_nearest_within_distance():
+    index = SimHashIndex(max_distance=2)
+    index.add("a", 0b1111)
+    index.add("b", 0b0111)
+    assert index.find(0b0111) == ("b", 0)
+    assert index.find(0b0111, exclude="b") == ("a", 1)
+    assert index.find(0b0111, accept=lambda key, distance: key != "b") == ("a", 1)
+    assert index.find(0b1111 ^ (0b111 << 40)) is None
+    index.remove("a")
+    assert index.find(0b1111, exclude="b") is None
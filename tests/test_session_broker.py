@@ -0,0 +1,178 @@
+"""
+會話代理測試：worker 槽位和對等發現、調用轉發到歸屬 worker、移除不可達的 worker；
+兩個 SessionManager 共用存儲目錄，請求落在任一 worker 上結果一致
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from session_broker import OwnerUnavailable, UnixSocketSessionBroker
+
+
+def _session_owned_by(broker, worker_id):
+    return next(f"s-{i}" for i in range(1000) if broker.owner_of(f"s-{i}") == worker_id)
+
+
+async def _start(socket_dir, count, workers=None):
+    """啟動 count 個 broker，每個記錄收到的事件，調用處理器返回 [執行調用的 worker, 方法, 位置參數, 關鍵字參數]"""
+    brokers, received = [], []
+    for _ in range(count):
+        broker = UnixSocketSessionBroker(str(socket_dir), workers=workers or count, call_timeout=2)
+        events = []
+
+        async def deliver(session_id, event, events=events):
+            events.append((session_id, event))
+
+        async def serve(method, args, kwargs, broker=broker):
+            if method == "fail":
+                raise ValueError("會話不存在")
+            return [broker.worker_id, method, args, kwargs]
+
+        broker.set_handler(deliver)
+        broker.set_request_handler(serve)
+        await broker.start()
+        brokers.append(broker)
+        received.append(events)
+    for broker in brokers:
+        await broker._refresh_peers(force=True)
+    return brokers, received
+
+
+def test_workers_claim_slots_and_discover_peers(tmp_path):
+    async def run():
+        brokers, _ = await _start(tmp_path, 3)
+        ids = [broker.worker_id for broker in brokers]
+        peers = [sorted(broker._peers) for broker in brokers]
+
+        # 槽位已滿：第四個 worker 無法啟動
+        extra = UnixSocketSessionBroker(str(tmp_path), workers=3)
+        with pytest.raises(RuntimeError):
+            await extra.start()
+
+        # worker 退出後，新進程接管同一個槽位
+        await brokers[1].close()
+        replacement = UnixSocketSessionBroker(str(tmp_path), workers=3)
+        await replacement.start()
+        rejoined = replacement.worker_id
+        await replacement._refresh_peers(force=True)
+        replacement_peers = sorted(replacement._peers)
+        for broker in (brokers[0], brokers[2], replacement):
+            await broker.close()
+        return ids, peers, rejoined, replacement_peers
+
+    ids, peers, rejoined, replacement_peers = asyncio.run(run())
+    assert ids == ["worker-0", "worker-1", "worker-2"]
+    assert peers == [["worker-1", "worker-2"], ["worker-0", "worker-2"], ["worker-0", "worker-1"]]
+    assert rejoined == "worker-1" and replacement_peers == ["worker-0", "worker-2"]
+
+
+def test_calls_and_broadcasts_go_to_owner(tmp_path):
+    async def run():
+        brokers, received = await _start(tmp_path, 2)
+        for index, broker in enumerate(brokers):
+            broker.set_stamper(lambda session_id, event, index=index: {**event, "stamped_by": index})
+        session_id = _session_owned_by(brokers[0], "worker-1")
+
+        remote = await brokers[0].call(session_id, "join", [session_id, "u1"], {"user_name": "Alice"})
+        local = await brokers[1].call(session_id, "join", [session_id, "u2"])
+        with pytest.raises(ValueError, match="會話不存在"):
+            await brokers[0].call(session_id, "fail", [session_id])
+        everyone = await brokers[0].call_all("list", [20])
+
+        await brokers[0].broadcast(session_id, {"type": "message"})
+        await asyncio.sleep(0.2)
+        for broker in brokers:
+            await broker.close()
+        return remote, local, everyone, received
+
+    remote, local, everyone, received = asyncio.run(run())
+    assert [remote[0], local[0]] == ["worker-1", "worker-1"]
+    assert remote[1:] == ["join", [remote[2][0], "u1"], {"user_name": "Alice"}]
+    assert [result[0] for result in everyone] == ["worker-0", "worker-1"]
+    # 非歸屬 worker 發起的廣播由歸屬 worker 編號，再扇出到所有 worker
+    assert [[event for _, event in events] for events in received] == [[{"type": "message", "stamped_by": 1}]] * 2
+
+
+def test_dead_peer_is_dropped(tmp_path):
+    async def run():
+        brokers, received = await _start(tmp_path, 3)
+        survivor, dead, other = brokers
+        session_id = _session_owned_by(survivor, "worker-1")
+        await dead.close()
+        await asyncio.sleep(0.1)
+
+        # 連接斷開後該 worker 被移除，其他 worker 的發布和調用不受影響
+        dropped = "worker-1" not in survivor._peers
+        await survivor.publish("s-other", {"type": "ping"})
+        with pytest.raises(OwnerUnavailable):
+            await survivor.call(session_id, "join", [session_id])
+        with pytest.raises(OwnerUnavailable):
+            await survivor.broadcast(session_id, {"type": "message"})
+        reachable = [result[0] for result in await survivor.call_all("list", [])]
+        await asyncio.sleep(0.1)
+        for broker in (survivor, other):
+            await broker.close()
+        return dropped, reachable, received
+
+    dropped, reachable, received = asyncio.run(run())
+    assert dropped
+    assert reachable == ["worker-0", "worker-2"]
+    assert received[0] == received[2] == [("s-other", {"type": "ping"})]
+
+
+def test_managers_route_requests_to_owner(make_manager, make_websocket, tmp_path):
+    async def run():
+        managers = [make_manager(broker=UnixSocketSessionBroker(str(tmp_path / "broker"), workers=2))
+                    for _ in range(2)]
+        for manager in managers:
+            await manager.start()
+        for manager in managers:
+            await manager.broker._refresh_peers(force=True)
+        first, second = managers
+
+        # 每個 worker 各歸屬一個公開會話；所有請求都從 first 發起
+        created, owned = [], {}
+        while len(owned) < 2:
+            session_id = await first.create_session("u1", "Alice", is_public=True)
+            created.append(session_id)
+            owned.setdefault(first.broker.owner_of(session_id), session_id)
+        remote_id = owned[second.broker.worker_id]
+        for session_id in owned.values():
+            assert await first.join_session(session_id, "u2", "Bob")
+            await first.add_message(session_id, "u1", "Alice", "user", f"deploy {session_id}")
+
+        websocket = make_websocket()
+        await first.resume_connection(remote_id, websocket, -1)
+        await first.add_message(remote_id, "u2", "Bob", "user", "live")
+        await asyncio.sleep(0.2)
+
+        view = await first.get_session_info_view(remote_id)
+        public = await first.get_public_sessions_view(10)
+        search = await first.search_messages("deploy")
+        messages = await first.get_session_messages(remote_id)
+        token = (await first.generate_share_link(remote_id)).rsplit("/", 1)[1]
+        grant = second.resolve_share_token(token)
+        loaded = [sorted(manager.session_info) for manager in managers]
+        expected = [sorted(sid for sid in created if manager.broker.owns(sid)) for manager in managers]
+
+        for manager in managers:
+            await manager.close()
+        return (created, owned.values(), remote_id, websocket.frames, view, public, search, messages, grant,
+                loaded, expected)
+
+    (created, owned, remote_id, frames, view, public, search, messages, grant,
+     loaded, expected) = asyncio.run(run())
+    # 會話只在歸屬 worker 上加載
+    assert loaded == expected and all(loaded)
+    assert [message["content"] for message in messages] == ["🎉 Bob 加入了會話", f"deploy {remote_id}", "live"]
+    # 歸屬 worker 編號的幀補發到 first 上的連接，之後的實時幀接著編號
+    *replayed, complete, live = frames
+    assert [frame["seq"] for frame in replayed] == [0]
+    assert complete == {"type": "resume_complete", "seq": 0, "replayed": 1, "gap": False}
+    assert live["seq"] == 1 and live["message"]["content"] == "live"
+    assert b'"participant_count":2' in view.body
+    assert sorted(session["session_id"] for session in json.loads(public.body)["sessions"]) == sorted(created)
+    assert search["total"] == 2 and {hit["session_id"] for hit in search["results"]} == set(owned)
+    assert grant is not None and grant.session_id == remote_id
@@ -0,0 +1,84 @@
+"""
+高頻事件合併測試：窗口內按 key 只保留最新幀、每個 key 單獨計數，窗口結束自動發送，未配置的類型不合併
+"""
+
+import asyncio
+
+from session_coalescer import EventCoalescer
+
+
+def _collect(windows):
+    bursts = []
+
+    async def flush(burst):
+        bursts.append(burst)
+
+    return EventCoalescer(windows, flush), bursts
+
+
+def test_window_keeps_latest_frame_per_key():
+    coalescer, bursts = _collect({"progress": 0.05})
+
+    async def run():
+        for percent in (10, 20, 30):
+            coalescer.submit("s1", "progress", "task-a", {"task": "a", "percent": percent})
+        coalescer.submit("s1", "progress", "task-b", {"task": "b", "percent": 50})
+        coalescer.submit("s2", "progress", "task-a", {"task": "a", "percent": 99})
+        assert bursts == []
+        await asyncio.sleep(0.15)
+
+    asyncio.run(run())
+    by_session = {burst.session_id: burst for burst in bursts}
+    assert len(bursts) == 2
+    burst = by_session["s1"]
+    assert burst.kind == "progress"
+    assert burst.updates == [{"task": "a", "percent": 30}, {"task": "b", "percent": 50}]
+    assert burst.counts == [3, 1]
+    assert burst.count == 4
+    assert by_session["s2"].counts == [1]
+
+
+def test_window_flushes_and_next_window_starts_fresh():
+    coalescer, bursts = _collect({"presence": 0.05})
+
+    async def run():
+        coalescer.submit("s1", "presence", "u1", {"n": 1})
+        await asyncio.sleep(0.15)
+        coalescer.submit("s1", "presence", "u1", {"n": 2})
+        coalescer.submit("s1", "presence", "u1", {"n": 3})
+        # flush_all 立即發送未結束的窗口
+        await coalescer.flush_all()
+
+    asyncio.run(run())
+    assert [(burst.updates, burst.counts) for burst in bursts] == [([{"n": 1}], [1]), ([{"n": 3}], [2])]
+    assert bursts[1].duration >= 0
+
+
+def test_unconfigured_kinds_are_not_coalesced():
+    coalescer, _ = _collect({"progress": 0.05, "presence": 0})
+    assert coalescer.handles("progress")
+    assert not coalescer.handles("presence")
+    assert not coalescer.handles("message")
+
+
+def test_manager_marks_coalesced_count_per_key(make_manager, make_websocket):
+    manager = make_manager()
+    manager.coalescer = EventCoalescer({"progress": 0.05}, manager._flush_coalesced)
+    websocket = make_websocket()
+
+    async def run():
+        session_id = await manager.create_session("u1", "Alice")
+        manager.websocket_connections[session_id].append(websocket)
+        for step in range(3):
+            await manager.add_message(session_id, "agent", "Agent", "progress", f"a{step}", {"task_id": "a"})
+        await manager.add_message(session_id, "agent", "Agent", "progress", "b0", {"task_id": "b"})
+        # presence 沒有配置窗口：直接廣播，不帶 coalesced
+        await manager.update_presence(session_id, {"type": "typing", "user_id": "u1"})
+        await asyncio.sleep(0.15)
+        return await manager.get_replay_events(session_id)
+
+    events = asyncio.run(run())
+    typing, *progress = websocket.frames
+    assert typing == {"type": "typing", "user_id": "u1", "seq": 0}
+    assert [(frame["message"]["content"], frame.get("coalesced")) for frame in progress] == [("a2", 3), ("b0", None)]
+    assert events[-1]["event_type"] == "task_progress" and events[-1]["data"]["count"] == 4
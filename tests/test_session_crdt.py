@@ -0,0 +1,97 @@
+"""
+協作文檔 CRDT 測試：併發操作按任意順序到達都收斂，重複操作冪等，未知錨點被拒絕，壓縮和快照保持內容
+"""
+
+import itertools
+
+from session_crdt import CRDTDocument, SessionDocumentStore
+from session_retention import SessionRetentionManager
+
+
+def _replicas(text, *clients):
+    """從同一初始文本建立多個副本，返回 (副本, 初始增量)"""
+    origin = CRDTDocument("doc")
+    deltas, _ = origin.apply("seed", [{"op": "insert", "index": 0, "text": text}])
+    replicas = {}
+    for client in clients:
+        replica = CRDTDocument("doc")
+        replica.apply("seed", deltas)
+        replicas[client] = replica
+    return replicas
+
+
+def test_concurrent_inserts_converge_in_any_order():
+    replicas = _replicas("hello world", "a", "b", "c")
+    local = {
+        "a": replicas["a"].apply("a", [{"op": "insert", "index": 5, "text": " big"}])[0],
+        "b": replicas["b"].apply("b", [{"op": "insert", "index": 5, "text": ","}])[0],
+        "c": replicas["c"].apply("c", [{"op": "delete", "index": 0, "length": 6},
+                                       {"op": "insert", "index": 5, "text": "!"}])[0],
+    }
+
+    texts = set()
+    for order in itertools.permutations(local):
+        document = _replicas("hello world", "x")["x"]
+        for client in order:
+            _, rejected = document.apply(client, local[client])
+            assert rejected == 0
+        texts.add(document.text())
+    assert len(texts) == 1
+
+    # 各自的副本收到其他客戶端的增量後與上面的結果一致
+    for client, replica in replicas.items():
+        for other in local:
+            if other != client:
+                replica.apply(other, local[other])
+        assert replica.text() in texts
+
+
+def test_duplicate_ops_are_idempotent():
+    document = _replicas("abc", "x")["x"]
+    inserted, _ = document.apply("a", [{"op": "insert", "index": 3, "text": "def"}])
+    deleted, _ = document.apply("a", [{"op": "delete", "index": 1, "length": 2}])
+    version = document.version
+
+    assert document.apply("a", inserted) == ([], 0)
+    assert document.apply("a", deleted) == ([], 0)
+    assert (document.text(), document.version) == ("adef", version)
+
+
+def test_unknown_anchor_is_rejected():
+    document = _replicas("abc", "x")["x"]
+    deltas, rejected = document.apply("a", [
+        {"op": "insert", "id": ["a", 50], "after": ["ghost", 7], "text": "zzz"},
+        {"op": "insert", "index": 3, "text": "d"},
+    ])
+    assert rejected == 1
+    assert [delta["text"] for delta in deltas] == ["d"]
+    assert document.text() == "abcd"
+
+
+def test_consecutive_typing_extends_one_run():
+    document = CRDTDocument("doc")
+    for index, char in enumerate("typing"):
+        document.apply("a", [{"op": "insert", "index": index, "text": char}])
+    assert document.text() == "typing"
+    assert document.visible_runs() == [["a", 1, 6]]
+    assert document.stats()["items"] == 1
+
+
+def test_compaction_and_snapshot_keep_text(tmp_path):
+    store = SessionDocumentStore(SessionRetentionManager(str(tmp_path / "sessions")))
+    document, _, _ = store.apply("s1", "notes", "a", [{"op": "insert", "index": 0, "text": "draft text"}])
+    anchor = document.visible_runs()[0][:2]
+    store.apply("s1", "notes", "a", [{"op": "delete", "index": 0, "length": 6}])
+    # 墓碑要早於 grace_epochs 個紀元才清除：刪除後的前兩次壓縮保留它，第三次清除
+    for _ in range(3):
+        store.snapshot("s1", "notes")
+    assert document.stats()["tombstones"] == 0
+
+    store.unload("s1")
+    reloaded = store.get("s1", "notes")
+    assert reloaded is not document
+    assert reloaded.text() == "text"
+    # 錨點字符的墓碑已在壓縮時清除，引用它的操作需要客戶端重新同步
+    _, rejected = reloaded.apply("b", [{"op": "insert", "id": ["b", 99], "after": anchor, "text": "x"}])
+    assert rejected == 1
+    assert reloaded.text() == "text"
@@ -0,0 +1,53 @@
+"""
+會話壓測腳本測試：最小 WebSocket 客戶端的掩碼、百分位計算，以及對子進程中的服務跑一輪小規模壓測
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_bench():
+    spec = importlib.util.spec_from_file_location(
+        "bench_session_load", os.path.join(ROOT, "benchmarks", "bench_session_load.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+bench = _load_bench()
+
+
+def test_mask_round_trips_and_percentiles():
+    key = b"\x01\x02\x03\x04"
+    payload = "掩碼 payload".encode("utf-8")
+    assert bench._mask(payload, key) != payload
+    assert bench._mask(bench._mask(payload, key), key) == payload
+    assert bench._mask(b"", key) == b""
+    values = list(range(1, 101))
+    assert (bench._percentile(values, 50), bench._percentile(values, 99)) == (51, 99)
+    assert bench._percentile([], 95) == 0.0
+
+
+@pytest.mark.parametrize("transport", ["ws", "http"])
+def test_small_load_run_delivers_every_message(transport):
+    args = argparse.Namespace(sessions=2, participants=2, rate=5.0, duration=1.0, message_size=50,
+                              transport=transport, ramp_up=1.0, drain=1.0, url=None, seed=7)
+    report = asyncio.run(bench.run(args))
+
+    throughput = report["throughput"]
+    assert throughput["errors"] == 0 and throughput["failed_participants"] == 0
+    assert throughput["sent"] > 0
+    # 每條消息廣播給會話中的所有參與者（包括發送者）
+    assert throughput["delivered"] == throughput["sent"] * args.participants
+    assert throughput["delivery_ratio"] == 1.0
+    assert 0 < report["latency_ms"]["p50"] <= report["latency_ms"]["p99"] <= report["latency_ms"]["max"]
+    assert report["config"]["transport"] == transport
+    if sys.platform.startswith("linux"):
+        assert report["memory"]["rss_end_mb"] > 0 and "server_seconds" in report["cpu"]
@@ -0,0 +1,24 @@
+"""
+會話消息測試：消息 ID 為會話內整數序號，卸載和重新加載後保持不變
+"""
+
+import asyncio
+
+
+def test_add_message_returns_message_id(make_manager):
+    manager = make_manager()
+
+    async def run():
+        session_id = await manager.create_session("u1", "Alice")
+        ids = [await manager.add_message(session_id, "u1", "Alice", "user", f"message {i}") for i in range(3)]
+        before = await manager.get_session_messages(session_id)
+        manager.unload_session(session_id)
+        after = await manager.get_session_messages(session_id)
+        return ids, before, after
+
+    ids, before, after = asyncio.run(run())
+    assert ids == [0, 1, 2]
+    assert [message["id"] for message in before] == ids
+    assert [(message["id"], message["content"]) for message in after] == [
+        (message["id"], message["content"]) for message in before
+    ]
@@ -0,0 +1,58 @@
+"""
+在線狀態測試：上下線變化經過合併窗口後仍然廣播，不會被同一用戶的輸入狀態覆蓋
+"""
+
+import asyncio
+
+from session_coalescer import EventCoalescer
+
+
+def _presence_frames(websocket):
+    return [(frame["type"], frame["user_id"], frame.get("online")) for frame in websocket.frames]
+
+
+def test_presence_changes_survive_typing_in_same_window(make_manager, make_websocket):
+    manager = make_manager()
+    manager.coalescer = EventCoalescer({"presence": 0.05}, manager._flush_coalesced)
+    websocket = make_websocket()
+
+    async def run():
+        session_id = await manager.create_session("u1", "Alice")
+        manager.websocket_connections[session_id].append(websocket)
+
+        await manager.participant_connected(session_id, "u2", "Bob")
+        await manager.update_presence(session_id, {"type": "typing", "user_id": "u2"})
+        await manager.update_presence(session_id, {"type": "typing", "user_id": "u2"})
+        await asyncio.sleep(0.15)
+        online = (await manager.get_online_participants(session_id))["total"]
+        joined = _presence_frames(websocket)
+
+        websocket.frames.clear()
+        await manager.update_presence(session_id, {"type": "typing", "user_id": "u2"})
+        await manager.participant_disconnected(session_id, "u2")
+        await asyncio.sleep(0.15)
+        return online, joined, _presence_frames(websocket), (await manager.get_online_participants(session_id))["total"]
+
+    online, joined, left, offline = asyncio.run(run())
+    assert online == 1 and offline == 0
+    assert joined == [("participant_presence", "u2", True), ("typing", "u2", None)]
+    assert websocket.frames[-1]["type"] == "participant_presence"
+    assert left == [("typing", "u2", None), ("participant_presence", "u2", False)]
+
+
+def test_flapping_presence_sends_latest_state(make_manager, make_websocket):
+    manager = make_manager()
+    manager.coalescer = EventCoalescer({"presence": 0.05}, manager._flush_coalesced)
+    websocket = make_websocket()
+
+    async def run():
+        session_id = await manager.create_session("u1", "Alice")
+        manager.websocket_connections[session_id].append(websocket)
+        await manager.participant_connected(session_id, "u2", "Bob")
+        await manager.participant_disconnected(session_id, "u2")
+        await manager.participant_connected(session_id, "u2", "Bob")
+        await asyncio.sleep(0.15)
+
+    asyncio.run(run())
+    [frame] = websocket.frames
+    assert (frame["type"], frame["online"], frame["coalesced"]) == ("participant_presence", True, 3)
@@ -0,0 +1,79 @@
+"""
+會話保留測試：舊數據溢出到磁盤分段、閒置會話整體卸載、按最久未訪問順序控制內存上限
+"""
+
+import asyncio
+import os
+
+from session_retention import SessionRetentionManager, SpillableLog
+
+
+def _log(directory, state=None):
+    return SpillableLog(str(directory), "items", encode=lambda item: {"v": item},
+                        decode=lambda record: record["v"], hot_limit=10,
+                        estimate=lambda item: 100, state=state)
+
+
+def test_spillable_log_reads_across_segments(tmp_path):
+    log = _log(tmp_path)
+    for i in range(100):
+        log.append(i)
+
+    # 熱數據攢到 hot_limit + 50 條才溢出一次，溢出後只保留最近 hot_limit 條
+    assert log.segments == [(0, 50, "items-0000000000.jsonl.gz")]
+    assert len(log.hot) == 50 and log.hot_bytes == 50 * 100
+    assert len(log) == 100
+    assert log[0] == 0 and log[59] == 59 and log[60] == 60 and log[-1] == 99
+    assert log[55:65] == list(range(55, 65))
+    assert list(log) == list(range(100))
+
+    log.spill(0)
+    restored = _log(tmp_path, state=log.state())
+    assert len(restored) == 100 and not restored.hot
+    assert restored[30:33] == [30, 31, 32]
+    restored.append(100)
+    assert list(restored)[-3:] == [98, 99, 100]
+
+
+def test_memory_ceiling_unloads_least_recently_used(tmp_path):
+    retention = SessionRetentionManager(str(tmp_path), max_memory_bytes=2500, idle_ttl=3600)
+    logs = {}
+    for session_id in ("a", "b", "c"):
+        logs[session_id] = retention.open_log(session_id, "messages", encode=lambda item: {"v": item},
+                                              decode=lambda record: record["v"], estimate=lambda item: 100)
+        for i in range(10):
+            logs[session_id].append(i)
+    retention.touch("a")
+
+    # 3000 字節超出 2500 的上限：卸載最久未訪問的 b 就夠了
+    assert retention.memory_usage() == 3000
+    assert retention.unload_candidates() == ["b"]
+
+    retention.idle_ttl = 0
+    assert sorted(retention.unload_candidates()) == ["a", "b", "c"]
+
+
+def test_idle_session_unloads_and_reloads_transparently(make_manager):
+    manager = make_manager(hot_messages=5, idle_ttl=0)
+
+    async def run():
+        session_id = await manager.create_session("u1", "Alice")
+        for i in range(80):
+            await manager.add_message(session_id, "u1", "Alice", "user", f"message {i}")
+        assert manager.session_messages[session_id].spilled_count == 50
+
+        for candidate in manager.retention.unload_candidates():
+            manager.unload_session(candidate)
+        assert session_id not in manager.session_info
+        assert session_id in manager.retention.catalog
+        assert os.path.exists(os.path.join(manager.retention.session_dir(session_id), "manifest.json"))
+
+        messages = await manager.get_session_messages(session_id, limit=100)
+        info = await manager.get_session_info(session_id)
+        return session_id, messages, info
+
+    session_id, messages, info = asyncio.run(run())
+    assert [message["content"] for message in messages] == [f"message {i}" for i in range(80)]
+    assert info["message_count"] == 80
+    assert session_id in manager.session_info
+    assert session_id not in manager.retention.catalog
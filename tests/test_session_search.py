@@ -0,0 +1,90 @@
+"""
+會話全文檢索測試：非 ASCII 字母切分、重啟後檢索已卸載會話、索引內存不觸發會話卸載
+"""
+
+import asyncio
+
+from session_search import SessionSearchIndex, tokenize
+
+
+def test_tokenize_keeps_non_ascii_letters():
+    assert tokenize("Café naïve Straße ДОМ") == ["café", "naïve", "straße", "дом"]
+    # 組合附加符號與預組字符得到相同的詞
+    assert tokenize("café") == tokenize("café")
+    assert tokenize("résumé中文搜索") == ["résumé", "中文", "文搜", "搜索"]
+
+
+def test_search_matches_accented_words():
+    index = SessionSearchIndex()
+    index.add("s", 0, "Le café est fermé")
+    index.add("s", 1, "cafe without accent")
+    assert [seq for _, seq, _ in index.search("café")["hits"]] == [0]
+
+
+def test_index_memory_is_tracked():
+    index = SessionSearchIndex()
+    assert index.memory_bytes() == 0
+    index.add("a", 0, "alpha beta gamma")
+    index.add("b", 0, "alpha delta")
+    grown = index.memory_bytes()
+    assert grown > 0
+    index.remove_session("a")
+    assert 0 < index.memory_bytes() < grown
+    index.remove_session("b")
+    assert index.memory_bytes() == 0
+
+
+def test_large_index_does_not_unload_active_sessions(make_manager):
+    manager = make_manager(max_memory_bytes=64 * 1024)
+
+    async def create_sessions():
+        session_ids = []
+        for i in range(4):
+            session_id = await manager.create_session("u1", "Alice")
+            await manager.add_message(session_id, "u1", "Alice", "user", f"message {i}")
+            session_ids.append(session_id)
+        return session_ids
+
+    session_ids = asyncio.run(create_sessions())
+    for i in range(2000):
+        manager.search_index.add("archived", i, f"term{i} archived text")
+    # 索引本身已超出會話內存上限，但卸載會話無法釋放它
+    assert manager.retention.resident_memory() == manager.search_index.memory_bytes() > 64 * 1024
+    assert manager.sweep_sessions() == []
+    assert all(session_id in manager.session_info for session_id in session_ids)
+
+    # 會話熱數據超出上限時只卸載最久未訪問的會話
+    manager.retention.touch(session_ids[0])
+    manager.retention.max_memory_bytes = manager.retention.memory_usage() - 1
+    assert manager.sweep_sessions() == [session_ids[1]]
+    assert [session_id in manager.session_info for session_id in session_ids] == [True, False, True, True]
+
+
+def test_search_after_restart_finds_unloaded_sessions(make_manager):
+    async def first_run():
+        manager = make_manager()
+        await manager.start()
+        session_id = await manager.create_session("u1", "Alice")
+        await manager.add_message(session_id, "u1", "Alice", "user", "déploiement du serveur terminé")
+        await manager.close()
+        return session_id
+
+    async def second_run(session_id):
+        manager = make_manager()
+        await manager.start()
+        try:
+            assert session_id not in manager.session_info
+            global_result = await manager.search_messages("déploiement")
+            scoped = await manager.search_messages("serveur", session_id=session_id)
+            missing = await manager.search_messages("serveur", session_id="no-such-session")
+            return global_result, scoped, missing
+        finally:
+            await manager.close()
+
+    session_id = asyncio.run(first_run())
+    global_result, scoped, missing = asyncio.run(second_run(session_id))
+    assert global_result["total"] == 1
+    assert global_result["results"][0]["session_id"] == session_id
+    assert scoped["total"] == 1
+    assert scoped["results"][0]["message"]["content"] == "déploiement du serveur terminé"
+    assert missing == {"results": [], "total": 0, "took_ms": 0.0}
@@ -0,0 +1,39 @@
+"""
+分享鏈接測試：/share/{token} 由緩存視圖響應，不加載已卸載的會話，支持 ETag
+"""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import session_sharing_backend
+from session_sharing_backend import app
+
+
+def test_share_link_serves_cached_view_without_loading(make_manager, monkeypatch):
+    manager = make_manager()
+    monkeypatch.setattr(session_sharing_backend, "session_manager", manager)
+
+    async def prepare():
+        session_id = await manager.create_session("u1", "Alice", title="Shared work")
+        await manager.add_message(session_id, "u1", "Alice", "user", "hello")
+        link = await manager.generate_share_link(session_id, permissions=["view", "comment"])
+        manager.unload_session(session_id)
+        return session_id, link.rsplit("/", 1)[1]
+
+    session_id, token = asyncio.run(prepare())
+    client = TestClient(app)
+
+    response = client.get(f"/share/{token}")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["session_id"] == session_id
+    assert body["permissions"] == ["view", "comment"]
+    assert body["session_info"]["title"] == "Shared work"
+    assert body["session_info"]["message_count"] == 1
+    assert session_id not in manager.session_info
+
+    etag = response.headers["etag"]
+    assert client.get(f"/share/{token}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/share/not-a-token").status_code == 404
+    assert session_id not in manager.session_info
@@ -0,0 +1,126 @@
+"""
+廣播流測試：多 worker 下序號由歸屬 worker 統一分配，重連時按 seq 補發缺失的幀
+"""
+
+import asyncio
+import tempfile
+
+from session_broker import UnixSocketSessionBroker
+from session_stream import SessionStream
+
+
+def test_record_keeps_remote_seq():
+    stream = SessionStream(8)
+    stream.record({"seq": 5})
+    stream.record({"seq": 5})
+    stream.record({"seq": 3})
+    assert [seq for seq, _ in stream.ring] == [5]
+    assert stream.stamp({})["seq"] == 6
+
+
+def test_workers_share_one_sequence_per_session():
+    sessions = ["s-%d" % i for i in range(8)]
+
+    async def run(socket_dir):
+        brokers = [UnixSocketSessionBroker(socket_dir, workers=3) for i in range(3)]
+        streams = [{} for _ in brokers]
+        received = [{} for _ in brokers]
+        for broker, worker_streams, worker_received in zip(brokers, streams, received):
+            def stream(session_id, worker_streams=worker_streams):
+                return worker_streams.setdefault(session_id, SessionStream(4096))
+
+            async def deliver(session_id, frame, stream=stream, worker_received=worker_received):
+                stream(session_id).record(frame)
+                worker_received.setdefault(session_id, []).append((frame["seq"], frame["n"]))
+
+            broker.set_handler(deliver)
+            broker.set_stamper(lambda session_id, frame, stream=stream: stream(session_id).stamp(frame))
+        for broker in brokers:
+            await broker.start()
+        for broker in brokers:
+            await broker._refresh_peers(force=True)
+
+        # 每個 worker 都為每個會話廣播，交錯進行
+        sent = 0
+        for _ in range(20):
+            for broker in brokers:
+                for session_id in sessions:
+                    await broker.broadcast(session_id, {"type": "message", "n": sent})
+                    sent += 1
+        await asyncio.sleep(0.3)
+        for broker in brokers:
+            await broker.close()
+        return received, sent
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        received, sent = asyncio.run(run(socket_dir))
+
+    per_session = sent // len(sessions)
+    for session_id in sessions:
+        views = [worker_received[session_id] for worker_received in received]
+        # 所有 worker 看到同一組 (seq, 幀)，seq 連續遞增、沒有衝突
+        assert views[0] == views[1] == views[2]
+        assert [seq for seq, _ in views[0]] == list(range(per_session))
+        assert len({n for _, n in views[0]}) == per_session
+
+
+def test_resume_replays_missing_frames(make_manager, make_websocket):
+    async def run():
+        manager = make_manager()
+        session_id = await manager.create_session("u1", "Alice")
+        for i in range(5):
+            await manager.add_message(session_id, "u1", "Alice", "user", f"message {i}")
+        websocket = make_websocket()
+        await manager.resume_connection(session_id, websocket, 1)
+        live = await manager.add_message(session_id, "u1", "Alice", "user", "live")
+        return websocket.frames, live
+
+    frames, live = asyncio.run(run())
+    *replayed, complete, live_frame = frames
+    assert [frame["seq"] for frame in replayed] == [2, 3, 4]
+    assert [frame["message"]["content"] for frame in replayed] == ["message 2", "message 3", "message 4"]
+    assert complete == {"type": "resume_complete", "seq": 4, "replayed": 3, "gap": False}
+    assert live_frame["seq"] == 5
+    assert live_frame["message"]["id"] == live
+
+
+def test_resume_beyond_ring_replays_from_message_log(make_manager, make_websocket):
+    async def run():
+        manager = make_manager()
+        manager.stream_ring_size = 4
+        session_id = await manager.create_session("u1", "Alice")
+        for i in range(10):
+            await manager.add_message(session_id, "u1", "Alice", "user", f"message {i}")
+        websocket = make_websocket()
+        await manager.resume_connection(session_id, websocket, 0)
+        return websocket.frames
+
+    frames = asyncio.run(run())
+    *replayed, complete = frames
+    # 幀序號即消息序號；被擠出環形緩衝區的消息從日誌補發，其餘來自緩衝區
+    assert complete["gap"] is True
+    assert [frame["seq"] for frame in replayed] == list(range(1, 10))
+    assert [frame["message"]["content"] for frame in replayed] == [f"message {i}" for i in range(1, 10)]
+    assert all(frame.get("replayed") for frame in replayed[:5])
+
+
+def test_resume_after_join_replays_unique_seqs(make_manager, make_websocket):
+    async def run():
+        manager = make_manager()
+        manager.stream_ring_size = 4
+        session_id = await manager.create_session("u1", "Alice")
+        # 加入產生的系統消息只寫入日誌、不廣播，沒有幀序號
+        await manager.join_session(session_id, "u2", "Bob")
+        for i in range(1, 10):
+            await manager.add_message(session_id, "u2", "Bob", "user", f"m{i}")
+        manager.unload_session(session_id)
+        websocket = make_websocket()
+        await manager.resume_connection(session_id, websocket, -1)
+        return websocket.frames
+
+    frames = asyncio.run(run())
+    *replayed, complete = frames
+    assert complete == {"type": "resume_complete", "seq": 8, "replayed": 9, "gap": True}
+    assert [frame["seq"] for frame in replayed] == list(range(9))
+    assert [frame["message"]["content"] for frame in replayed] == [f"m{i}" for i in range(1, 10)]
+    assert [frame["message"]["id"] for frame in replayed] == list(range(1, 10))
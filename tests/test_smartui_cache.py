@@ -0,0 +1,112 @@
+"""
+SmartUI 断点预计算测试：首个请求才在后台预计算，User-Agent 按管理器的实时结果归类
+"""
+
+import asyncio
+import enum
+from dataclasses import dataclass
+
+import pytest
+
+from routes import smartui
+from smartui_cache import SmartUIPrecomputed
+
+
+class DeviceType(enum.Enum):
+    MOBILE = "mobile"
+    TABLET = "tablet"
+    DESKTOP = "desktop"
+
+
+class Breakpoint(enum.Enum):
+    SM = "sm"
+    MD = "md"
+    LG = "lg"
+
+
+@dataclass
+class Config:
+    device_type: DeviceType
+    breakpoint: Breakpoint
+    viewport_width: int
+    viewport_height: int
+    layout_columns: int
+    sidebar_width: int
+    header_height: int
+    touch_optimized: bool
+    font_scale: float
+    spacing_scale: float
+
+
+class StubManager:
+    """按自己的规则分类 User-Agent 的 SmartUI 管理器"""
+
+    def __init__(self):
+        self.detect_calls = 0
+
+    @staticmethod
+    def device(user_agent):
+        if "iPad" in user_agent:
+            return DeviceType.TABLET
+        if "iPhone" in user_agent or "Mobile" in user_agent:
+            return DeviceType.MOBILE
+        return DeviceType.DESKTOP
+
+    async def detect_device_and_configure(self, width, height, user_agent):
+        self.detect_calls += 1
+        breakpoint = Breakpoint.SM if width < 600 else Breakpoint.MD if width < 1100 else Breakpoint.LG
+        device = self.device(user_agent)
+        return Config(device, breakpoint, width, height, {"sm": 1, "md": 2, "lg": 3}[breakpoint.value],
+                      0 if breakpoint is Breakpoint.SM else 240, 56, device is not DeviceType.DESKTOP, 1.0, 1.0)
+
+    async def generate_responsive_css(self, config):
+        return f".root{{--device:{config.device_type.value};--columns:{config.layout_columns}}}"
+
+
+@pytest.fixture
+def precomputed(monkeypatch):
+    instance = SmartUIPrecomputed()
+    monkeypatch.setattr(smartui, "get_precomputed", lambda: instance)
+    return instance
+
+
+def test_precompute_runs_lazily_in_background(precomputed):
+    manager = StubManager()
+
+    async def run():
+        assert not precomputed.ready and precomputed.stats()["building"] is False
+        # 首个请求实时计算，预计算在后台进行
+        config, _ = await smartui._resolve(manager, 800, 600, "")
+        assert config.breakpoint is Breakpoint.MD
+        assert not precomputed.ready and precomputed.stats()["building"]
+        await precomputed._building
+        assert precomputed.ready
+        calls = manager.detect_calls
+        config, entry = await smartui._resolve(manager, 1300, 900, "")
+        assert manager.detect_calls == calls
+        assert (config.breakpoint, config.viewport_width) == (Breakpoint.LG, 1300)
+        assert entry.css == ".root{--device:desktop;--columns:3}"
+
+    asyncio.run(run())
+
+
+def test_user_agents_follow_manager_classification(precomputed):
+    manager = StubManager()
+    # 按正则会被当作平板的 UA，由管理器决定为桌面；另一个 UA 由管理器判定为手机
+    user_agents = {"Mozilla/5.0 (Linux; Kindle Fire HD) Silk/3.0": DeviceType.DESKTOP,
+                   "Mozilla/5.0 (Linux; Android 14; Pixel 8) Mobile": DeviceType.MOBILE}
+
+    async def run():
+        await precomputed.build(manager)
+        for user_agent, device in user_agents.items():
+            assert precomputed.lookup(500, 800, user_agent) is None
+            await smartui._resolve(manager, 500, 800, user_agent)
+            calls = manager.detect_calls
+            for width, height in ((500, 800), (900, 600), (2000, 1200)):
+                config, _ = await smartui._resolve(manager, width, height, user_agent)
+                live = await manager.detect_device_and_configure(width, height, user_agent)
+                assert (config.device_type, config.breakpoint) == (device, live.breakpoint)
+            assert manager.detect_calls == calls + 3
+        assert precomputed.stats()["ua_cache"]["size"] == 3 + len(user_agents)
+
+    asyncio.run(run())
@@ -0,0 +1,83 @@
+"""
+text_chunker 測試：分塊是原文的切片、相鄰分塊按預算重疊但不跨越標題、標題路徑按層級維護
+"""
+
+from text_chunker import ChunkConfig, estimate_tokens, iter_chunks
+
+
+def _words(text):
+    return len(text.split())
+
+
+def _paragraphs(count, words=10, prefix="p"):
+    return "\n\n".join(" ".join(f"{prefix}{i}w{j}" for j in range(words)) for i in range(count))
+
+
+def _chunks(text, max_tokens, overlap_tokens, **options):
+    return list(iter_chunks(text, url="https://docs.example.com/guide", count_tokens=_words,
+                            config=ChunkConfig(max_tokens=max_tokens, overlap_tokens=overlap_tokens), **options))
+
+
+def test_chunks_are_slices_within_budget():
+    text = _paragraphs(12)
+    chunks = _chunks(text, 30, 10)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start:chunk.end]
+        assert chunk.tokens == _words(chunk.text) <= 30
+        assert chunk.url == "https://docs.example.com/guide"
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+
+
+def test_adjacent_chunks_overlap_by_whole_units():
+    text = _paragraphs(7)
+    chunks = _chunks(text, 30, 10)
+    # 每塊三段，下一塊以上一塊的最後一段（10 個 token）開頭
+    assert [chunk.text.split()[0] for chunk in chunks] == ["p0w0", "p2w0", "p4w0"]
+    assert chunks[1].start == text.index("p2w0") and chunks[0].end == text.index("p2w9") + 4
+    assert chunks[-1].text.split()[-1] == "p6w9"
+
+    without_overlap = _chunks(text, 30, 0)
+    assert [chunk.text.split()[0] for chunk in without_overlap] == ["p0w0", "p3w0", "p6w0"]
+    assert all(a.end < b.start for a, b in zip(without_overlap, without_overlap[1:]))
+
+
+def test_heading_paths_follow_levels_without_crossing_overlap():
+    text = "\n\n".join([
+        "# Guide", _paragraphs(1, prefix="intro"),
+        "## Install", _paragraphs(1, prefix="steps"),
+        "### Linux", _paragraphs(1, prefix="apt"),
+        "## Usage", _paragraphs(1, prefix="run"),
+    ])
+    chunks = _chunks(text, 30, 10, heading_path=["Guide"])
+    assert [(chunk.text.splitlines()[0], chunk.heading_path) for chunk in chunks] == [
+        ("# Guide", ["Guide"]),
+        ("## Install", ["Guide", "Install"]),
+        ("### Linux", ["Guide", "Install", "Linux"]),
+        ("## Usage", ["Guide", "Usage"]),
+    ]
+    # 標題結束上一塊，新分塊不帶上一節的重疊
+    assert all(chunk.text.count("\n\n") == 1 for chunk in chunks)
+
+
+def test_long_sentences_split_by_words_with_overlap():
+    text = " ".join(f"w{i}" for i in range(100))
+    chunks = _chunks(text, 30, 10)
+    assert all(chunk.tokens <= 30 and chunk.text == text[chunk.start:chunk.end] for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert 0 < previous.end - chunk.start
+        assert _words(text[chunk.start:previous.end]) <= 10
+    assert chunks[-1].text.endswith("w99")
+
+
+def test_range_offsets_are_relative_to_whole_text():
+    prefix = "# Title\n\nskipped paragraph\n\n"
+    text = prefix + _paragraphs(4)
+    chunks = _chunks(text, 30, 0, start=len(prefix))
+    assert chunks[0].start == len(prefix) and "skipped" not in "".join(chunk.text for chunk in chunks)
+    assert all(chunk.text == text[chunk.start:chunk.end] for chunk in chunks)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("中文分塊") == 4
+    assert estimate_tokens("word chunking") == 1 + 2
@@ -0,0 +1,71 @@
+"""
+url_cache 近似重複測試：指紋足夠接近且正文長度接近時共用內容，其他主機上的條目要求更接近
+"""
+
+from url_cache import URLCache
+
+HEADERS = {"Cache-Control": "max-age=3600"}
+FINGERPRINT = 0x0123456789ABCDEF
+
+
+def _cache(tmp_path):
+    cache = URLCache(str(tmp_path / "cache"))
+    cache.store("https://docs.example.com/guide", HEADERS, {"url": "https://docs.example.com/guide"},
+                simhash=FINGERPRINT, text_length=1200)
+    return cache
+
+
+def test_other_hosts_need_a_tighter_distance(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.find_duplicate("https://docs.example.com/guide?print=1", FINGERPRINT ^ 0b11, 1200).key == \
+        "https://docs.example.com/guide"
+    # 默認跨主機距離為 max_distance 的一半：鏡像站上幾乎相同的正文仍然共用
+    assert cache.find_duplicate("https://mirror.test/guide", FINGERPRINT ^ 0b1, 1180).key == \
+        "https://docs.example.com/guide"
+    assert cache.find_duplicate("https://mirror.test/guide", FINGERPRINT ^ 0b11, 1200) is None
+
+    same_host_only = URLCache(str(tmp_path / "strict"), cross_host_distance=-1)
+    same_host_only.store("https://docs.example.com/guide", HEADERS, {}, simhash=FINGERPRINT, text_length=1200)
+    assert same_host_only.find_duplicate("https://mirror.test/guide", FINGERPRINT, 1200) is None
+
+
+def test_duplicate_requires_tight_distance_and_similar_length(tmp_path):
+    cache = _cache(tmp_path)
+    url = "https://docs.example.com/guide/print"
+    assert cache.find_duplicate(url, FINGERPRINT ^ 0b11, 1200) is not None
+    assert cache.find_duplicate(url, FINGERPRINT ^ 0b111, 1200) is None
+    # 長度之比不低於 0.9：打印版多出的頁腳不影響，正文長短差別大的頁面不算重複
+    assert cache.find_duplicate(url, FINGERPRINT, 1100) is not None
+    assert cache.find_duplicate(url, FINGERPRINT, 1320) is not None
+    assert cache.find_duplicate(url, FINGERPRINT, 1000) is None
+
+
+def test_nearest_accepted_candidate_wins(tmp_path):
+    cache = URLCache(str(tmp_path / "cache"), max_distance=4)
+    for url, fingerprint in (("https://docs.example.com/guide", FINGERPRINT),
+                             ("https://mirror.test/guide", FINGERPRINT ^ 0b111)):
+        cache.store(url, HEADERS, {"url": url}, simhash=fingerprint, text_length=1200)
+    # 其他主機上更近的條目在跨主機上限（2）以內時被接受
+    assert cache.find_duplicate("https://docs.example.com/a", FINGERPRINT ^ 0b1111, 1200).key == \
+        "https://mirror.test/guide"
+    # 超出跨主機上限時退回同一主機上較遠的條目（距離 3 和 4）
+    assert cache.find_duplicate("https://docs.example.com/a", FINGERPRINT ^ 0b11110, 1200).key == \
+        "https://docs.example.com/guide"
+
+
+def test_text_length_survives_index_reload(tmp_path):
+    cache = _cache(tmp_path)
+    cache.flush()
+    reloaded = URLCache(str(tmp_path / "cache"))
+    assert reloaded.lookup("https://docs.example.com/guide").text_length == 1200
+    assert reloaded.find_duplicate("https://docs.example.com/guide/print", FINGERPRINT, 1200) is not None
+
+
+def test_truncated_page_is_not_cached(tmp_path):
+    cache = _cache(tmp_path)
+    url = "https://docs.example.com/guide"
+    assert not cache.store(url, HEADERS, {"url": url}, simhash=FINGERPRINT, text_length=900, truncated=True)
+    # 截斷的結果不緩存，舊的完整條目也不再返回
+    assert cache.lookup(url) is None
+    assert cache.find_duplicate("https://docs.example.com/guide?print=1", FINGERPRINT, 1200) is None
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,130 @@
+"""
+url_crawler 測試：對本地靜態 HTTP 服務器爬取，驗證 robots.txt、sitemap、去重和檢查點恢復
+"""
+
+import asyncio
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+from url_crawler import CrawlConfig, URLCrawler, canonicalize_url
+from url_processor import URLProcessor
+
+FILLER = "<p>" + "Documentation text that is long enough to be kept by the extractor. " * 8 + "</p>"
+
+
+def _page(title, *links):
+    anchors = "".join(f'<a href="{link}">{link}</a> ' for link in links)
+    return f"<html><head><title>{title}</title></head><body><article><h1>{title}</h1>{FILLER}{anchors}</article></body></html>"
+
+
+@pytest.fixture
+def site(tmp_path):
+    """在臨時目錄上啟動 http.server，記錄每個請求的路徑"""
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            requests.append(self.path)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(tmp_path)))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    files = {
+        "robots.txt": f"User-agent: *\nDisallow: /private/\nSitemap: {base}/sitemap.xml\n",
+        "sitemap.xml": (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            f"<url><loc>{base}/docs/orphan.html</loc></url>"
+            f"<url><loc>{base}/private/secret.html</loc></url>"
+            "</urlset>"
+        ),
+        "index.html": _page(
+            "Index", "/docs/a.html", "/docs/a.html#section", "docs/a.html?utm_source=test",
+            "/private/secret.html", "http://example.invalid/elsewhere.html", "/logo.png"
+        ),
+        "docs/a.html": _page("A", "/docs/b.html", "/index.html", "../docs/b.html?ref=nav"),
+        "docs/b.html": _page("B", "/docs/c.html", "/docs/a.html"),
+        "docs/c.html": _page("C", "/index.html"),
+        "docs/orphan.html": _page("Orphan"),
+        "private/secret.html": _page("Secret"),
+    }
+    for name, text in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield base, requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _crawl(config, stop_after=None):
+    """爬取並返回交付的 URL；stop_after 時在交付該數量的頁面後中斷"""
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            crawler = URLCrawler(config, URLProcessor(session=session, use_cache=False))
+            urls = []
+            results = crawler.crawl()
+            try:
+                async for result in results:
+                    assert result["success"], result
+                    urls.append(result["url"])
+                    if stop_after is not None and len(urls) >= stop_after:
+                        break
+            finally:
+                await results.aclose()
+            return urls, crawler
+
+    return asyncio.run(run())
+
+
+def _expected(base):
+    return {f"{base}/index.html"} | {f"{base}/docs/{name}.html" for name in ("a", "b", "c", "orphan")}
+
+
+def test_canonicalize_url_dedupes_variants():
+    base = "http://docs.example.com/guide/index.html"
+    assert canonicalize_url("a.html#part", base) == canonicalize_url("a.html?utm_source=x&ref=nav", base)
+    assert canonicalize_url("/img/logo.png", base) is None
+    assert canonicalize_url("mailto:team@example.com", base) is None
+
+
+def test_crawl_respects_robots_and_sitemap(site):
+    base, requests = site
+    urls, crawler = _crawl(CrawlConfig(start_url=f"{base}/index.html", rate=0, concurrency=2))
+
+    assert sorted(urls) == sorted(_expected(base))
+    assert len(urls) == len(set(urls))
+    # orphan.html 只出現在 sitemap 中；private/ 被 robots.txt 禁止，從未請求
+    assert f"{base}/docs/orphan.html" in urls
+    assert not any(path.startswith("/private/") for path in requests)
+    # 每個頁面只獲取一次（片段、跟蹤參數的變體已去重）
+    pages = [path for path in requests if path.endswith(".html") or ".html?" in path]
+    assert len(pages) == len(set(pages)) == len(_expected(base))
+    assert crawler.summary()["pending"] == 0
+
+
+def test_crawl_resumes_from_checkpoint(site, tmp_path):
+    base, requests = site
+    config = CrawlConfig(start_url=f"{base}/index.html", rate=0, concurrency=1,
+                         checkpoint_path=str(tmp_path / "crawl.json"), checkpoint_every=1)
+    first, _ = _crawl(config, stop_after=2)
+    assert len(first) == 2
+
+    fetched_before = len(requests)
+    second, crawler = _crawl(config)
+    # 恢復後不重新請求已完成的頁面，也不再讀取 sitemap
+    assert not set(first) & set(second)
+    assert sorted(first + second) == sorted(_expected(base))
+    assert "/sitemap.xml" not in requests[fetched_before:]
+    assert not {url[len(base):] for url in first} & set(requests[fetched_before:])
+    assert crawler.summary() == {"start_url": f"{base}/index.html", "done": 5, "failed": 0, "pending": 0}
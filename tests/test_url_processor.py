@@ -0,0 +1,205 @@
+"""
+URLProcessor 下載測試：對本地靜態 HTTP 服務器獲取頁面，驗證增量提取、進程池交接和截斷頁面的緩存；
+批量獲取的去重和並發限制
+"""
+
+import asyncio
+import functools
+from collections import Counter
+from urllib.parse import urlsplit
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+from extraction_pool import ExtractionPool
+from html_extractor import extract_html
+from url_cache import URLCache
+import url_processor
+from url_processor import FetchLimits, URLProcessor, fetch_urls_content
+
+# 沒有 article，提取器不會提前停止；中文正文讓分塊邊界落在多字節字符中間
+LARGE_PAGE = (
+    "<html><head><meta charset='utf-8'><title>長頁面</title></head><body><div class='content'>"
+    + "".join(f"<p>第 {i} 段：增量提取的正文內容，足夠長以跨越多個分塊。</p>" for i in range(400))
+    + "</div></body></html>"
+)
+SMALL_PAGE = "<html><head><title>Small</title></head><body><div class='content'><p>短頁面</p></div></body></html>"
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """在臨時目錄上啟動 http.server，返回 (寫入頁面並返回 URL 的函數, 請求路徑列表)"""
+    requests = []
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            requests.append(self.path)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(tmp_path)))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def page(name, text):
+        (tmp_path / name).write_text(text, encoding="utf-8")
+        return f"{base}/{name}"
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield page, requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(workers=1, timeout=30, inline_threshold=4096)
+    pool.warm_up()
+    yield pool
+    pool.shutdown()
+
+
+def _fetch(pool, url):
+    """用 1000 字節的分塊獲取頁面，返回 (提取結果, 下載信息, 交給進程池的剩餘字節數)"""
+    handed_over = []
+    resume = pool.resume
+
+    async def spy(extractor, charset, decoder_state, data):
+        handed_over.append(len(data))
+        return await resume(extractor, charset, decoder_state, data)
+
+    pool.resume = spy
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            processor = URLProcessor(session=session, use_cache=False, pool=pool,
+                                     limits=FetchLimits(chunk_size=1000))
+            return await processor._fetch_extracted(url)
+
+    extracted, _, info = asyncio.run(run())
+    return extracted, info, handed_over
+
+
+def test_small_page_is_extracted_inline_without_buffering(serve, pool):
+    page, _ = serve
+    extracted, info, handed_over = _fetch(pool, page("small.html", SMALL_PAGE))
+    assert info["extracted_in"] == "inline" and handed_over == []
+    assert extracted.text == extract_html(SMALL_PAGE).text
+
+
+def test_large_page_hands_only_remaining_bytes_to_pool(serve, pool):
+    page, _ = serve
+    extracted, info, handed_over = _fetch(pool, page("large.html", LARGE_PAGE))
+    size = len(LARGE_PAGE.encode("utf-8"))
+    assert info["extracted_in"] == "pool" and info["bytes_read"] == size
+    # 超過 4096 字節的內聯閾值（之後的一個分塊內）才開始保留原始字節
+    [remaining] = handed_over
+    assert size - 4096 - 1000 <= remaining < size - 4096
+    expected = extract_html(LARGE_PAGE)
+    assert (extracted.title, extracted.text, extracted.html_length) == (expected.title, expected.text, expected.html_length)
+
+
+def _fetch_twice(tmp_path, url, limits):
+    """用同一個緩存獲取兩次，返回兩次結果的緩存狀態"""
+    cache = URLCache(str(tmp_path / "cache"))
+
+    async def run():
+        async with aiohttp.ClientSession() as session:
+            processor = URLProcessor(session=session, cache=cache, limits=limits,
+                                     pool=ExtractionPool(workers=0))
+            first = await processor.fetch_and_process(url)
+            second = await processor.fetch_and_process(url)
+            return first.metadata, second.metadata
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("limits, flag", [
+    (FetchLimits(max_bytes=2000, chunk_size=1000), "truncated"),
+    (FetchLimits(max_text_chars=500, chunk_size=1000), "text_limited"),
+])
+def test_truncated_pages_are_fetched_again(serve, tmp_path, limits, flag):
+    page, requests = serve
+    url = page("large.html", LARGE_PAGE)
+    first, second = _fetch_twice(tmp_path, url, limits)
+    assert first[flag] and first["cache"] == "miss"
+    assert second[flag] and second["cache"] == "miss"
+    assert requests == ["/large.html", "/large.html"]
+
+
+def test_complete_page_is_served_from_cache(serve, tmp_path):
+    page, requests = serve
+    url = page("large.html", LARGE_PAGE)
+    first, second = _fetch_twice(tmp_path, url, FetchLimits(chunk_size=1000))
+    assert not first["truncated"] and not first["text_limited"]
+    assert second["cache"] in ("hit", "revalidated")
+
+
+@pytest.fixture
+def fake_fetch(monkeypatch):
+    """替換單個 URL 的獲取：每個請求耗時 delay 秒，記錄請求的 URL 和每個主機、全局的最大並發數"""
+    calls = {"urls": [], "active": Counter(), "peak": Counter(), "cancelled": 0, "delay": 0.02}
+
+    async def fetch(processor, url):
+        host = urlsplit(url).hostname
+        calls["urls"].append(url)
+        for name in (host, "*"):
+            calls["active"][name] += 1
+            calls["peak"][name] = max(calls["peak"][name], calls["active"][name])
+        try:
+            await asyncio.sleep(calls["delay"])
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        finally:
+            for name in (host, "*"):
+                calls["active"][name] -= 1
+        return {"success": True, "title": url}
+
+    monkeypatch.setattr(url_processor, "_fetch_content_response", fetch)
+    monkeypatch.setattr(url_processor, "get_url_cache", lambda: None)
+    return calls
+
+
+def _collect(urls, limit=None, **options):
+    async def run():
+        results = []
+        stream = fetch_urls_content(urls, **options)
+        try:
+            async for result in stream:
+                results.append(result)
+                if limit is not None and len(results) >= limit:
+                    break
+        finally:
+            await stream.aclose()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_batch_fetches_each_normalized_url_once(fake_fetch):
+    urls = ["example.com/a", "https://example.com/a#intro", "https://EXAMPLE.com:443/a", " https://example.com/b "]
+    results = _collect(urls)
+    assert sorted(fake_fetch["urls"]) == ["https://example.com/a", "https://example.com/b"]
+    assert sorted((result["url"], result["indices"]) for result in results) == [
+        ("https://example.com/a", [0, 1, 2]), ("https://example.com/b", [3])
+    ]
+
+
+def test_batch_respects_per_host_and_global_limits(fake_fetch):
+    urls = [f"https://a.test/{i}" for i in range(6)] + [f"https://b.test/{i}" for i in range(2)]
+    results = _collect(urls, concurrency=3, per_host=2)
+    assert len(results) == 8
+    assert fake_fetch["peak"]["a.test"] == 2 and fake_fetch["peak"]["*"] == 3
+    # 等待 a.test 配額的任務不佔全局並發：第三個全局名額給了 b.test，而不是排隊的 a.test
+    assert fake_fetch["urls"][:3] == ["https://a.test/0", "https://a.test/1", "https://b.test/0"]
+
+
+def test_stopping_early_cancels_pending_fetches(fake_fetch):
+    fake_fetch["delay"] = 0.2
+    urls = [f"https://host{i}.test/" for i in range(4)]
+    results = _collect(urls, limit=1, concurrency=1)
+    assert len(results) == 1
+    assert len(fake_fetch["urls"]) == 2 and fake_fetch["cancelled"] == 1
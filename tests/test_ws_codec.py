@@ -0,0 +1,64 @@
+"""
+WebSocket 編碼測試：按子協議協商 MessagePack / JSON，廣播幀每種編碼只序列化一次
+"""
+
+import json
+
+import msgpack
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+import ws_codec
+
+FRAME = {"type": "new_message", "seq": 3, "message": {"id": 7, "content": "héllo 世界", "metadata": {}}}
+
+
+def _echo_app():
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def echo(websocket: WebSocket):
+        codec = await ws_codec.accept(websocket)
+        received = await codec.receive(websocket)
+        await ws_codec.send(websocket, {"codec": codec.name, "echo": received})
+        await ws_codec.EncodedFrame(FRAME).send(websocket)
+        await websocket.close()
+
+    return TestClient(app)
+
+
+def test_msgpack_subprotocol_round_trip():
+    with _echo_app().websocket_connect("/ws", subprotocols=["claudeditor.msgpack", "claudeditor.json"]) as ws:
+        assert ws.accepted_subprotocol == ws_codec.SUBPROTOCOL_MSGPACK
+        ws.send_bytes(msgpack.packb({"type": "ping", "payload": b"\x00\x01"}, use_bin_type=True))
+        reply = msgpack.unpackb(ws.receive_bytes(), raw=False)
+        assert reply == {"codec": "msgpack", "echo": {"type": "ping", "payload": b"\x00\x01"}}
+        assert msgpack.unpackb(ws.receive_bytes(), raw=False) == FRAME
+
+
+def test_msgpack_connection_still_accepts_json_text():
+    with _echo_app().websocket_connect("/ws", subprotocols=["claudeditor.msgpack"]) as ws:
+        ws.send_text(json.dumps({"type": "ping"}))
+        assert msgpack.unpackb(ws.receive_bytes(), raw=False) == {"codec": "msgpack", "echo": {"type": "ping"}}
+
+
+def test_json_fallback_without_known_subprotocol():
+    for subprotocols in (None, ["chat.v2"], ["claudeditor.json"]):
+        with _echo_app().websocket_connect("/ws", subprotocols=subprotocols) as ws:
+            expected = "claudeditor.json" if subprotocols == ["claudeditor.json"] else None
+            assert ws.accepted_subprotocol == expected
+            ws.send_text(json.dumps({"type": "ping"}))
+            assert json.loads(ws.receive_text()) == {"codec": "json", "echo": {"type": "ping"}}
+            assert json.loads(ws.receive_text()) == FRAME
+
+
+def test_encoded_frame_serialises_once_per_codec(monkeypatch):
+    calls = []
+    original = ws_codec.MessagePackCodec.encode
+    monkeypatch.setattr(ws_codec.MessagePackCodec, "encode",
+                        lambda self, data: calls.append(data) or original(self, data))
+    frame = ws_codec.EncodedFrame(FRAME)
+    codec = ws_codec.negotiate(type("Socket", (), {"scope": {"subprotocols": ["claudeditor.msgpack"]}})())
+    payloads = {frame.payload(codec) for _ in range(5)}
+    assert len(calls) == 1 and len(payloads) == 1
+    assert isinstance(frame.payload(ws_codec.JSON_CODEC), str)
@@ -0,0 +1,125 @@
+"""
+WebSocket 幀編碼協商
+客戶端在 Sec-WebSocket-Protocol 中請求 claudeditor.msgpack 時改用 MessagePack 二進制幀，
+未請求或服務端未安裝 msgpack 時回退到 JSON 文本幀；壓縮由 uvicorn 的 permessage-deflate 擴展負責
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+    logger.warning("未安裝 msgpack（見 api/requirements.txt），WebSocket 只提供 JSON 編碼")
+
+SUBPROTOCOL_JSON = "claudeditor.json"
+SUBPROTOCOL_MSGPACK = "claudeditor.msgpack"
+
+Payload = Union[str, bytes]
+
+
+class WebSocketCodec:
+    """JSON 文本幀編碼（默認）"""
+    name = "json"
+
+    def __init__(self, subprotocol: str = None):
+        self.subprotocol = subprotocol
+
+    def encode(self, data: Any) -> Payload:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def decode(self, payload: Payload) -> Any:
+        return json.loads(payload)
+
+    async def send(self, websocket: WebSocket, data: Any):
+        await send_payload(websocket, self.encode(data))
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """接收一條消息；客戶端發來的文本幀總是按 JSON 解析"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        if message.get("bytes") is not None:
+            return self.decode(message["bytes"])
+        return json.loads(message["text"])
+
+
+class MessagePackCodec(WebSocketCodec):
+    """MessagePack 二進制幀編碼"""
+    name = "msgpack"
+
+    def encode(self, data: Any) -> Payload:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, payload: Payload) -> Any:
+        if isinstance(payload, str):
+            return json.loads(payload)
+        return msgpack.unpackb(payload, raw=False)
+
+
+JSON_CODEC = WebSocketCodec()
+_CODECS: Dict[str, WebSocketCodec] = {SUBPROTOCOL_JSON: WebSocketCodec(SUBPROTOCOL_JSON)}
+if msgpack is not None:
+    _CODECS[SUBPROTOCOL_MSGPACK] = MessagePackCodec(SUBPROTOCOL_MSGPACK)
+
+
+def negotiate(websocket: WebSocket) -> WebSocketCodec:
+    """按客戶端請求的子協議順序選擇第一個支持的編碼"""
+    for subprotocol in websocket.scope.get("subprotocols") or ():
+        codec = _CODECS.get(subprotocol)
+        if codec is not None:
+            return codec
+    return JSON_CODEC
+
+
+async def accept(websocket: WebSocket) -> WebSocketCodec:
+    """協商編碼並接受連接，編碼記錄在連接上供後續發送使用"""
+    codec = negotiate(websocket)
+    await websocket.accept(subprotocol=codec.subprotocol)
+    websocket.state.ws_codec = codec
+    return codec
+
+
+def codec_for(websocket: WebSocket) -> WebSocketCodec:
+    return getattr(websocket.state, "ws_codec", JSON_CODEC)
+
+
+async def send_payload(websocket: WebSocket, payload: Payload):
+    if isinstance(payload, bytes):
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
+
+
+async def send(websocket: WebSocket, data: Any):
+    await codec_for(websocket).send(websocket, data)
+
+
+class EncodedFrame:
+    """廣播幀：每種編碼只序列化一次，再發給使用該編碼的所有連接"""
+    __slots__ = ("data", "_payloads")
+
+    def __init__(self, data: Any):
+        self.data = data
+        self._payloads: Dict[str, Payload] = {}
+
+    def payload(self, codec: WebSocketCodec) -> Payload:
+        payload = self._payloads.get(codec.name)
+        if payload is None:
+            payload = self._payloads[codec.name] = codec.encode(self.data)
+        return payload
+
+    async def send(self, websocket: WebSocket):
+        await send_payload(websocket, self.payload(codec_for(websocket)))
+
+
+def per_message_deflate_enabled() -> bool:
+    """WS_PER_MESSAGE_DEFLATE=0 時關閉 permessage-deflate（默認開啟）"""
+    return os.environ.get("WS_PER_MESSAGE_DEFLATE", "1").lower() not in ("0", "false", "no")